@@ -0,0 +1,101 @@
+import copy
+import os
+from facial_gesture import AnalysisPolicy, MAX_GESTURE_WORKERS, segment_count
+
+# Latency budget for /analyze when the request does not give one
+DEFAULT_BUDGET_SECONDS = float(os.getenv("ANALYZE_BUDGET_SECONDS", "90"))
+
+# Rough single-core CPU costs used to predict how long a request will take.
+# They only need to rank the options correctly and be in the right ballpark;
+# measure on the deployment machine and adjust if budgets are missed.
+TRANSCRIPTION_SECONDS_PER_AUDIO_SECOND = {"accurate": 0.30, "balanced": 0.18, "fast": 0.10}
+DECODE_SECONDS_PER_MEGAPIXEL_FRAME = 0.006
+# Retrieving and color-converting a frame that is then not analyzed, which
+# adaptive sampling does for every off-grid frame
+CONVERT_SECONDS_PER_MEGAPIXEL_FRAME = 0.003
+INFERENCE_SECONDS_PER_FRAME = 0.008
+INFERENCE_SECONDS_PER_MEGAPIXEL = 0.004
+FIXED_OVERHEAD_SECONDS = 8.0  # upload copy, Gemini round trip, timeline write
+
+# Settings tried from best to cheapest: (transcription profile, analysis fps,
+# max frame dimension). Each rung is capped by the configured gesture policy,
+# so the first rung is exactly what an unbudgeted request would use. Decoding
+# every source frame is a floor no rung can lower, so before giving up on a
+# rung the planner also tries splitting gesture analysis across more workers.
+QUALITY_LADDER = [
+    ("accurate", None, None),
+    ("balanced", 10, 640),
+    ("balanced", 5, 480),
+    ("fast", 5, 480),
+    ("fast", 2, 320),
+    ("fast", 1, 320),
+]
+
+
+def _capped(value, cap):
+    if value is None:
+        return cap
+    if cap is None:
+        return value
+    return min(value, cap)
+
+
+def estimate_seconds(probe, profile, policy):
+    """Predicted wall time of transcription plus gesture analysis"""
+    transcription = probe["duration"] * TRANSCRIPTION_SECONDS_PER_AUDIO_SECOND[profile] if probe["has_audio"] else 0
+
+    gesture = 0.0
+    if probe["frame_count"]:
+        megapixels = probe["width"] * probe["height"] / 1e6
+        w, h = policy.inference_size(probe["width"], probe["height"])
+        if policy.track_roi:
+            w = h = min(policy.roi_size, w, h)
+        # Short videos get fewer segments than workers; every segment after
+        # the first also decodes and analyzes its warm-up overlap
+        segments = segment_count(policy, probe["frame_count"])
+        decoded = probe["frame_count"] + (segments - 1) * policy.overlap_seconds * (probe["fps"] or 30)
+        analyzed = decoded / policy.frame_step(probe["fps"])
+        gesture = (decoded * megapixels * DECODE_SECONDS_PER_MEGAPIXEL_FRAME +
+                   analyzed * (INFERENCE_SECONDS_PER_FRAME + w * h / 1e6 * INFERENCE_SECONDS_PER_MEGAPIXEL))
+        if policy.adaptive:
+            gesture += (decoded - analyzed) * megapixels * CONVERT_SECONDS_PER_MEGAPIXEL_FRAME
+        gesture /= segments
+
+    return FIXED_OVERHEAD_SECONDS + transcription + gesture
+
+
+def plan_analysis(probe, budget_seconds=None, base_policy=None):
+    """
+    Pick the best transcription profile and gesture policy predicted to finish
+    within the budget. Returns (profile, policy, plan) where plan describes
+    the choice for the response; if nothing fits, the cheapest rung is used
+    and plan["within_budget"] is False.
+    """
+    budget = budget_seconds or DEFAULT_BUDGET_SECONDS
+    base_policy = base_policy or AnalysisPolicy.from_env()
+
+    worker_options = sorted({base_policy.workers, max(base_policy.workers, MAX_GESTURE_WORKERS)})
+    candidates = [
+        (rung, profile, target_fps, max_dimension, workers)
+        for rung, (profile, target_fps, max_dimension) in enumerate(QUALITY_LADDER)
+        for workers in worker_options
+    ]
+    for rung, profile, target_fps, max_dimension, workers in candidates:
+        policy = copy.copy(base_policy)
+        policy.target_fps = _capped(target_fps, base_policy.target_fps)
+        policy.max_dimension = _capped(max_dimension, base_policy.max_dimension)
+        policy.workers = workers
+        estimate = estimate_seconds(probe, profile, policy)
+        if estimate <= budget:
+            break
+
+    return profile, policy, {
+        "budget_seconds": budget,
+        "estimated_seconds": round(estimate, 1),
+        "within_budget": estimate <= budget,
+        "quality_level": rung,
+        "transcription_profile": profile,
+        "target_fps": policy.target_fps,
+        "max_dimension": policy.max_dimension,
+        "gesture_workers": policy.workers
+    }
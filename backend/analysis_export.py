@@ -0,0 +1,134 @@
+import csv
+import hmac
+import io
+import os
+from datetime import datetime, time, timedelta
+import pyarrow as pa
+import pyarrow.parquet as pq
+from database import ANALYSIS_TEXT_COLUMNS
+from storage import export_chunks
+
+# Bulk exports are read from the database (a server-side cursor on Postgres)
+# in chunks of this many rows, so memory stays flat however many analyses
+# match; each chunk becomes one CSV write or one Parquet row group.
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "5000"))
+MAX_EXPORT_USERS = int(os.getenv("MAX_EXPORT_USERS", "1000"))
+# Operator credential (X-Export-Key header) for exporting other users' data;
+# without it a session can only export its own analyses
+EXPORT_API_KEY = os.getenv("EXPORT_API_KEY")
+EXPORT_FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+# Exported columns with their Parquet types, from speech_analyses and its
+# analysis_texts row (null once that month's texts are archived); file paths
+# and the search vector stay out
+EXPORT_COLUMNS = [
+    ("analysis_id", pa.int32()),
+    ("user_id", pa.int32()),
+    ("session_number", pa.int32()),
+    ("analyzed_at", pa.timestamp("us")),
+    ("filename", pa.string()),
+    ("topic", pa.string()),
+    ("transcription", pa.string()),
+    ("clarity_score", pa.float64()),
+    ("clarity_comment", pa.string()),
+    ("arguments_score", pa.float64()),
+    ("arguments_comment", pa.string()),
+    ("grammar_score", pa.float64()),
+    ("grammar_comment", pa.string()),
+    ("delivery_score", pa.float64()),
+    ("delivery_comment", pa.string()),
+    ("overall_score", pa.float64()),
+    ("overall_comment", pa.string()),
+    ("confidence_score", pa.float64()),
+    ("nervousness_score", pa.float64()),
+    ("scoring_version", pa.int32()),
+    ("smile_mean", pa.float64()),
+    ("eyebrow_raise_mean", pa.float64()),
+    ("blink_count", pa.int32()),
+    ("head_pose_mean", pa.float64()),
+    ("speech_ratio", pa.float64()),
+    ("pause_count", pa.int32()),
+    ("volume_variability", pa.float64()),
+    ("pitch_mean", pa.float64()),
+    ("pitch_std", pa.float64()),
+    ("speaking_rate", pa.float64()),
+    ("speaking_rate_stability", pa.float64()),
+    ("file_duration", pa.float64()),
+    ("file_size", pa.int64()),
+]
+EXPORT_SCHEMA = pa.schema(EXPORT_COLUMNS)
+
+
+def is_export_operator(key):
+    """Whether `key` is the configured operator export key"""
+    return bool(EXPORT_API_KEY) and bool(key) and hmac.compare_digest(key.encode(), EXPORT_API_KEY.encode())
+
+
+def parse_user_ids(user_ids):
+    """Comma-separated user ids as a sorted list of ints"""
+    try:
+        ids = sorted({int(u) for u in user_ids.split(",") if u.strip()})
+    except ValueError:
+        raise ValueError("user_ids must be comma-separated integers")
+    if not ids:
+        raise ValueError("At least one user id is required")
+    if len(ids) > MAX_EXPORT_USERS:
+        raise ValueError(f"At most {MAX_EXPORT_USERS} users can be exported at once")
+    return ids
+
+
+def export_query(user_ids, start_date=None, end_date=None):
+    """SQL and parameters selecting the analyses of `user_ids` analyzed between the dates (inclusive)"""
+    conditions = [f"user_id IN ({', '.join(['%s'] * len(user_ids))})"]
+    params = list(user_ids)
+    if start_date is not None:
+        conditions.append("analyzed_at >= %s")
+        params.append(datetime.combine(start_date, time.min))
+    if end_date is not None:
+        conditions.append("analyzed_at < %s")
+        params.append(datetime.combine(end_date + timedelta(days=1), time.min))
+    columns = [("t." if name in ANALYSIS_TEXT_COLUMNS else "a.") + name for name, _ in EXPORT_COLUMNS]
+    # The bounds are repeated for analysis_texts, since the planner does not
+    # carry range conditions across the join; on the partition key they limit
+    # both tables to the requested months
+    sql = f"""
+        SELECT {', '.join(columns)}
+        FROM speech_analyses AS a
+        LEFT JOIN analysis_texts AS t
+            ON t.analysis_id = a.analysis_id AND t.analyzed_at = a.analyzed_at
+            AND {' AND '.join('t.' + c for c in conditions)}
+        WHERE {' AND '.join('a.' + c for c in conditions)}
+        ORDER BY a.user_id, a.session_number
+    """
+    return sql, params + params
+
+
+def stream_csv(sql, params, chunk_rows=EXPORT_CHUNK_ROWS):
+    """CSV export as a generator of encoded chunks, header first"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(name for name, _ in EXPORT_COLUMNS)
+    for rows in export_chunks(sql, params, chunk_rows):
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def stream_parquet(sql, params, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Parquet export as a generator of byte chunks, one row group per chunk"""
+    sink = io.BytesIO()
+    with pq.ParquetWriter(sink, EXPORT_SCHEMA, compression="zstd") as writer:
+        for rows in export_chunks(sql, params, chunk_rows):
+            columns = list(zip(*rows))
+            writer.write_batch(pa.record_batch(
+                [pa.array(values, type=column_type) for values, (_, column_type) in zip(columns, EXPORT_COLUMNS)],
+                schema=EXPORT_SCHEMA
+            ))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    # Closing the writer appends the footer
+    yield sink.getvalue()
@@ -0,0 +1,125 @@
+# backend/archive_partitions.py
+"""
+Monthly partition upkeep for speech_analyses and analysis_texts; run daily
+(e.g. from cron) after migrate.py. The API also creates upcoming partitions
+while it runs (database.ensure_partitions), but only this script archives.
+
+    python archive_partitions.py [--months-ahead 3] [--archive-after 12] [--dry-run]
+
+Creates the partitions of the coming months so new analyses never land in
+the default partitions. Text partitions (transcriptions and feedback
+comments, the bulk of the table) of months older than --archive-after are
+written to zstd-compressed Parquet files in ARCHIVE_DIR, recorded in
+archived_text_partitions and dropped. The narrow speech_analyses rows stay,
+so history, statistics and trends still cover every session; only detail
+views, search and exports of archived months come back without their texts.
+"""
+import argparse
+import os
+import re
+from datetime import date
+import pyarrow as pa
+import pyarrow.parquet as pq
+from database import db_connection, export_chunks, ensure_partitions
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_CHUNK_ROWS = 10000
+TEXT_PARTITION = re.compile(r"^analysis_texts_(\d{4})_(\d{2})$")
+
+ARCHIVE_SCHEMA = pa.schema([
+    ("analysis_id", pa.int32()),
+    ("analyzed_at", pa.timestamp("us")),
+    ("user_id", pa.int32()),
+    ("transcription", pa.string()),
+    ("clarity_comment", pa.string()),
+    ("arguments_comment", pa.string()),
+    ("grammar_comment", pa.string()),
+    ("delivery_comment", pa.string()),
+    ("overall_comment", pa.string()),
+])
+
+def add_months(month, months):
+    """First day of the month `months` after `month`"""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def text_partitions(cursor):
+    """(month, table name) of every attached monthly analysis_texts partition, oldest first"""
+    cursor.execute("""
+        SELECT c.relname
+        FROM pg_inherits AS i JOIN pg_class AS c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'analysis_texts'::regclass
+    """)
+    partitions = []
+    for (name,) in cursor.fetchall():
+        match = TEXT_PARTITION.match(name)
+        if match:
+            partitions.append((date(int(match.group(1)), int(match.group(2)), 1), name))
+    return sorted(partitions)
+
+def write_archive(table, path):
+    """Copy one text partition to a Parquet file; returns the row count"""
+    # Written under a temporary name, so a crash never leaves a partial file
+    # that looks complete
+    partial = path + ".partial"
+    rows_written = 0
+    with pq.ParquetWriter(partial, ARCHIVE_SCHEMA, compression="zstd") as writer:
+        sql = f"SELECT {', '.join(ARCHIVE_SCHEMA.names)} FROM {table} ORDER BY analysis_id"
+        for rows in export_chunks(sql, (), ARCHIVE_CHUNK_ROWS):
+            columns = list(zip(*rows))
+            writer.write_batch(pa.record_batch(
+                [pa.array(values, type=field.type) for values, field in zip(columns, ARCHIVE_SCHEMA)],
+                schema=ARCHIVE_SCHEMA
+            ))
+            rows_written += len(rows)
+    os.replace(partial, path)
+    return rows_written
+
+def maintain_partitions(months_ahead=3, archive_after=12, dry_run=False):
+    """Create upcoming partitions and archive text partitions older than `archive_after` months"""
+    try:
+        this_month = date.today().replace(day=1)
+        cutoff = add_months(this_month, -archive_after)
+        if not dry_run:
+            result = ensure_partitions(months_ahead)
+            if not result["success"]:
+                return result
+        with db_connection() as conn, conn.cursor() as cursor:
+            print(f"✅ Partitions ensured through {add_months(this_month, months_ahead):%Y-%m}")
+
+            archived = []
+            for month, table in text_partitions(cursor):
+                if month >= cutoff:
+                    break
+                path = os.path.join(ARCHIVE_DIR, f"{table}.parquet")
+                if dry_run:
+                    print(f"   would archive {table} to {path}")
+                    continue
+                os.makedirs(ARCHIVE_DIR, exist_ok=True)
+                rows = write_archive(table, path)
+                # Detaching waits for running queries on the partition
+                cursor.execute(f"ALTER TABLE analysis_texts DETACH PARTITION {table}")
+                cursor.execute(f"DROP TABLE {table}")
+                cursor.execute("""
+                    INSERT INTO archived_text_partitions (month, path, row_count) VALUES (%s, %s, %s)
+                    ON CONFLICT (month) DO UPDATE SET path = EXCLUDED.path, row_count = EXCLUDED.row_count,
+                                                      archived_at = CURRENT_TIMESTAMP
+                """, (month, path, rows))
+                conn.commit()
+                archived.append(table)
+                print(f"   archived {table}: {rows} rows to {path}")
+
+            print(f"✅ Archived {len(archived)} text partition(s){' (dry run)' if dry_run else ''}")
+            return {"success": True, "archived": archived}
+    except Exception as e:
+        print(f"❌ Partition maintenance failed: {e}")
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create upcoming analysis partitions and archive old texts")
+    parser.add_argument("--months-ahead", type=int, default=3)
+    parser.add_argument("--archive-after", type=int, default=12, help="archive texts older than this many months")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    if not maintain_partitions(args.months_ahead, args.archive_after, args.dry_run)["success"]:
+        raise SystemExit(1)
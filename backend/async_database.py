@@ -0,0 +1,237 @@
+# backend/async_database.py
+"""
+asyncpg versions of the database functions used by the API endpoints.
+
+Queries and response formatting come from database.py, so both layers
+return the same dicts; only the driver differs. The sync layer stays for
+scripts such as rescore.py and for schema setup.
+"""
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+import asyncpg
+from database import (
+    DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT, DB_STATEMENT_TIMEOUT_MS, DB_HEALTHCHECK_AFTER,
+    REGISTER_USER_SQL, LOGIN_USER_SQL, RECORD_LOGINS_SQL, NEXT_SESSION_SQL, INSERT_ANALYSIS_SQL,
+    USER_STATISTICS_SQL, UPDATE_USER_STATS_SQL, COMPARE_ANALYSES_SQL, SEARCH_ANALYSES_SQL,
+    COHORT_ANALYSIS_SQL, COHORT_LATEST_ANALYSIS_SQL,
+    hash_password, registration_error, analysis_values, rewrite_placeholders,
+    decode_history_cursor, history_query, history_params,
+    parse_trend_metrics, trend_query, trend_params, search_params,
+    format_statistics, format_history_page, format_comparison, format_trends, format_search_results,
+    format_cohort_analysis
+)
+
+async_pool = None
+_stats = {"checkouts": 0, "waited": 0, "timeouts": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+
+
+def to_asyncpg(sql):
+    """Rewrite psycopg2 %s placeholders as asyncpg's $1, $2, ..."""
+    return rewrite_placeholders(sql, lambda n: f"${n}")
+
+
+REGISTER_USER = to_asyncpg(REGISTER_USER_SQL)
+LOGIN_USER = to_asyncpg(LOGIN_USER_SQL)
+RECORD_LOGINS = to_asyncpg(RECORD_LOGINS_SQL)
+NEXT_SESSION = to_asyncpg(NEXT_SESSION_SQL)
+INSERT_ANALYSIS = to_asyncpg(INSERT_ANALYSIS_SQL)
+USER_STATISTICS = to_asyncpg(USER_STATISTICS_SQL)
+UPDATE_USER_STATS = to_asyncpg(UPDATE_USER_STATS_SQL)
+COMPARE_ANALYSES = to_asyncpg(COMPARE_ANALYSES_SQL)
+SEARCH_ANALYSES = to_asyncpg(SEARCH_ANALYSES_SQL)
+COHORT_ANALYSIS = to_asyncpg(COHORT_ANALYSIS_SQL)
+COHORT_LATEST_ANALYSIS = to_asyncpg(COHORT_LATEST_ANALYSIS_SQL)
+
+
+async def _init_connection(conn):
+    # Decode JSONB like psycopg2 does, so shared formatters see Python objects
+    await conn.set_type_codec("jsonb", encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+
+
+async def init_async_pool():
+    """Create the asyncpg pool (call from the app's startup event)"""
+    global async_pool
+    async_pool = await asyncpg.create_pool(
+        host=os.getenv("DB_HOST", "localhost"),
+        database=os.getenv("DB_NAME", "extempore_db"),
+        user=os.getenv("DB_USER", "postgres"),
+        password=os.getenv("DB_PASSWORD", "your_password"),
+        port=int(os.getenv("DB_PORT", "5432")),
+        min_size=DB_POOL_MIN,
+        max_size=DB_POOL_MAX,
+        # asyncpg resets and validates connections itself; idle ones are
+        # closed instead of being pinged
+        max_inactive_connection_lifetime=max(DB_HEALTHCHECK_AFTER, 60.0),
+        server_settings={"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)},
+        init=_init_connection
+    )
+    print("✅ Async database pool created successfully")
+
+
+async def close_async_pool():
+    if async_pool is not None:
+        await async_pool.close()
+
+
+def async_pool_stats():
+    """Pool size and how long coroutines waited for a connection"""
+    if async_pool is None:
+        return None
+    stats = dict(_stats)
+    stats["size"] = async_pool.get_size()
+    stats["idle"] = async_pool.get_idle_size()
+    stats["max_connections"] = async_pool.get_max_size()
+    stats["avg_wait_ms"] = round(stats["wait_seconds"] / max(stats["checkouts"], 1) * 1000, 2)
+    stats["max_wait_ms"] = round(stats.pop("max_wait_seconds") * 1000, 2)
+    stats.pop("wait_seconds")
+    return stats
+
+
+@asynccontextmanager
+async def db_acquire(timeout=None):
+    """A pooled connection, waiting up to DB_POOL_TIMEOUT seconds for one"""
+    if async_pool is None:
+        raise RuntimeError("Async database pool is not initialized")
+    started = time.perf_counter()
+    try:
+        conn = await async_pool.acquire(timeout=DB_POOL_TIMEOUT if timeout is None else timeout)
+    except asyncio.TimeoutError:
+        _stats["timeouts"] += 1
+        raise
+    waited = time.perf_counter() - started
+    _stats["checkouts"] += 1
+    _stats["wait_seconds"] += waited
+    _stats["max_wait_seconds"] = max(_stats["max_wait_seconds"], waited)
+    if waited > 0.001:
+        _stats["waited"] += 1
+    try:
+        yield conn
+    finally:
+        await async_pool.release(conn)
+
+
+async def register_user(username, email, password):
+    """Register a new user"""
+    try:
+        async with db_acquire() as conn:
+            user_id = await conn.fetchval(REGISTER_USER, username, email, hash_password(password))
+        return {"success": True, "user_id": user_id, "message": "User registered successfully"}
+    except asyncpg.UniqueViolationError as e:
+        return registration_error(e)
+    except Exception as e:
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+
+async def login_user(username, password):
+    """Authenticate a user; the caller records last_login (see record_logins)"""
+    try:
+        async with db_acquire() as conn:
+            user = await conn.fetchrow(LOGIN_USER, username, hash_password(password))
+            if user:
+                return {
+                    "success": True,
+                    "user_id": user[0],
+                    "username": user[1],
+                    "email": user[2]
+                }
+        return {"success": False, "message": "Invalid username or password"}
+    except Exception as e:
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+
+async def record_logins(logins):
+    """Set last_login of many users at once from (user_id, last_login) pairs"""
+    try:
+        async with db_acquire() as conn:
+            status = await conn.execute(RECORD_LOGINS, [u for u, _ in logins], [t for _, t in logins])
+        return {"success": True, "updated": int(status.split()[-1])}
+    except Exception as e:
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+
+async def save_analysis(user_id, analysis_data):
+    """Save speech analysis results with enhanced tracking"""
+    try:
+        async with db_acquire() as conn, conn.transaction():
+            session_number = await conn.fetchval(NEXT_SESSION, user_id)
+            if session_number is None:
+                return {"success": False, "message": "User not found"}
+            analysis_id, analyzed_at = await conn.fetchrow(INSERT_ANALYSIS, *analysis_values(user_id, analysis_data, session_number))
+            await conn.execute(UPDATE_USER_STATS, analysis_id, analyzed_at)
+        print(f"✅ Analysis saved successfully: ID {analysis_id}, Session {session_number}")
+        return {"success": True, "analysis_id": analysis_id, "session_number": session_number, "analyzed_at": analyzed_at}
+    except Exception as e:
+        print(f"❌ Error saving analysis: {e}")
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+
+async def get_user_statistics(user_id):
+    """Get user's overall statistics and progress"""
+    try:
+        async with db_acquire() as conn:
+            stats = await conn.fetchrow(USER_STATISTICS, user_id)
+        return format_statistics(stats)
+    except Exception as e:
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+
+async def get_detailed_history(user_id, limit=20, cursor=None, fields=None):
+    """Get one page of user's detailed speech analysis history, newest first"""
+    try:
+        after = decode_history_cursor(cursor)
+        sql, selected, columns = history_query(fields, after)
+        async with db_acquire() as conn:
+            results = await conn.fetch(to_asyncpg(sql), *history_params(user_id, limit, after))
+        return format_history_page(results, columns, selected, limit)
+    except Exception as e:
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+
+async def compare_analyses(user_id, analysis_id_1, analysis_id_2):
+    """Compare two analyses side by side"""
+    try:
+        async with db_acquire() as conn:
+            results = await conn.fetch(COMPARE_ANALYSES, user_id, analysis_id_1, analysis_id_2)
+        return format_comparison(results)
+    except Exception as e:
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+
+async def get_user_trends(user_id, metrics=None, start_session=None, end_session=None, window=5, points=None):
+    """Per-metric series, rolling averages, deltas and streaks over a session range"""
+    try:
+        selected = parse_trend_metrics(metrics)
+        async with db_acquire() as conn:
+            results = await conn.fetch(
+                to_asyncpg(trend_query(selected, window)),
+                *trend_params(user_id, start_session, end_session, points)
+            )
+        return format_trends(results, selected, window)
+    except Exception as e:
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+
+async def search_analyses(user_id, query, limit=20, offset=0):
+    """Full-text search of user's analyses by topic and transcription, best match first"""
+    try:
+        async with db_acquire() as conn:
+            results = await conn.fetch(SEARCH_ANALYSES, *search_params(user_id, query, limit, offset))
+        return format_search_results(results, limit, offset)
+    except Exception as e:
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+
+async def get_cohort_analysis(user_id, analysis_id=None):
+    """Metric values of one of user's analyses (the latest by default)"""
+    try:
+        async with db_acquire() as conn:
+            if analysis_id is None:
+                result = await conn.fetchrow(COHORT_LATEST_ANALYSIS, user_id)
+            else:
+                result = await conn.fetchrow(COHORT_ANALYSIS, user_id, analysis_id)
+        return format_cohort_analysis(result)
+    except Exception as e:
+        return {"success": False, "message": f"Error: {str(e)}"}
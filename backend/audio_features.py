@@ -0,0 +1,212 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import ndimage, signal
+
+# Whisper already decodes uploads to 16 kHz mono float32, so we analyze that
+# same buffer instead of decoding the file a second time.
+SAMPLE_RATE = 16000
+FRAME_MS = 25
+HOP_MS = 10
+
+PITCH_MIN_HZ = 75
+PITCH_MAX_HZ = 400
+# A frame's pitch is the first lag whose normalized difference dips below
+# YIN_THRESHOLD (or within YIN_TOLERANCE of the frame's deepest dip); frames
+# are voiced when 1 - that difference exceeds VOICING_THRESHOLD
+YIN_THRESHOLD = 0.15
+YIN_TOLERANCE = 0.1
+VOICING_THRESHOLD = 0.65
+# Frames per FFT batch
+FRAME_CHUNK = 1024
+
+MIN_PAUSE_S = 0.25
+RATE_WINDOW_S = 5.0
+SYLLABLE_PROMINENCE_DB = 3.0
+SYLLABLE_MIN_GAP_S = 0.12
+
+
+def empty_audio_metrics(duration=0.0):
+    """Metrics returned when there is no usable audio"""
+    return {
+        "duration": round(float(duration), 2),
+        "speech_ratio": 0,
+        "pause_count": 0,
+        "mean_pause": 0,
+        "rms_mean": 0,
+        "volume_variability": 0,
+        "pitch_mean": 0,
+        "pitch_std": 0,
+        "pitch_range": 0,
+        "speaking_rate": 0,
+        "speaking_rate_stability": 0
+    }
+
+
+def _speech_mask(rms_db):
+    """Energy-based speech/silence decision with an adaptive noise floor"""
+    noise_floor = np.percentile(rms_db, 10)
+    threshold = max(noise_floor + 6.0, rms_db.max() - 35.0)
+    mask = rms_db > threshold
+    # Smooth out single-frame flips so pauses are not split by clicks
+    return ndimage.median_filter(mask.astype(np.uint8), size=5).astype(bool)
+
+
+def _pitch_contour(frames, sample_rate):
+    """
+    Per-frame F0 (Hz) and voicing strength (1 - aperiodicity) from the YIN
+    cumulative mean normalized difference of each frame.
+
+    The shortest lag that dips low enough is taken rather than the deepest
+    dip, so a period's multiples (subharmonics) are never preferred over the
+    period itself.
+    """
+    frame_len = frames.shape[1]
+    nfft = 1 << int(np.ceil(np.log2(2 * frame_len)))
+    min_lag = int(sample_rate / PITCH_MAX_HZ)
+    max_lag = min(int(sample_rate / PITCH_MIN_HZ), frame_len - 2)
+    lags = np.arange(max_lag + 1)
+
+    # Difference function d(lag) = sum (x[j] - x[j+lag])^2 over the overlap,
+    # from the FFT autocorrelation and running sums of energy
+    spectrum = np.fft.rfft(frames, n=nfft, axis=1)
+    autocorr = np.fft.irfft(spectrum.real ** 2 + spectrum.imag ** 2, n=nfft, axis=1)[:, :max_lag + 1]
+    energy = np.concatenate([np.zeros((len(frames), 1)), np.cumsum(frames ** 2, axis=1)], axis=1)
+    diff = energy[:, frame_len - lags] + (energy[:, -1:] - energy[:, lags]) - 2 * autocorr
+    diff[:, 0] = 0
+
+    # Cumulative mean normalization: d'(lag) = d(lag) * lag / sum(d[1..lag])
+    running = np.cumsum(diff[:, 1:], axis=1)
+    cmndf = np.ones_like(diff)
+    cmndf[:, 1:] = diff[:, 1:] * lags[1:] / np.maximum(running, 1e-10)
+
+    search = cmndf[:, min_lag:max_lag + 1]
+    local_min = np.zeros(search.shape, dtype=bool)
+    local_min[:, 1:-1] = (search[:, 1:-1] <= search[:, :-2]) & (search[:, 1:-1] <= search[:, 2:])
+    # Frames with no dip under the threshold take the first dip close to
+    # their deepest one instead
+    limit = np.maximum(YIN_THRESHOLD, search.min(axis=1, keepdims=True) + YIN_TOLERANCE)
+    candidates = local_min & (search <= limit)
+    rows = np.arange(len(search))
+    peak = np.where(candidates.any(axis=1), np.argmax(candidates, axis=1), np.argmin(search, axis=1))
+    best = search[rows, peak]
+
+    # Parabolic interpolation around the dip for sub-sample lag precision
+    left = search[rows, np.maximum(peak - 1, 0)]
+    right = search[rows, np.minimum(peak + 1, search.shape[1] - 1)]
+    denom = left - 2 * best + right
+    offset = np.where(np.abs(denom) > 1e-10, 0.5 * (left - right) / np.where(denom == 0, 1, denom), 0.0)
+    lag = min_lag + peak + np.clip(offset, -0.5, 0.5)
+
+    return sample_rate / lag, np.clip(1.0 - best, 0.0, 1.0)
+
+
+def _frame_features(frames, sample_rate):
+    """
+    RMS, F0 and voicing strength of every frame. Frames are read from the
+    strided view in chunks of FRAME_CHUNK, so peak memory does not grow with
+    the length of the recording.
+    """
+    n_frames = len(frames)
+    rms = np.empty(n_frames)
+    f0 = np.empty(n_frames)
+    strength = np.empty(n_frames)
+    for start in range(0, n_frames, FRAME_CHUNK):
+        stop = min(start + FRAME_CHUNK, n_frames)
+        chunk = frames[start:stop].astype(np.float64)
+        chunk -= chunk.mean(axis=1, keepdims=True)
+        rms[start:stop] = np.sqrt(np.mean(chunk ** 2, axis=1))
+        f0[start:stop], strength[start:stop] = _pitch_contour(chunk, sample_rate)
+    return rms, f0, strength
+
+
+def _pauses(speech, hop_s):
+    """Durations (s) of silent runs between the first and last speech frame"""
+    voiced_idx = np.flatnonzero(speech)
+    if len(voiced_idx) == 0:
+        return np.zeros(0)
+    inner = speech[voiced_idx[0]:voiced_idx[-1] + 1].astype(np.int8)
+    edges = np.diff(inner)
+    starts = np.flatnonzero(edges == -1) + 1
+    ends = np.flatnonzero(edges == 1) + 1
+    durations = (ends - starts) * hop_s
+    return durations[durations >= MIN_PAUSE_S]
+
+
+def _speaking_rate(rms_db, speech, hop_s):
+    """Syllable rate and its stability across fixed windows of the recording"""
+    envelope = ndimage.uniform_filter1d(np.where(speech, rms_db, rms_db.min()), size=5)
+    peaks, _ = signal.find_peaks(
+        envelope,
+        prominence=SYLLABLE_PROMINENCE_DB,
+        distance=max(1, int(SYLLABLE_MIN_GAP_S / hop_s))
+    )
+    peaks = peaks[speech[peaks]]
+
+    speech_seconds = speech.sum() * hop_s
+    if speech_seconds <= 0:
+        return 0.0, 0.0
+    rate = len(peaks) / speech_seconds
+
+    window = max(1, int(RATE_WINDOW_S / hop_s))
+    n_windows = int(np.ceil(len(speech) / window))
+    padded = np.zeros(n_windows * window, dtype=bool)
+    padded[:len(speech)] = speech
+    speech_per_window = padded.reshape(n_windows, window).sum(axis=1) * hop_s
+    peaks_per_window = np.bincount(peaks // window, minlength=n_windows)
+
+    # Ignore windows with too little speech to give a meaningful rate
+    usable = speech_per_window >= 1.0
+    if usable.sum() < 2:
+        return rate, 1.0
+    window_rates = peaks_per_window[usable] / speech_per_window[usable]
+    variation = window_rates.std() / max(window_rates.mean(), 1e-6)
+    return rate, float(np.clip(1.0 - variation, 0.0, 1.0))
+
+
+def analyze_audio(audio, sample_rate=SAMPLE_RATE):
+    """
+    Computes delivery metrics from mono PCM samples.
+    All features are derived from one framing of the signal, so the cost is a
+    handful of vectorized passes over an (n_frames, frame_len) view, taken a
+    chunk of frames at a time.
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    duration = len(audio) / sample_rate
+    frame_len = int(sample_rate * FRAME_MS / 1000)
+    hop = int(sample_rate * HOP_MS / 1000)
+    hop_s = hop / sample_rate
+
+    if len(audio) < frame_len or not np.any(audio):
+        return empty_audio_metrics(duration)
+
+    frames = sliding_window_view(audio, frame_len)[::hop]
+
+    # --- Frame-level energy and pitch contour ---
+    rms, f0, strength = _frame_features(frames, sample_rate)
+    rms_db = 20 * np.log10(rms + 1e-10)
+    speech = _speech_mask(rms_db)
+
+    if not speech.any():
+        return empty_audio_metrics(duration)
+
+    voiced = speech & (strength > VOICING_THRESHOLD)
+    pitch = f0[voiced]
+
+    # --- Pauses and rate ---
+    pauses = _pauses(speech, hop_s)
+    rate, stability = _speaking_rate(rms_db, speech, hop_s)
+
+    speech_db = rms_db[speech]
+    return {
+        "duration": round(duration, 2),
+        "speech_ratio": round(float(speech.mean()), 3),
+        "pause_count": int(len(pauses)),
+        "mean_pause": round(float(pauses.mean()), 3) if len(pauses) else 0,
+        "rms_mean": round(float(rms[speech].mean()), 4),
+        "volume_variability": round(float(speech_db.std()), 2),
+        "pitch_mean": round(float(pitch.mean()), 1) if len(pitch) else 0,
+        "pitch_std": round(float(pitch.std()), 1) if len(pitch) else 0,
+        "pitch_range": round(float(np.percentile(pitch, 95) - np.percentile(pitch, 5)), 1) if len(pitch) else 0,
+        "speaking_rate": round(float(rate), 2),
+        "speaking_rate_stability": round(float(stability), 3)
+    }
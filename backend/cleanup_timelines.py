@@ -0,0 +1,68 @@
+# backend/cleanup_timelines.py
+"""
+Delete gesture timeline files that no saved analysis points to; run daily
+(e.g. from cron) from the same directory as the API.
+
+    python cleanup_timelines.py [--min-age-hours 24] [--dry-run]
+
+/analyze writes the timeline next to the upload before the user decides
+whether to save the analysis, so unsaved analyses leave their files behind.
+Files younger than --min-age-hours are kept, since their analysis may still
+be saved.
+"""
+import argparse
+import os
+import time
+from gesture_timeline import TIMELINE_SUFFIX
+from storage import export_chunks
+
+UPLOADS_DIR = os.getenv("UPLOADS_DIR", "uploads")
+CLEANUP_CHUNK_ROWS = 10000
+
+def saved_timelines():
+    """Absolute paths of every timeline a saved analysis refers to"""
+    sql = "SELECT timeline_path FROM speech_analyses WHERE timeline_path IS NOT NULL AND timeline_path <> ''"
+    return {
+        os.path.abspath(path)
+        for rows in export_chunks(sql, (), CLEANUP_CHUNK_ROWS)
+        for (path,) in rows
+    }
+
+def cleanup_timelines(min_age_hours=24, dry_run=False):
+    """Remove orphaned timeline files older than `min_age_hours`"""
+    try:
+        if not os.path.isdir(UPLOADS_DIR):
+            print(f"✅ No {UPLOADS_DIR} directory, nothing to clean up")
+            return {"success": True, "removed": []}
+        cutoff = time.time() - min_age_hours * 3600
+        # Listed before reading the database, so a file saved meanwhile is
+        # either too new or already referenced
+        candidates = [
+            entry.path for entry in os.scandir(UPLOADS_DIR)
+            if entry.name.endswith(TIMELINE_SUFFIX) and entry.stat().st_mtime < cutoff
+        ]
+        saved = saved_timelines()
+
+        removed = []
+        for path in candidates:
+            if os.path.abspath(path) in saved:
+                continue
+            if dry_run:
+                print(f"   would remove {path}")
+            else:
+                os.remove(path)
+            removed.append(path)
+
+        print(f"✅ Removed {len(removed)} orphaned timeline(s){' (dry run)' if dry_run else ''}")
+        return {"success": True, "removed": removed}
+    except Exception as e:
+        print(f"❌ Timeline cleanup failed: {e}")
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Delete timeline files of analyses that were never saved")
+    parser.add_argument("--min-age-hours", type=float, default=24, help="keep files younger than this")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    if not cleanup_timelines(args.min_age_hours, args.dry_run)["success"]:
+        raise SystemExit(1)
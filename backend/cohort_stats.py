@@ -0,0 +1,174 @@
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from database import COHORT_METRICS, ANALYSIS_COLUMNS, analysis_values, cohort_topic
+
+# Where a user stands among everyone (or everyone who spoke on the same
+# topic) comes from the equi-depth histograms in score_histograms, held here
+# in memory. The table is rebuilt every COHORT_REFRESH_SECONDS; in between,
+# each save is added to this worker's copy, so lookups never touch the
+# analyses table.
+COHORT_REFRESH_SECONDS = float(os.getenv("COHORT_REFRESH_SECONDS", "600"))
+# How often to look again while the table is still empty (a fresh install)
+COHORT_EMPTY_RETRY_SECONDS = min(COHORT_REFRESH_SECONDS, 30)
+
+
+class ScoreSketch:
+    """
+    One metric's histogram for one cohort: buckets of about equal size with
+    the lowest and highest value in each. The rank of a value is the count of
+    every bucket below it plus an interpolated share of its own bucket.
+    """
+
+    def __init__(self, buckets):
+        self.mins = [b[0] for b in buckets]
+        self.maxs = [b[1] for b in buckets]
+        self.counts = [b[2] for b in buckets]
+        self.below = []
+        total = 0
+        for count in self.counts:
+            self.below.append(total)
+            total += count
+        self.total = total
+
+    def add(self, value):
+        """Count one more analysis; its bucket widens to fit if needed"""
+        i = max(bisect_right(self.mins, value) - 1, 0)
+        self.mins[i] = min(self.mins[i], value)
+        self.maxs[i] = max(self.maxs[i], value)
+        self.counts[i] += 1
+        for j in range(i + 1, len(self.below)):
+            self.below[j] += 1
+        self.total += 1
+
+    def percentile(self, value):
+        """Percentile rank (0-100) of `value` in the cohort; ties count half"""
+        below = self._rank(value, bisect_left(self.maxs, value), inclusive=False)
+        at_or_below = self._rank(value, bisect_right(self.mins, value) - 1, inclusive=True)
+        return round(50 * (below + at_or_below) / self.total, 1)
+
+    def _rank(self, value, i, inclusive):
+        """Analyses below (or up to) `value` in and below bucket i, interpolated within it"""
+        if i < 0:
+            return 0
+        if i >= len(self.counts):
+            return self.total
+        low, high = self.mins[i], self.maxs[i]
+        if value < low or (value == low and not inclusive):
+            share = 0.0
+        elif value > high or (value == high and inclusive):
+            share = 1.0
+        else:
+            share = (value - low) / (high - low)
+        # A bucket's min and max are analyses of their own: at least one is
+        # at or above `low` and at least one is not below `high`
+        count = self.counts[i]
+        if count and inclusive and value >= low:
+            share = max(share, 1 / count)
+        elif count and not inclusive and value <= high:
+            share = min(share, 1 - 1 / count)
+        return self.below[i] + share * count
+
+
+class CohortStats:
+    """
+    Every (metric, cohort) sketch, cohort "" being everyone. Saves newer
+    than the last table rebuild are replayed after each load(), so this
+    worker's own increments survive until the table includes them; both
+    sides of that comparison are database timestamps. A save of a metric
+    the table has no histogram for yet starts one for everyone.
+    """
+
+    def __init__(self):
+        self._sketches = {}
+        self._recent = []
+        self._refreshed_at = None
+        self._loaded = False
+        self._has_histograms = False
+        self._lock = threading.Lock()
+        self._stats = {"loads": 0, "added": 0}
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    @property
+    def has_histograms(self):
+        """Whether the last load found any stored histograms"""
+        return self._has_histograms
+
+    def load(self, buckets):
+        """Replace the sketches with (metric, cohort, bucket, min, max, count, refreshed_at) rows"""
+        grouped = {}
+        refreshed_at = None
+        for metric, cohort, _, low, high, count, at in buckets:
+            grouped.setdefault((metric, cohort), []).append((low, high, count))
+            refreshed_at = at if refreshed_at is None else min(refreshed_at, at)
+        sketches = {key: ScoreSketch(rows) for key, rows in grouped.items()}
+        with self._lock:
+            self._recent = [r for r in self._recent if refreshed_at is None or r[0] > refreshed_at]
+            for _, topic, values in self._recent:
+                self._add(sketches, topic, values)
+            self._sketches = sketches
+            self._refreshed_at = refreshed_at
+            self._loaded = True
+            self._has_histograms = bool(grouped)
+            self._stats["loads"] += 1
+
+    def add_analysis(self, analysis_data, analyzed_at):
+        """Count a just-saved analysis (the analysis_data passed to save_analysis and its analyzed_at)"""
+        row = dict(zip((name for name, _ in ANALYSIS_COLUMNS), analysis_values(None, analysis_data, None)))
+        values = {metric: row[column] for metric, column in COHORT_METRICS.items() if row[column] is not None}
+        topic = cohort_topic(row["topic"])
+        with self._lock:
+            self._recent.append((analyzed_at, topic, values))
+            self._add(self._sketches, topic, values)
+            self._stats["added"] += 1
+
+    @staticmethod
+    def _add(sketches, topic, values):
+        for metric, value in values.items():
+            if (metric, "") not in sketches:
+                sketches[(metric, "")] = ScoreSketch([(value, value, 0)])
+            for cohort in ("", topic) if topic else ("",):
+                sketch = sketches.get((metric, cohort))
+                if sketch is not None:
+                    sketch.add(value)
+
+    def percentiles(self, analysis, metrics, by_topic=False):
+        """Response body of /percentiles for a get_cohort_analysis result"""
+        topic = cohort_topic(analysis["topic"])
+        ranks = {}
+        with self._lock:
+            for metric in metrics:
+                value = analysis["values"].get(metric)
+                sketch = self._sketches.get((metric, topic)) if by_topic and topic else None
+                cohort = topic if sketch is not None else "all"
+                sketch = sketch or self._sketches.get((metric, ""))
+                if value is None or sketch is None or not sketch.total:
+                    ranks[metric] = None
+                    continue
+                ranks[metric] = {
+                    "value": round(value, 2),
+                    "percentile": sketch.percentile(value),
+                    "cohort": cohort,
+                    "cohort_size": sketch.total
+                }
+            refreshed_at = self._refreshed_at
+        return {
+            "success": True,
+            "analysis_id": analysis["analysis_id"],
+            "session_number": analysis["session_number"],
+            "topic": analysis["topic"],
+            "percentiles": ranks,
+            "refreshed_at": refreshed_at.strftime("%Y-%m-%d %H:%M:%S") if refreshed_at else None
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sketches": len(self._sketches),
+                "pending": len(self._recent),
+                "refreshed_at": self._refreshed_at.strftime("%Y-%m-%d %H:%M:%S") if self._refreshed_at else None,
+                **self._stats
+            }
@@ -0,0 +1,12 @@
+import pytest
+import sqlite_database
+
+
+@pytest.fixture
+def sqlite_db(tmp_path, monkeypatch):
+    """A fresh SQLite database for one test"""
+    monkeypatch.setattr(sqlite_database, "SQLITE_PATH", str(tmp_path / "test.db"))
+    sqlite_database.close_db()
+    sqlite_database.init_db()
+    yield sqlite_database
+    sqlite_database.close_db()
@@ -1,22 +1,197 @@
 # backend/database.py
 import psycopg2
 from psycopg2 import pool
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+import base64
 import hashlib
+import html
 import os
+import re
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 from dotenv import load_dotenv
+from migrations import LATEST_SCHEMA_VERSION, apply_migrations, schema_version
 
 load_dotenv()
 
+# "postgres", or "sqlite" for the embedded backend in sqlite_database.py
+DB_BACKEND = os.getenv("DB_BACKEND", "postgres").lower()
+
 # Database connection pool
 db_pool = None
 
+# Pool sizing and timeouts, overridable from .env
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "5"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "15000"))
+DB_HEALTHCHECK_AFTER = float(os.getenv("DB_HEALTHCHECK_AFTER", "30"))
+# Apply pending migrations at startup instead of at deploy time (development)
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "0") == "1"
+
+# Text search configuration of speech_analyses.search_vector (see
+# migrations/0001_baseline.sql); changing it takes a migration
+SEARCH_CONFIG = "english"
+
+# Shared queries use psycopg2's %s placeholders (and %% for a literal %).
+# The other drivers get them rewritten by rewrite_placeholders, which skips
+# string literals, quoted identifiers and comments, so a '%s' in a LIKE
+# pattern stays text instead of shifting every later parameter.
+_SQL_TOKENS = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|--[^\n]*|/\*.*?\*/|%%|%s", re.DOTALL)
+
+def rewrite_placeholders(sql, placeholder):
+    """`sql` with the n-th %s placeholder replaced by placeholder(n), counting from 1"""
+    count = 0
+    def rewrite(match):
+        nonlocal count
+        token = match.group()
+        if token == "%s":
+            count += 1
+            return placeholder(count)
+        if token == "%%" or token[0] in "'\"":
+            return token.replace("%%", "%")
+        return token
+    return _SQL_TOKENS.sub(rewrite, sql)
+
+def _integer(value):
+    return int(round(value)) if isinstance(value, float) else int(value)
+
+class DatabasePool:
+    """
+    Thread-safe psycopg2 connection pool shared by FastAPI's worker threads.
+
+    Callers wait up to `timeout` seconds for a free connection instead of
+    failing as soon as all of them are in use. A connection that sat idle for
+    more than `healthcheck_after` seconds is pinged before it is handed out
+    and replaced if the server dropped it. Every session runs with a
+    statement_timeout so one slow query cannot hold a connection forever.
+
+    psycopg2 keeps at most `minconn` idle connections and closes the rest on
+    return, so minconn should cover normal concurrency to avoid reconnecting.
+    """
+
+    def __init__(self, minconn, maxconn, timeout=10.0, healthcheck_after=30.0,
+                 statement_timeout_ms=15000, **connect_kwargs):
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.healthcheck_after = healthcheck_after
+        self._pool = psycopg2.pool.ThreadedConnectionPool(
+            minconn, maxconn,
+            options=f"-c statement_timeout={statement_timeout_ms}",
+            **connect_kwargs
+        )
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._last_used = {}
+        self._in_use = 0
+        self._stats = {
+            "checkouts": 0,
+            "waited": 0,
+            "timeouts": 0,
+            "replaced": 0,
+            "wait_seconds": 0.0,
+            "max_wait_seconds": 0.0
+        }
+
+    def checkout(self, timeout=None):
+        """Take a healthy connection, waiting up to `timeout` seconds for one"""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=timeout):
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise pool.PoolError(f"No database connection available after {timeout:.0f}s")
+        waited = time.perf_counter() - started
+
+        try:
+            conn = self._healthy(self._pool.getconn())
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use += 1
+            self._stats["checkouts"] += 1
+            self._stats["wait_seconds"] += waited
+            self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], waited)
+            if waited > 0.001:
+                self._stats["waited"] += 1
+        return conn
+
+    def checkin(self, conn, broken=False):
+        """Return a connection, rolling back anything left open"""
+        try:
+            if not conn.closed and conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except psycopg2.Error:
+            broken = True
+        try:
+            self._pool.putconn(conn, close=broken or bool(conn.closed))
+        finally:
+            if conn.closed:
+                self._last_used.pop(id(conn), None)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        conn = self.checkout(timeout=timeout)
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.checkin(conn, broken=broken)
+
+    def _healthy(self, conn):
+        idle = time.monotonic() - self._last_used.get(id(conn), time.monotonic())
+        if not conn.closed and idle < self.healthcheck_after:
+            return conn
+        if not conn.closed:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                conn.rollback()
+                return conn
+            except psycopg2.Error as e:
+                print(f"⚠️ Dropping dead database connection: {e}")
+        self._last_used.pop(id(conn), None)
+        self._pool.putconn(conn, close=True)
+        with self._lock:
+            self._stats["replaced"] += 1
+        # The next pooled connection may have been dropped too
+        return self._healthy(self._pool.getconn())
+
+    def stats(self):
+        """Checkout counts and how long callers waited for a connection"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_use"] = self._in_use
+        stats["max_connections"] = self.maxconn
+        stats["avg_wait_ms"] = round(stats["wait_seconds"] / max(stats["checkouts"], 1) * 1000, 2)
+        stats["max_wait_ms"] = round(stats.pop("max_wait_seconds") * 1000, 2)
+        stats.pop("wait_seconds")
+        return stats
+
+    def close(self):
+        self._pool.closeall()
+
 def init_db_pool():
     """Initialize database connection pool"""
     global db_pool
     try:
-        db_pool = psycopg2.pool.SimpleConnectionPool(
-            1, 20,
+        db_pool = DatabasePool(
+            DB_POOL_MIN, DB_POOL_MAX,
+            timeout=DB_POOL_TIMEOUT,
+            healthcheck_after=DB_HEALTHCHECK_AFTER,
+            statement_timeout_ms=DB_STATEMENT_TIMEOUT_MS,
             host=os.getenv("DB_HOST", "localhost"),
             database=os.getenv("DB_NAME", "extempore_db"),
             user=os.getenv("DB_USER", "postgres"),
@@ -24,489 +199,1063 @@ def init_db_pool():
             port=os.getenv("DB_PORT", "5432")
         )
         print("✅ Database connection pool created successfully")
-        create_tables()
+        check_schema_version()
     except Exception as e:
         print(f"❌ Error creating connection pool: {e}")
         raise
 
-def get_db_connection():
-    """Get a connection from the pool"""
-    return db_pool.getconn()
+def close_db_pool():
+    """Close every pooled connection (app shutdown)"""
+    if db_pool is not None:
+        db_pool.close()
 
-def release_db_connection(conn):
-    """Return a connection to the pool"""
-    db_pool.putconn(conn)
+def pool_stats():
+    """Connection pool usage, or None when the database is not initialized"""
+    return db_pool.stats() if db_pool is not None else None
 
-def create_tables():
-    """Create necessary database tables"""
-    conn = get_db_connection()
-    try:
-        cursor = conn.cursor()
-        
-        # Users table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id SERIAL PRIMARY KEY,
-                username VARCHAR(50) UNIQUE NOT NULL,
-                email VARCHAR(100) UNIQUE NOT NULL,
-                password_hash VARCHAR(64) NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_login TIMESTAMP
-            )
-        """)
-        
-        # Enhanced speech analyses table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS speech_analyses (
-                analysis_id SERIAL PRIMARY KEY,
-                user_id INTEGER REFERENCES users(user_id) ON DELETE CASCADE,
-                filename VARCHAR(255),
-                video_path VARCHAR(500),
-                topic TEXT,
-                transcription TEXT,
-                
-                -- Feedback scores
-                clarity_score FLOAT,
-                clarity_comment TEXT,
-                arguments_score FLOAT,
-                arguments_comment TEXT,
-                grammar_score FLOAT,
-                grammar_comment TEXT,
-                delivery_score FLOAT,
-                delivery_comment TEXT,
-                overall_score FLOAT,
-                overall_comment TEXT,
-                
-                -- Gesture metrics
-                smile_mean FLOAT,
-                eyebrow_raise_mean FLOAT,
-                blink_count INTEGER,
-                head_pose_mean FLOAT,
-                
-                -- Calculated metrics
-                confidence_score FLOAT,
-                nervousness_score FLOAT,
-                
-                -- File info
-                file_duration FLOAT,
-                file_size INTEGER,
-                
-                -- Timestamps
-                analyzed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                
-                -- Session tracking
-                session_number INTEGER DEFAULT 1
-            )
-        """)
-        
-        # Check if topic column exists, if not add it
-        cursor.execute("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name='speech_analyses' AND column_name='topic'
-        """)
-        
-        if cursor.fetchone() is None:
-            print("⚠️ Adding missing 'topic' column to speech_analyses table...")
-            cursor.execute("""
-                ALTER TABLE speech_analyses 
-                ADD COLUMN topic TEXT
-            """)
-            print("✅ 'topic' column added successfully")
-        
-        # Create index for faster queries
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_user_analyses 
-            ON speech_analyses(user_id, analyzed_at DESC)
-        """)
-        
+@contextmanager
+def db_connection(timeout=None):
+    """A pooled connection; uncommitted work is rolled back when it is returned"""
+    if db_pool is None:
+        raise RuntimeError("Database pool is not initialized")
+    with db_pool.connection(timeout=timeout) as conn:
+        yield conn
+
+@contextmanager
+def db_cursor(timeout=None):
+    """Cursor on a pooled connection; commits on success, rolls back on error"""
+    with db_connection(timeout=timeout) as conn:
+        with conn.cursor() as cursor:
+            yield cursor
         conn.commit()
-        print("✅ Database tables created/verified successfully")
-    except Exception as e:
-        print(f"❌ Error creating tables: {e}")
-        conn.rollback()
-    finally:
-        cursor.close()
-        release_db_connection(conn)
-                
+
+def check_schema_version():
+    """
+    Compare the database's schema version with the migrations in this
+    checkout. Migrations are applied at deploy time with `python migrate.py`;
+    with DB_AUTO_MIGRATE=1 a starting process applies pending ones itself.
+    """
+    with db_connection() as conn:
+        if DB_AUTO_MIGRATE:
+            apply_migrations(conn)
+        with conn.cursor() as cursor:
+            version = schema_version(cursor)
+    if version < LATEST_SCHEMA_VERSION:
+        print(f"⚠️ Database schema is at version {version}, code expects {LATEST_SCHEMA_VERSION}; run `python migrate.py`")
+    elif version > LATEST_SCHEMA_VERSION:
+        print(f"⚠️ Database schema version {version} is newer than this code ({LATEST_SCHEMA_VERSION})")
+    else:
+        print(f"✅ Database schema is up to date (version {version})")
+    return version
+
 def hash_password(password):
     """Hash a password using SHA-256"""
     return hashlib.sha256(password.encode()).hexdigest()
 
+# Queries and row formatting below are shared with async_database, which
+# serves the same results to the async endpoints.
+REGISTER_USER_SQL = "INSERT INTO users (username, email, password_hash) VALUES (%s, %s, %s) RETURNING user_id"
+LOGIN_USER_SQL = "SELECT user_id, username, email FROM users WHERE username = %s AND password_hash = %s"
+# Writes a batch of buffered logins (parallel arrays of user ids and times);
+# GREATEST keeps a later login another API worker already wrote
+RECORD_LOGINS_SQL = """
+    UPDATE users AS u SET last_login = GREATEST(u.last_login, v.last_login)
+    FROM unnest(%s::integer[], %s::timestamp[]) AS v(user_id, last_login)
+    WHERE u.user_id = v.user_id
+"""
+# Takes the user's session counter; the row lock it holds until commit
+# serializes concurrent saves of the same user
+NEXT_SESSION_SQL = "UPDATE users SET next_session = next_session + 1 WHERE user_id = %s RETURNING next_session - 1"
+
+# Columns of a saved analysis with their Postgres types, in analysis_values
+# order. speech_analyses holds the narrow ones that dashboards read; the
+# long texts go to analysis_texts, which only detail views, search and
+# exports join (both tables are partitioned by month of analyzed_at).
+ANALYSIS_COLUMNS = [
+    ("user_id", "integer"), ("filename", "varchar"), ("video_path", "varchar"),
+    ("topic", "text"), ("transcription", "text"),
+    ("clarity_score", "float8"), ("clarity_comment", "text"),
+    ("arguments_score", "float8"), ("arguments_comment", "text"),
+    ("grammar_score", "float8"), ("grammar_comment", "text"),
+    ("delivery_score", "float8"), ("delivery_comment", "text"),
+    ("overall_score", "float8"), ("overall_comment", "text"),
+    ("smile_mean", "float8"), ("eyebrow_raise_mean", "float8"), ("blink_count", "integer"), ("head_pose_mean", "float8"),
+    ("speech_ratio", "float8"), ("pause_count", "integer"), ("volume_variability", "float8"),
+    ("pitch_mean", "float8"), ("pitch_std", "float8"), ("speaking_rate", "float8"), ("speaking_rate_stability", "float8"),
+    ("confidence_score", "float8"), ("nervousness_score", "float8"), ("scoring_version", "integer"),
+    ("file_duration", "float8"), ("file_size", "integer"), ("timeline_path", "varchar"),
+    ("session_number", "integer"),
+]
+ANALYSIS_TEXT_COLUMNS = [
+    "transcription", "clarity_comment", "arguments_comment", "grammar_comment", "delivery_comment", "overall_comment"
+]
+_NARROW_COLUMNS = [name for name, _ in ANALYSIS_COLUMNS if name not in ANALYSIS_TEXT_COLUMNS]
+
+# Inserts both rows in one statement; returns (analysis_id, analyzed_at),
+# the key of the new row in both tables
+INSERT_ANALYSIS_SQL = f"""
+    WITH v ({', '.join(name for name, _ in ANALYSIS_COLUMNS)}) AS (
+        VALUES ({', '.join(f'%s::{type_}' for _, type_ in ANALYSIS_COLUMNS)})
+    ), a AS (
+        INSERT INTO speech_analyses ({', '.join(_NARROW_COLUMNS)})
+        SELECT {', '.join(_NARROW_COLUMNS)} FROM v
+        RETURNING analysis_id, analyzed_at, user_id
+    ), t AS (
+        INSERT INTO analysis_texts (analysis_id, analyzed_at, user_id, {', '.join(ANALYSIS_TEXT_COLUMNS)}, search_vector)
+        SELECT a.analysis_id, a.analyzed_at, a.user_id, {', '.join('v.' + c for c in ANALYSIS_TEXT_COLUMNS)},
+               setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(v.topic, '')), 'A') ||
+               setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(v.transcription, '')), 'B')
+        FROM a, v
+    )
+    SELECT analysis_id, analyzed_at FROM a
+"""
+
+def registration_error(e):
+    """User-facing message for a unique violation on users"""
+    if "username" in str(e):
+        return {"success": False, "message": "Username already exists"}
+    elif "email" in str(e):
+        return {"success": False, "message": "Email already exists"}
+    return {"success": False, "message": "Registration failed"}
+
+def not_found(message):
+    """Result of a lookup that matched nothing (the API answers 404; other failures are errors)"""
+    return {"success": False, "not_found": True, "message": message}
+
+def analysis_values(user_id, analysis_data, session_number):
+    """
+    Parameters for INSERT_ANALYSIS_SQL from an /analyze response, converted
+    to each column's Python type: asyncpg rejects a float (or a NumPy
+    scalar) for an integer column where psycopg2 would let it through
+    """
+    values = _analysis_values(user_id, analysis_data, session_number)
+    return tuple(
+        value if value is None else
+        _integer(value) if type_ == "integer" else
+        float(value) if type_ == "float8" else value
+        for value, (_, type_) in zip(values, ANALYSIS_COLUMNS)
+    )
+
+def _analysis_values(user_id, analysis_data, session_number):
+    feedback = analysis_data.get('feedback', {})
+    gesture_metrics = analysis_data.get('gesture_metrics', {})
+    audio_metrics = analysis_data.get('audio_metrics') or {}
+    
+    # Safely extract topic with default empty string
+    topic = analysis_data.get('topic', '')
+    
+    return (
+        user_id,
+        analysis_data.get('filename', ''),
+        analysis_data.get('video_path', ''),
+        topic,
+        analysis_data.get('transcription', ''),
+        feedback.get('Clarity', {}).get('score', 0),
+        feedback.get('Clarity', {}).get('comment', ''),
+        feedback.get('Arguments', {}).get('score', 0),
+        feedback.get('Arguments', {}).get('comment', ''),
+        feedback.get('Grammar', {}).get('score', 0),
+        feedback.get('Grammar', {}).get('comment', ''),
+        feedback.get('Delivery', {}).get('score', 0),
+        feedback.get('Delivery', {}).get('comment', ''),
+        feedback.get('Overall', {}).get('score', 0),
+        feedback.get('Overall', {}).get('comment', ''),
+        gesture_metrics.get('smile_mean', 0),
+        gesture_metrics.get('eyebrow_raise_mean', 0),
+        gesture_metrics.get('blink_count', 0),
+        gesture_metrics.get('head_pose_mean', 0),
+        audio_metrics.get('speech_ratio', 0),
+        audio_metrics.get('pause_count', 0),
+        audio_metrics.get('volume_variability', 0),
+        audio_metrics.get('pitch_mean', 0),
+        audio_metrics.get('pitch_std', 0),
+        audio_metrics.get('speaking_rate', 0),
+        audio_metrics.get('speaking_rate_stability', 0),
+        analysis_data.get('confidence_score', 0),
+        analysis_data.get('nervousness_score', 0),
+        analysis_data.get('scoring_version'),
+        analysis_data.get('file_duration', 0),
+        analysis_data.get('file_size', 0),
+        analysis_data.get('timeline_path'),
+        session_number
+    )
+
 def register_user(username, email, password):
     """Register a new user"""
-    conn = get_db_connection()
     try:
-        cursor = conn.cursor()
-        password_hash = hash_password(password)
-        
-        cursor.execute(
-            "INSERT INTO users (username, email, password_hash) VALUES (%s, %s, %s) RETURNING user_id",
-            (username, email, password_hash)
-        )
-        user_id = cursor.fetchone()[0]
-        conn.commit()
+        with db_cursor() as cursor:
+            cursor.execute(REGISTER_USER_SQL, (username, email, hash_password(password)))
+            user_id = cursor.fetchone()[0]
         return {"success": True, "user_id": user_id, "message": "User registered successfully"}
     except psycopg2.IntegrityError as e:
-        conn.rollback()
-        if "username" in str(e):
-            return {"success": False, "message": "Username already exists"}
-        elif "email" in str(e):
-            return {"success": False, "message": "Email already exists"}
-        return {"success": False, "message": "Registration failed"}
+        return registration_error(e)
     except Exception as e:
-        conn.rollback()
         return {"success": False, "message": f"Error: {str(e)}"}
-    finally:
-        cursor.close()
-        release_db_connection(conn)
 
 def login_user(username, password):
-    """Authenticate a user"""
-    conn = get_db_connection()
+    """Authenticate a user; the caller records last_login (see record_logins)"""
     try:
-        cursor = conn.cursor()
-        password_hash = hash_password(password)
-        
-        cursor.execute(
-            "SELECT user_id, username, email FROM users WHERE username = %s AND password_hash = %s",
-            (username, password_hash)
-        )
-        user = cursor.fetchone()
+        with db_cursor() as cursor:
+            cursor.execute(LOGIN_USER_SQL, (username, hash_password(password)))
+            user = cursor.fetchone()
         
-        if user:
-            # Update last login
-            cursor.execute(
-                "UPDATE users SET last_login = %s WHERE user_id = %s",
-                (datetime.now(), user[0])
-            )
-            conn.commit()
-            return {
-                "success": True,
-                "user_id": user[0],
-                "username": user[1],
-                "email": user[2]
-            }
-        return {"success": False, "message": "Invalid username or password"}
+            if user:
+                return {
+                    "success": True,
+                    "user_id": user[0],
+                    "username": user[1],
+                    "email": user[2]
+                }
+            return {"success": False, "message": "Invalid username or password"}
+    except Exception as e:
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+def record_logins(logins):
+    """Set last_login of many users at once from (user_id, last_login) pairs"""
+    try:
+        with db_cursor() as cursor:
+            cursor.execute(RECORD_LOGINS_SQL, ([u for u, _ in logins], [t for _, t in logins]))
+            updated = cursor.rowcount
+        return {"success": True, "updated": updated}
     except Exception as e:
         return {"success": False, "message": f"Error: {str(e)}"}
-    finally:
-        cursor.close()
-        release_db_connection(conn)
 
 def save_analysis(user_id, analysis_data):
     """Save speech analysis results with enhanced tracking"""
-    conn = get_db_connection()
     try:
-        cursor = conn.cursor()
-        
-        feedback = analysis_data.get('feedback', {})
-        gesture_metrics = analysis_data.get('gesture_metrics', {})
-        
-        # Get session number (count of previous analyses + 1)
-        cursor.execute(
-            "SELECT COUNT(*) FROM speech_analyses WHERE user_id = %s",
-            (user_id,)
-        )
-        session_number = cursor.fetchone()[0] + 1
-        
-        # Safely extract topic with default empty string
-        topic = analysis_data.get('topic', '')
-        
-        cursor.execute("""
-            INSERT INTO speech_analyses (
-                user_id, filename, video_path, topic, transcription,
-                clarity_score, clarity_comment,
-                arguments_score, arguments_comment,
-                grammar_score, grammar_comment,
-                delivery_score, delivery_comment,
-                overall_score, overall_comment,
-                smile_mean, eyebrow_raise_mean, blink_count, head_pose_mean,
-                confidence_score, nervousness_score,
-                file_duration, file_size,
-                session_number
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING analysis_id
-        """, (
-            user_id,
-            analysis_data.get('filename', ''),
-            analysis_data.get('video_path', ''),
-            topic,
-            analysis_data.get('transcription', ''),
-            feedback.get('Clarity', {}).get('score', 0),
-            feedback.get('Clarity', {}).get('comment', ''),
-            feedback.get('Arguments', {}).get('score', 0),
-            feedback.get('Arguments', {}).get('comment', ''),
-            feedback.get('Grammar', {}).get('score', 0),
-            feedback.get('Grammar', {}).get('comment', ''),
-            feedback.get('Delivery', {}).get('score', 0),
-            feedback.get('Delivery', {}).get('comment', ''),
-            feedback.get('Overall', {}).get('score', 0),
-            feedback.get('Overall', {}).get('comment', ''),
-            gesture_metrics.get('smile_mean', 0),
-            gesture_metrics.get('eyebrow_raise_mean', 0),
-            gesture_metrics.get('blink_count', 0),
-            gesture_metrics.get('head_pose_mean', 0),
-            analysis_data.get('confidence_score', 0),
-            analysis_data.get('nervousness_score', 0),
-            analysis_data.get('file_duration', 0),
-            analysis_data.get('file_size', 0),
-            session_number
-        ))
-        
-        analysis_id = cursor.fetchone()[0]
-        conn.commit()
+        with db_cursor() as cursor:
+            cursor.execute(NEXT_SESSION_SQL, (user_id,))
+            session = cursor.fetchone()
+            if session is None:
+                return {"success": False, "message": "User not found"}
+            session_number = session[0]
+            
+            cursor.execute(INSERT_ANALYSIS_SQL, analysis_values(user_id, analysis_data, session_number))
+            analysis_id, analyzed_at = cursor.fetchone()
+            cursor.execute(UPDATE_USER_STATS_SQL, (analysis_id, analyzed_at))
         print(f"✅ Analysis saved successfully: ID {analysis_id}, Session {session_number}")
-        return {"success": True, "analysis_id": analysis_id, "session_number": session_number}
+        return {"success": True, "analysis_id": analysis_id, "session_number": session_number, "analyzed_at": analyzed_at}
     except Exception as e:
-        conn.rollback()
         print(f"❌ Error saving analysis: {e}")
         return {"success": False, "message": f"Error: {str(e)}"}
-    finally:
-        cursor.close()
-        release_db_connection(conn)
                 
-def get_user_history(user_id, limit=10):
-    """Get user's speech analysis history"""
-    conn = get_db_connection()
+def get_analysis_details(analysis_id):
+    """Get detailed analysis by ID"""
     try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT analysis_id, filename, topic, overall_score, 
-                   confidence_score, nervousness_score, analyzed_at
-            FROM speech_analyses
-            WHERE user_id = %s
-            ORDER BY analyzed_at DESC
-            LIMIT %s
-        """, (user_id, limit))
+        with db_cursor() as cursor:
+            cursor.execute(f"""
+                SELECT a.*, {', '.join('t.' + c for c in ANALYSIS_TEXT_COLUMNS)}
+                FROM speech_analyses AS a
+                LEFT JOIN analysis_texts AS t USING (analysis_id, analyzed_at)
+                WHERE a.analysis_id = %s
+            """, (analysis_id,))
         
-        results = cursor.fetchall()
-        history = []
-        for row in results:
-            history.append({
-                "analysis_id": row[0],
-                "filename": row[1],
-                "topic": row[2],
-                "overall_score": row[3],
-                "confidence_score": row[4],
-                "nervousness_score": row[5],
-                "analyzed_at": row[6].strftime("%Y-%m-%d %H:%M:%S")
-            })
-        return {"success": True, "history": history}
+            result = cursor.fetchone()
+            if result:
+                return {"success": True, "analysis": result}
+            return not_found("Analysis not found")
     except Exception as e:
         return {"success": False, "message": f"Error: {str(e)}"}
-    finally:
-        cursor.close()
-        release_db_connection(conn)
 
-def get_analysis_details(analysis_id):
-    """Get detailed analysis by ID"""
-    conn = get_db_connection()
+TIMELINE_PATH_SQL = """
+    SELECT timeline_path FROM speech_analyses
+    WHERE user_id = %s AND analysis_id = %s
+"""
+
+def format_timeline_path(result):
+    """Response of get_timeline_path from its row (None if no such analysis)"""
+    if result is None:
+        return not_found("Analysis not found")
+    if not result[0]:
+        return not_found("No timeline stored for this analysis")
+    return {"success": True, "timeline_path": result[0]}
+
+def get_timeline_path(user_id, analysis_id):
+    """Get the stored per-frame gesture timeline file of an analysis"""
     try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT * FROM speech_analyses WHERE analysis_id = %s
-        """, (analysis_id,))
-        
-        result = cursor.fetchone()
-        if result:
-            return {"success": True, "analysis": result}
-        return {"success": False, "message": "Analysis not found"}
+        with db_cursor() as cursor:
+            cursor.execute(TIMELINE_PATH_SQL, (user_id, analysis_id))
+            result = cursor.fetchone()
+        return format_timeline_path(result)
     except Exception as e:
         return {"success": False, "message": f"Error: {str(e)}"}
-    finally:
-        cursor.close()
-        release_db_connection(conn)
 
-def get_user_statistics(user_id):
-    """Get user's overall statistics and progress"""
-    conn = get_db_connection()
+def export_chunks(sql, params, chunk_rows):
+    """Lists of result rows for bulk exports, read from a server-side cursor"""
+    with db_connection() as conn:
+        # A named cursor keeps the result on the server; only one chunk at a
+        # time crosses the wire. Each FETCH is its own statement, so the
+        # pool's statement_timeout does not cap the whole export.
+        with conn.cursor(name="analysis_export") as cursor:
+            cursor.itersize = chunk_rows
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                yield rows
+
+# Per-user statistics are kept in user_stats, updated in the same transaction
+# as each insert, so the dashboard reads one row instead of aggregating the
+# whole history. first_scores/recent_scores hold the scores of the first and
+# latest STATS_WINDOW sessions as [{"score", "session", "date"}, ...].
+STATS_WINDOW = 5
+
+USER_STATISTICS_SQL = """
+    SELECT 
+        total_analyses,
+        overall_sum / NULLIF(overall_count, 0) as avg_overall_score,
+        confidence_sum / NULLIF(confidence_count, 0) as avg_confidence,
+        nervousness_sum / NULLIF(nervousness_count, 0) as avg_nervousness,
+        best_score,
+        worst_score,
+        recent_scores,
+        first_scores
+    FROM user_stats
+    WHERE user_id = %s
+"""
+
+UPDATE_USER_STATS_SQL = f"""
+    INSERT INTO user_stats AS us (
+        user_id, total_analyses,
+        overall_sum, overall_count, confidence_sum, confidence_count,
+        nervousness_sum, nervousness_count, best_score, worst_score,
+        first_scores, recent_scores
+    )
+    SELECT
+        user_id, 1,
+        COALESCE(overall_score, 0), (overall_score IS NOT NULL)::int,
+        COALESCE(confidence_score, 0), (confidence_score IS NOT NULL)::int,
+        COALESCE(nervousness_score, 0), (nervousness_score IS NOT NULL)::int,
+        overall_score, overall_score,
+        jsonb_build_array(entry), jsonb_build_array(entry)
+    FROM (
+        SELECT *, jsonb_build_object(
+            'score', overall_score, 'session', session_number, 'date', to_char(analyzed_at, 'YYYY-MM-DD')
+        ) AS entry
+        FROM speech_analyses
+        WHERE analysis_id = %s AND analyzed_at = %s
+    ) AS a
+    ON CONFLICT (user_id) DO UPDATE SET
+        total_analyses = us.total_analyses + 1,
+        overall_sum = us.overall_sum + EXCLUDED.overall_sum,
+        overall_count = us.overall_count + EXCLUDED.overall_count,
+        confidence_sum = us.confidence_sum + EXCLUDED.confidence_sum,
+        confidence_count = us.confidence_count + EXCLUDED.confidence_count,
+        nervousness_sum = us.nervousness_sum + EXCLUDED.nervousness_sum,
+        nervousness_count = us.nervousness_count + EXCLUDED.nervousness_count,
+        best_score = GREATEST(us.best_score, EXCLUDED.best_score),
+        worst_score = LEAST(us.worst_score, EXCLUDED.worst_score),
+        first_scores = CASE WHEN jsonb_array_length(us.first_scores) < {STATS_WINDOW}
+                            THEN us.first_scores || EXCLUDED.first_scores
+                            ELSE us.first_scores END,
+        recent_scores = jsonb_path_query_array(EXCLUDED.recent_scores || us.recent_scores, '$[0 to {STATS_WINDOW - 1}]'),
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+# Recomputes every user's row from speech_analyses (backfill, rescoring)
+REBUILD_USER_STATS_SQL = f"""
+    INSERT INTO user_stats AS us (
+        user_id, total_analyses,
+        overall_sum, overall_count, confidence_sum, confidence_count,
+        nervousness_sum, nervousness_count, best_score, worst_score,
+        first_scores, recent_scores
+    )
+    SELECT
+        s.user_id, COUNT(*),
+        COALESCE(SUM(overall_score), 0), COUNT(overall_score),
+        COALESCE(SUM(confidence_score), 0), COUNT(confidence_score),
+        COALESCE(SUM(nervousness_score), 0), COUNT(nervousness_score),
+        MAX(overall_score), MIN(overall_score),
+        (SELECT jsonb_agg(w.entry ORDER BY w.session_number) FROM (
+            SELECT session_number, jsonb_build_object(
+                'score', overall_score, 'session', session_number, 'date', to_char(analyzed_at, 'YYYY-MM-DD')
+            ) AS entry
+            FROM speech_analyses WHERE user_id = s.user_id
+            ORDER BY session_number LIMIT {STATS_WINDOW}
+        ) AS w),
+        (SELECT jsonb_agg(w.entry ORDER BY w.session_number DESC) FROM (
+            SELECT session_number, jsonb_build_object(
+                'score', overall_score, 'session', session_number, 'date', to_char(analyzed_at, 'YYYY-MM-DD')
+            ) AS entry
+            FROM speech_analyses WHERE user_id = s.user_id
+            ORDER BY session_number DESC LIMIT {STATS_WINDOW}
+        ) AS w)
+    FROM speech_analyses AS s
+    GROUP BY s.user_id
+    ON CONFLICT (user_id) DO UPDATE SET
+        total_analyses = EXCLUDED.total_analyses,
+        overall_sum = EXCLUDED.overall_sum,
+        overall_count = EXCLUDED.overall_count,
+        confidence_sum = EXCLUDED.confidence_sum,
+        confidence_count = EXCLUDED.confidence_count,
+        nervousness_sum = EXCLUDED.nervousness_sum,
+        nervousness_count = EXCLUDED.nervousness_count,
+        best_score = EXCLUDED.best_score,
+        worst_score = EXCLUDED.worst_score,
+        first_scores = EXCLUDED.first_scores,
+        recent_scores = EXCLUDED.recent_scores,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+# History is paged newest first with a keyset on (analyzed_at, analysis_id),
+# which idx_user_analyses serves directly, so deep pages cost the same as the
+# first. `fields` limits a page to some of these column groups; analysis_id
+# and analyzed_at are always returned.
+HISTORY_FIELDS = {
+    "session_number": ("session_number",),
+    "filename": ("filename",),
+    "topic": ("topic",),
+    "scores": ("clarity_score", "arguments_score", "grammar_score", "delivery_score", "overall_score"),
+    "confidence_score": ("confidence_score",),
+    "nervousness_score": ("nervousness_score",),
+    "gestures": ("smile_mean", "eyebrow_raise_mean", "blink_count", "head_pose_mean"),
+}
+MAX_HISTORY_PAGE = 100
+
+def parse_history_fields(fields=None):
+    """Field groups requested as a comma-separated string (all when empty)"""
+    if not fields:
+        return list(HISTORY_FIELDS)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in HISTORY_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown history field(s): {', '.join(unknown)}")
+    return [f for f in HISTORY_FIELDS if f in requested]
+
+def encode_history_cursor(analyzed_at, analysis_id):
+    """Opaque cursor pointing just after the given row"""
+    raw = f"{analyzed_at.isoformat()}|{analysis_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_history_cursor(cursor):
+    """(analyzed_at, analysis_id) from encode_history_cursor, or None for the first page"""
+    if not cursor:
+        return None
     try:
-        cursor = conn.cursor()
-        
-        # Get overall statistics
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total_analyses,
-                AVG(overall_score) as avg_overall_score,
-                AVG(confidence_score) as avg_confidence,
-                AVG(nervousness_score) as avg_nervousness,
-                MAX(overall_score) as best_score,
-                MIN(overall_score) as worst_score
-            FROM speech_analyses
-            WHERE user_id = %s
-        """, (user_id,))
-        
-        stats = cursor.fetchone()
-        
-        # Get improvement trend (last 5 vs first 5)
-        cursor.execute("""
-            SELECT overall_score, session_number, analyzed_at
-            FROM speech_analyses
-            WHERE user_id = %s
-            ORDER BY analyzed_at DESC
-            LIMIT 5
-        """, (user_id,))
-        recent_scores = cursor.fetchall()
-        
-        cursor.execute("""
-            SELECT overall_score, session_number, analyzed_at
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        analyzed_at, analysis_id = raw.split("|")
+        return datetime.fromisoformat(analyzed_at), int(analysis_id)
+    except Exception:
+        raise ValueError("Invalid history cursor")
+
+def history_query(fields=None, after=None):
+    """SQL and selected columns for one page of a user's history"""
+    selected = parse_history_fields(fields)
+    columns = ["analysis_id", "analyzed_at"] + [c for f in selected for c in HISTORY_FIELDS[f]]
+    # The plain bound on analyzed_at lets the planner skip the partitions of
+    # later months; the row comparison alone does not prune
+    keyset = "AND analyzed_at <= %s AND (analyzed_at, analysis_id) < (%s, %s)" if after else ""
+    sql = f"""
+        SELECT {', '.join(columns)}
+        FROM speech_analyses
+        WHERE user_id = %s {keyset}
+        ORDER BY analyzed_at DESC, analysis_id DESC
+        LIMIT %s
+    """
+    return sql, selected, columns
+
+def history_params(user_id, limit, after=None):
+    """Parameters for history_query; one extra row tells whether a next page exists"""
+    limit = max(1, min(limit, MAX_HISTORY_PAGE))
+    return (user_id, after[0], *after, limit + 1) if after else (user_id, limit + 1)
+
+# Metrics /trends can chart, by name -> (speech_analyses column, direction);
+# direction is 1 where a higher value is an improvement and -1 where lower is
+HIGHER_IS_BETTER = 1
+LOWER_IS_BETTER = -1
+TREND_METRICS = {
+    "overall": ("overall_score", HIGHER_IS_BETTER),
+    "clarity": ("clarity_score", HIGHER_IS_BETTER),
+    "arguments": ("arguments_score", HIGHER_IS_BETTER),
+    "grammar": ("grammar_score", HIGHER_IS_BETTER),
+    "delivery": ("delivery_score", HIGHER_IS_BETTER),
+    "confidence": ("confidence_score", HIGHER_IS_BETTER),
+    "nervousness": ("nervousness_score", LOWER_IS_BETTER),
+    "smile": ("smile_mean", HIGHER_IS_BETTER),
+    "speaking_rate": ("speaking_rate", HIGHER_IS_BETTER),
+    "speech_ratio": ("speech_ratio", HIGHER_IS_BETTER),
+}
+DEFAULT_TREND_METRICS = ["overall", "clarity", "arguments", "grammar", "delivery", "confidence", "nervousness"]
+MAX_TREND_WINDOW = 50
+MAX_TREND_POINTS = 1000
+
+def parse_trend_metrics(metrics=None):
+    """Metric names requested as a comma-separated string (the defaults when empty)"""
+    if not metrics:
+        return list(DEFAULT_TREND_METRICS)
+    requested = [m.strip() for m in metrics.split(",") if m.strip()]
+    unknown = [m for m in requested if m not in TREND_METRICS]
+    if unknown:
+        raise ValueError(f"Unknown trend metric(s): {', '.join(unknown)}")
+    return [m for m in TREND_METRICS if m in requested]
+
+def trend_query(metrics, window=5):
+    """
+    One statement computing, per metric and session in a range, the value,
+    its rolling average over `window` sessions, the change from the previous
+    session and the length of the improvement streak ending there, plus
+    range-wide best/mean/first/last and the longest streak. "Improvement" and
+    "best" follow each metric's direction in TREND_METRICS, so for
+    lower-is-better metrics a falling value extends the streak and the
+    minimum is the best.
+
+    Streaks are gaps-and-islands: every session that does not improve on the
+    one before starts a new island, so the streak at a session is its
+    position within its island. Rows are then grouped into NTILE buckets so a
+    long history can be downsampled; with as many buckets as sessions every
+    bucket is a single session.
+    """
+    window = max(1, min(int(window), MAX_TREND_WINDOW))
+    columns = ", ".join(f"{TREND_METRICS[m][0]} AS {m}" for m in metrics)
+    improved = {m: ">" if TREND_METRICS[m][1] == HIGHER_IS_BETTER else "<" for m in metrics}
+    best = {m: "MAX" if TREND_METRICS[m][1] == HIGHER_IS_BETTER else "MIN" for m in metrics}
+    changes = ", ".join(
+        f"AVG({m}) OVER (w ROWS BETWEEN {window - 1} PRECEDING AND CURRENT ROW) AS {m}_rolling, "
+        f"{m} - LAG({m}) OVER w AS {m}_delta"
+        for m in metrics
+    )
+    islands = ", ".join(
+        f"SUM(CASE WHEN {m}_delta {improved[m]} 0 THEN 0 ELSE 1 END) OVER w AS {m}_island"
+        for m in metrics
+    )
+    streaks = ", ".join(
+        f"COUNT(*) OVER (PARTITION BY {m}_island ORDER BY session_number) - 1 AS {m}_streak"
+        for m in metrics
+    )
+    summary = ", ".join(
+        f"MAX({m}_streak) OVER () AS {m}_best_streak, {best[m]}({m}) OVER () AS {m}_best, "
+        f"AVG({m}) OVER () AS {m}_mean, "
+        f"FIRST_VALUE({m}) OVER (ORDER BY {m} IS NULL, session_number) AS {m}_first, "
+        f"FIRST_VALUE({m}) OVER (ORDER BY {m} IS NULL, session_number DESC) AS {m}_last"
+        for m in metrics
+    )
+    buckets = ", ".join(
+        f"AVG({m}), AVG({m}_rolling), SUM({m}_delta), "
+        f"MAX({m}_best_streak), {best[m]}({m}_best), MAX({m}_mean), MAX({m}_first), MAX({m}_last)"
+        for m in metrics
+    )
+    return f"""
+        WITH sessions AS (
+            SELECT session_number, analyzed_at, {columns}
             FROM speech_analyses
-            WHERE user_id = %s
-            ORDER BY analyzed_at ASC
-            LIMIT 5
-        """, (user_id,))
-        first_scores = cursor.fetchall()
-        
-        return {
-            "success": True,
-            "statistics": {
-                "total_analyses": stats[0] or 0,
-                "avg_overall_score": round(stats[1] or 0, 2),
-                "avg_confidence": round(stats[2] or 0, 2),
-                "avg_nervousness": round(stats[3] or 0, 2),
-                "best_score": round(stats[4] or 0, 2),
-                "worst_score": round(stats[5] or 0, 2)
+            WHERE user_id = %s AND session_number BETWEEN %s AND %s
+        ),
+        changes AS (
+            SELECT *, {changes}
+            FROM sessions
+            WINDOW w AS (ORDER BY session_number)
+        ),
+        islands AS (
+            SELECT *, {islands}
+            FROM changes
+            WINDOW w AS (ORDER BY session_number)
+        ),
+        streaks AS (
+            SELECT *, {streaks}
+            FROM islands
+        ),
+        summarized AS (
+            SELECT *, {summary},
+                NTILE(%s) OVER (ORDER BY session_number) AS bucket
+            FROM streaks
+        )
+        SELECT MIN(session_number), MAX(session_number), MIN(analyzed_at), COUNT(*), {buckets}
+        FROM summarized
+        GROUP BY bucket
+        ORDER BY bucket
+    """
+
+def trend_params(user_id, start_session=None, end_session=None, points=None):
+    """Parameters for trend_query; without `points` every session is its own point"""
+    points = max(1, min(points, MAX_TREND_POINTS)) if points else 2147483647
+    return (user_id, start_session or 1, end_session or 2147483647, points)
+
+# Ranks a user's matching analyses and builds highlighted snippets for one
+# page of them; ts_headline re-parses the whole text, so it only runs on the
+# rows actually returned, and only those rows are joined to speech_analyses.
+# The query string uses web search syntax ("quoted phrases", or, -excluded).
+# The database marks matches with these control characters instead of HTML;
+# format_search_results escapes the text and only then turns them into
+# <mark> tags, so snippets are safe to render as HTML
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_STOP = "\x03"
+
+SEARCH_ANALYSES_SQL = f"""
+    SELECT
+        a.analysis_id, a.session_number, a.filename, a.overall_score, a.analyzed_at, m.rank,
+        ts_headline('{SEARCH_CONFIG}', coalesce(a.topic, ''), m.query,
+                    'HighlightAll=true, StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}'),
+        ts_headline('{SEARCH_CONFIG}', coalesce(t.transcription, ''), m.query,
+                    'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, MaxFragments=2, MinWords=8, MaxWords=25, FragmentDelimiter=" … "')
+    FROM (
+        SELECT analysis_id, analyzed_at, query, ts_rank_cd(search_vector, query, 1) AS rank
+        FROM analysis_texts, websearch_to_tsquery('{SEARCH_CONFIG}', %s) AS query
+        WHERE user_id = %s AND search_vector @@ query
+        ORDER BY rank DESC, analysis_id DESC
+        LIMIT %s OFFSET %s
+    ) AS m
+    JOIN speech_analyses AS a USING (analysis_id, analyzed_at)
+    JOIN analysis_texts AS t USING (analysis_id, analyzed_at)
+    ORDER BY m.rank DESC, a.analysis_id DESC
+"""
+MAX_SEARCH_PAGE = 50
+
+def search_params(user_id, query, limit, offset):
+    """Parameters for SEARCH_ANALYSES_SQL; one extra row tells whether a next page exists"""
+    limit = max(1, min(limit, MAX_SEARCH_PAGE))
+    return (query, user_id, limit + 1, max(0, offset))
+
+# Metrics /percentiles ranks against other users, by name -> speech_analyses column
+COHORT_METRICS = {
+    "overall": "overall_score",
+    "clarity": "clarity_score",
+    "arguments": "arguments_score",
+    "grammar": "grammar_score",
+    "delivery": "delivery_score",
+    "confidence": "confidence_score",
+    "nervousness": "nervousness_score",
+    "smile": "smile_mean",
+    "eyebrow": "eyebrow_raise_mean",
+    "blink": "blink_count",
+    "head_tilt": "head_pose_mean",
+}
+DEFAULT_COHORT_METRICS = ["overall", "confidence", "nervousness", "smile", "eyebrow", "blink", "head_tilt"]
+COHORT_BUCKETS = 100
+# Topics get a cohort of their own once this many analyses share them
+COHORT_MIN_TOPIC_ANALYSES = int(os.getenv("COHORT_MIN_TOPIC_ANALYSES", "50"))
+COHORT_MAX_TOPICS = int(os.getenv("COHORT_MAX_TOPICS", "50"))
+COHORT_LOCK_ID = 4_520_417_302
+
+def parse_cohort_metrics(metrics=None):
+    """Metric names requested as a comma-separated string (the defaults when empty)"""
+    if not metrics:
+        return list(DEFAULT_COHORT_METRICS)
+    requested = [m.strip() for m in metrics.split(",") if m.strip()]
+    unknown = [m for m in requested if m not in COHORT_METRICS]
+    if unknown:
+        raise ValueError(f"Unknown percentile metric(s): {', '.join(unknown)}")
+    return [m for m in COHORT_METRICS if m in requested]
+
+def cohort_topic(topic):
+    """Cohort key of a topic, as REFRESH_SCORE_HISTOGRAMS_SQL computes it"""
+    return (topic or "").strip().lower()
+
+# One (metric, topic, value) row per metric of every analysis
+_METRIC_VALUES = "\n        UNION ALL\n        ".join(
+    f"SELECT '{name}' AS metric, topic, {column} AS value FROM base WHERE {column} IS NOT NULL"
+    for name, column in COHORT_METRICS.items()
+)
+
+# Equi-depth histograms of every metric, for everyone and for the most common
+# topics: each cohort's values are ranked once and cut into COHORT_BUCKETS
+# runs of equal size, stored with their value range. The sort only happens
+# here, on a timer; percentile lookups then interpolate within one bucket.
+REFRESH_SCORE_HISTOGRAMS_SQL = f"""
+    WITH base AS (
+        SELECT lower(trim(coalesce(topic, ''))) AS topic, {', '.join(COHORT_METRICS.values())}
+        FROM speech_analyses
+    ), topics AS (
+        SELECT topic FROM base
+        WHERE topic <> ''
+        GROUP BY topic HAVING COUNT(*) >= %s
+        ORDER BY COUNT(*) DESC
+        LIMIT %s
+    ), metric_values AS (
+        {_METRIC_VALUES}
+    ), cohorts AS (
+        SELECT metric, '' AS cohort, value FROM metric_values
+        UNION ALL
+        SELECT metric, topic, value FROM metric_values WHERE topic IN (SELECT topic FROM topics)
+    ), ranked AS (
+        SELECT metric, cohort, value,
+               ROW_NUMBER() OVER (PARTITION BY metric, cohort ORDER BY value) - 1 AS pos,
+               COUNT(*) OVER (PARTITION BY metric, cohort) AS n
+        FROM cohorts
+    )
+    INSERT INTO score_histograms (metric, cohort, bucket, min_value, max_value, analyses)
+    SELECT metric, cohort, pos * {COHORT_BUCKETS} / n, MIN(value), MAX(value), COUNT(*)
+    FROM ranked
+    GROUP BY metric, cohort, pos * {COHORT_BUCKETS} / n
+"""
+# refreshed_at and analyzed_at come from the database clock, so staleness and
+# CohortStats' pending saves are judged by it too, never by the app's
+LAST_HISTOGRAM_REFRESH_SQL = "SELECT MAX(refreshed_at), LOCALTIMESTAMP FROM score_histograms"
+SCORE_HISTOGRAMS_SQL = """
+    SELECT metric, cohort, bucket, min_value, max_value, analyses, refreshed_at
+    FROM score_histograms
+    ORDER BY metric, cohort, bucket
+"""
+
+# The analysis /percentiles ranks: a given one, or the user's latest
+_COHORT_ANALYSIS_COLUMNS = f"analysis_id, session_number, topic, {', '.join(COHORT_METRICS.values())}"
+COHORT_ANALYSIS_SQL = f"""
+    SELECT {_COHORT_ANALYSIS_COLUMNS} FROM speech_analyses
+    WHERE user_id = %s AND analysis_id = %s
+"""
+COHORT_LATEST_ANALYSIS_SQL = f"""
+    SELECT {_COHORT_ANALYSIS_COLUMNS} FROM speech_analyses
+    WHERE user_id = %s
+    ORDER BY analyzed_at DESC, analysis_id DESC
+    LIMIT 1
+"""
+
+def histograms_stale(refreshed_at, now, max_age=None):
+    """Whether histograms last refreshed at `refreshed_at` are due for a rebuild at `now` (database time)"""
+    if refreshed_at is None or max_age is None:
+        return True
+    return (now - refreshed_at).total_seconds() >= max_age
+
+def format_cohort_analysis(result):
+    """Response of get_cohort_analysis from its row (None if no such analysis)"""
+    if result is None:
+        return not_found("Analysis not found")
+    return {
+        "success": True,
+        "analysis_id": result[0],
+        "session_number": result[1],
+        "topic": result[2] or "",
+        "values": dict(zip(COHORT_METRICS, result[3:]))
+    }
+
+COMPARE_ANALYSES_SQL = """
+    SELECT 
+        analysis_id, a.session_number, a.filename, a.topic, t.transcription,
+        a.clarity_score, t.clarity_comment,
+        a.arguments_score, t.arguments_comment,
+        a.grammar_score, t.grammar_comment,
+        a.delivery_score, t.delivery_comment,
+        a.overall_score, t.overall_comment,
+        a.confidence_score, a.nervousness_score,
+        a.smile_mean, a.eyebrow_raise_mean, a.blink_count, a.head_pose_mean,
+        analyzed_at
+    FROM speech_analyses AS a
+    LEFT JOIN analysis_texts AS t USING (analysis_id, analyzed_at)
+    WHERE a.user_id = %s AND analysis_id IN (%s, %s)
+    ORDER BY analyzed_at ASC
+"""
+
+def format_statistics(stats):
+    """Response body of get_user_statistics from its user_stats row (None if no analyses yet)"""
+    if stats is None:
+        stats = (0, None, None, None, None, None, [], [])
+    return {
+        "success": True,
+        "statistics": {
+            "total_analyses": stats[0] or 0,
+            "avg_overall_score": round(stats[1] or 0, 2),
+            "avg_confidence": round(stats[2] or 0, 2),
+            "avg_nervousness": round(stats[3] or 0, 2),
+            "best_score": round(stats[4] or 0, 2),
+            "worst_score": round(stats[5] or 0, 2)
+        },
+        "recent_scores": stats[6] or [],
+        "first_scores": stats[7] or []
+    }
+
+def refresh_user_stats(cursor):
+    """Rebuild every user_stats row from speech_analyses"""
+    cursor.execute(REBUILD_USER_STATS_SQL)
+    return cursor.rowcount
+
+def format_history_row(row, columns, selected):
+    """One history row as returned by /user-history, limited to the selected fields"""
+    values = dict(zip(columns, row))
+    item = {"analysis_id": values["analysis_id"]}
+    if "session_number" in selected:
+        item["session_number"] = values["session_number"]
+    if "filename" in selected:
+        item["filename"] = values["filename"]
+    if "topic" in selected:
+        item["topic"] = values["topic"]
+    if "scores" in selected:
+        item["scores"] = {
+            "clarity": round(values["clarity_score"] or 0, 1),
+            "arguments": round(values["arguments_score"] or 0, 1),
+            "grammar": round(values["grammar_score"] or 0, 1),
+            "delivery": round(values["delivery_score"] or 0, 1),
+            "overall": round(values["overall_score"] or 0, 1)
+        }
+    if "confidence_score" in selected:
+        item["confidence_score"] = round(values["confidence_score"] or 0, 1)
+    if "nervousness_score" in selected:
+        item["nervousness_score"] = round(values["nervousness_score"] or 0, 1)
+    if "gestures" in selected:
+        item["gestures"] = {
+            "smile": round(values["smile_mean"] or 0, 3),
+            "eyebrow": round(values["eyebrow_raise_mean"] or 0, 3),
+            "blink": values["blink_count"] or 0,
+            "head_tilt": round(values["head_pose_mean"] or 0, 3)
+        }
+    item["analyzed_at"] = values["analyzed_at"].strftime("%Y-%m-%d %H:%M:%S")
+    return item
+
+def format_history_page(rows, columns, selected, limit):
+    """Response body of get_detailed_history with the cursor of the next page"""
+    limit = max(1, min(limit, MAX_HISTORY_PAGE))
+    page = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = page[-1]
+        next_cursor = encode_history_cursor(last[1], last[0])
+    return {
+        "success": True,
+        "history": [format_history_row(row, columns, selected) for row in page],
+        "next_cursor": next_cursor
+    }
+
+def format_comparison(results):
+    """Response body of compare_analyses from its (older, newer) rows"""
+    if len(results) != 2:
+        return not_found("One or both analyses not found")
+    
+    analyses = []
+    for row in results:
+        analyses.append({
+            "analysis_id": row[0],
+            "session_number": row[1],
+            "filename": row[2],
+            "topic": row[3],
+            "transcription": row[4],
+            "feedback": {
+                "clarity": {"score": row[5], "comment": row[6]},
+                "arguments": {"score": row[7], "comment": row[8]},
+                "grammar": {"score": row[9], "comment": row[10]},
+                "delivery": {"score": row[11], "comment": row[12]},
+                "overall": {"score": row[13], "comment": row[14]}
             },
-            "recent_scores": [{"score": s[0], "session": s[1], "date": s[2].strftime("%Y-%m-%d")} for s in recent_scores],
-            "first_scores": [{"score": s[0], "session": s[1], "date": s[2].strftime("%Y-%m-%d")} for s in first_scores]
+            "confidence_score": row[15],
+            "nervousness_score": row[16],
+            "gestures": {
+                "smile": row[17],
+                "eyebrow": row[18],
+                "blink": row[19],
+                "head_tilt": row[20]
+            },
+            "analyzed_at": row[21].strftime("%Y-%m-%d %H:%M:%S")
+        })
+    
+    # Calculate improvements
+    improvement = {
+        "clarity": round(analyses[1]["feedback"]["clarity"]["score"] - analyses[0]["feedback"]["clarity"]["score"], 1),
+        "arguments": round(analyses[1]["feedback"]["arguments"]["score"] - analyses[0]["feedback"]["arguments"]["score"], 1),
+        "grammar": round(analyses[1]["feedback"]["grammar"]["score"] - analyses[0]["feedback"]["grammar"]["score"], 1),
+        "delivery": round(analyses[1]["feedback"]["delivery"]["score"] - analyses[0]["feedback"]["delivery"]["score"], 1),
+        "overall": round(analyses[1]["feedback"]["overall"]["score"] - analyses[0]["feedback"]["overall"]["score"], 1),
+        "confidence": round(analyses[1]["confidence_score"] - analyses[0]["confidence_score"], 1),
+        "nervousness": round(analyses[1]["nervousness_score"] - analyses[0]["nervousness_score"], 1)
+    }
+    
+    return {
+        "success": True,
+        "comparison": {
+            "older": analyses[0],
+            "newer": analyses[1],
+            "improvement": improvement
         }
-    except Exception as e:
-        return {"success": False, "message": f"Error: {str(e)}"}
-    finally:
-        cursor.close()
-        release_db_connection(conn)
+    }
 
-def get_detailed_history(user_id, limit=20):
-    """Get user's detailed speech analysis history"""
-    conn = get_db_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT 
-                analysis_id, session_number, filename, topic,
-                clarity_score, arguments_score, grammar_score, 
-                delivery_score, overall_score,
-                confidence_score, nervousness_score,
-                smile_mean, eyebrow_raise_mean, blink_count, head_pose_mean,
-                analyzed_at
-            FROM speech_analyses
-            WHERE user_id = %s
-            ORDER BY analyzed_at DESC
-            LIMIT %s
-        """, (user_id, limit))
-        
-        results = cursor.fetchall()
-        history = []
-        for row in results:
-            history.append({
+def highlighted_html(text):
+    """HTML-escaped text with the database's match markers as <mark> tags"""
+    return (html.escape(text or "")
+            .replace(HIGHLIGHT_START, "<mark>")
+            .replace(HIGHLIGHT_STOP, "</mark>"))
+
+def format_search_results(rows, limit, offset):
+    """Response body of search_analyses for one page of ranked matches"""
+    limit = max(1, min(limit, MAX_SEARCH_PAGE))
+    offset = max(0, offset)
+    return {
+        "success": True,
+        "results": [
+            {
                 "analysis_id": row[0],
                 "session_number": row[1],
                 "filename": row[2],
-                "topic": row[3],
-                "scores": {
-                    "clarity": round(row[4] or 0, 1),
-                    "arguments": round(row[5] or 0, 1),
-                    "grammar": round(row[6] or 0, 1),
-                    "delivery": round(row[7] or 0, 1),
-                    "overall": round(row[8] or 0, 1)
-                },
-                "confidence_score": round(row[9] or 0, 1),
-                "nervousness_score": round(row[10] or 0, 1),
-                "gestures": {
-                    "smile": round(row[11] or 0, 3),
-                    "eyebrow": round(row[12] or 0, 3),
-                    "blink": row[13] or 0,
-                    "head_tilt": round(row[14] or 0, 3)
-                },
-                "analyzed_at": row[15].strftime("%Y-%m-%d %H:%M:%S")
-            })
-        return {"success": True, "history": history}
+                "overall_score": round(row[3] or 0, 1),
+                "analyzed_at": row[4].strftime("%Y-%m-%d %H:%M:%S"),
+                "rank": round(row[5], 4),
+                "topic": highlighted_html(row[6]),
+                "snippet": highlighted_html(row[7])
+            }
+            for row in rows[:limit]
+        ],
+        "next_offset": offset + limit if len(rows) > limit else None
+    }
+
+def _rounded(value, digits=2):
+    return round(value, digits) if value is not None else None
+
+def format_trends(rows, metrics, window):
+    """Response body of get_user_trends from trend_query's bucket rows"""
+    points = []
+    summary = {}
+    for row in rows:
+        point = {
+            "session_start": row[0],
+            "session_end": row[1],
+            "date": row[2].strftime("%Y-%m-%d"),
+            "sessions": row[3]
+        }
+        for i, metric in enumerate(metrics):
+            value, rolling, delta, best_streak, best, mean, first, last = row[4 + i * 8:12 + i * 8]
+            point[metric] = {
+                "value": _rounded(value),
+                "rolling_avg": _rounded(rolling),
+                "delta": _rounded(delta)
+            }
+            summary[metric] = {
+                "best_streak": best_streak or 0,
+                "best": _rounded(best),
+                "mean": _rounded(mean),
+                "change": _rounded(last - first) if first is not None and last is not None else None
+            }
+        points.append(point)
+    return {
+        "success": True,
+        "metrics": metrics,
+        "window": max(1, min(int(window), MAX_TREND_WINDOW)),
+        "session_count": sum(p["sessions"] for p in points),
+        "points": points,
+        "summary": summary
+    }
+
+def get_user_statistics(user_id):
+    """Get user's overall statistics and progress"""
+    try:
+        with db_cursor() as cursor:
+            cursor.execute(USER_STATISTICS_SQL, (user_id,))
+            stats = cursor.fetchone()
+        return format_statistics(stats)
+    except Exception as e:
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+def get_detailed_history(user_id, limit=20, cursor=None, fields=None):
+    """Get one page of user's detailed speech analysis history, newest first"""
+    try:
+        after = decode_history_cursor(cursor)
+        sql, selected, columns = history_query(fields, after)
+        with db_cursor() as cur:
+            cur.execute(sql, history_params(user_id, limit, after))
+            results = cur.fetchall()
+        return format_history_page(results, columns, selected, limit)
     except Exception as e:
         return {"success": False, "message": f"Error: {str(e)}"}
-    finally:
-        cursor.close()
-        release_db_connection(conn)
 
 def compare_analyses(user_id, analysis_id_1, analysis_id_2):
     """Compare two analyses side by side"""
-    conn = get_db_connection()
     try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT 
-                analysis_id, session_number, filename, topic, transcription,
-                clarity_score, clarity_comment,
-                arguments_score, arguments_comment,
-                grammar_score, grammar_comment,
-                delivery_score, delivery_comment,
-                overall_score, overall_comment,
-                confidence_score, nervousness_score,
-                smile_mean, eyebrow_raise_mean, blink_count, head_pose_mean,
-                analyzed_at
-            FROM speech_analyses
-            WHERE user_id = %s AND analysis_id IN (%s, %s)
-            ORDER BY analyzed_at ASC
-        """, (user_id, analysis_id_1, analysis_id_2))
-        
-        results = cursor.fetchall()
-        
-        if len(results) != 2:
-            return {"success": False, "message": "One or both analyses not found"}
-        
-        analyses = []
-        for row in results:
-            analyses.append({
-                "analysis_id": row[0],
-                "session_number": row[1],
-                "filename": row[2],
-                "topic": row[3],
-                "transcription": row[4],
-                "feedback": {
-                    "clarity": {"score": row[5], "comment": row[6]},
-                    "arguments": {"score": row[7], "comment": row[8]},
-                    "grammar": {"score": row[9], "comment": row[10]},
-                    "delivery": {"score": row[11], "comment": row[12]},
-                    "overall": {"score": row[13], "comment": row[14]}
-                },
-                "confidence_score": row[15],
-                "nervousness_score": row[16],
-                "gestures": {
-                    "smile": row[17],
-                    "eyebrow": row[18],
-                    "blink": row[19],
-                    "head_tilt": row[20]
-                },
-                "analyzed_at": row[21].strftime("%Y-%m-%d %H:%M:%S")
-            })
-        
-        # Calculate improvements
-        improvement = {
-            "clarity": round(analyses[1]["feedback"]["clarity"]["score"] - analyses[0]["feedback"]["clarity"]["score"], 1),
-            "arguments": round(analyses[1]["feedback"]["arguments"]["score"] - analyses[0]["feedback"]["arguments"]["score"], 1),
-            "grammar": round(analyses[1]["feedback"]["grammar"]["score"] - analyses[0]["feedback"]["grammar"]["score"], 1),
-            "delivery": round(analyses[1]["feedback"]["delivery"]["score"] - analyses[0]["feedback"]["delivery"]["score"], 1),
-            "overall": round(analyses[1]["feedback"]["overall"]["score"] - analyses[0]["feedback"]["overall"]["score"], 1),
-            "confidence": round(analyses[1]["confidence_score"] - analyses[0]["confidence_score"], 1),
-            "nervousness": round(analyses[1]["nervousness_score"] - analyses[0]["nervousness_score"], 1)
-        }
-        
-        return {
-            "success": True,
-            "comparison": {
-                "older": analyses[0],
-                "newer": analyses[1],
-                "improvement": improvement
-            }
-        }
+        with db_cursor() as cursor:
+            cursor.execute(COMPARE_ANALYSES_SQL, (user_id, analysis_id_1, analysis_id_2))
+            results = cursor.fetchall()
+        return format_comparison(results)
+    except Exception as e:
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+def get_user_trends(user_id, metrics=None, start_session=None, end_session=None, window=5, points=None):
+    """Per-metric series, rolling averages, deltas and streaks over a session range"""
+    try:
+        selected = parse_trend_metrics(metrics)
+        with db_cursor() as cursor:
+            cursor.execute(trend_query(selected, window), trend_params(user_id, start_session, end_session, points))
+            results = cursor.fetchall()
+        return format_trends(results, selected, window)
+    except Exception as e:
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+def search_analyses(user_id, query, limit=20, offset=0):
+    """Full-text search of user's analyses by topic and transcription, best match first"""
+    try:
+        with db_cursor() as cursor:
+            cursor.execute(SEARCH_ANALYSES_SQL, search_params(user_id, query, limit, offset))
+            results = cursor.fetchall()
+        return format_search_results(results, limit, offset)
+    except Exception as e:
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+def get_cohort_analysis(user_id, analysis_id=None):
+    """Metric values of one of user's analyses (the latest by default)"""
+    try:
+        with db_cursor() as cursor:
+            if analysis_id is None:
+                cursor.execute(COHORT_LATEST_ANALYSIS_SQL, (user_id,))
+            else:
+                cursor.execute(COHORT_ANALYSIS_SQL, (user_id, analysis_id))
+            result = cursor.fetchone()
+        return format_cohort_analysis(result)
+    except Exception as e:
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+def refresh_score_histograms(max_age=None):
+    """
+    Rebuild score_histograms from speech_analyses, unless it was rebuilt in
+    the last `max_age` seconds or another worker is rebuilding it right now
+    """
+    try:
+        started = time.perf_counter()
+        with db_cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", (COHORT_LOCK_ID,))
+            if not cursor.fetchone()[0]:
+                return {"success": True, "refreshed": False}
+            cursor.execute(LAST_HISTOGRAM_REFRESH_SQL)
+            if not histograms_stale(*cursor.fetchone(), max_age):
+                return {"success": True, "refreshed": False}
+            # Ranks every analysis, which can outlast the pool's statement_timeout
+            cursor.execute("SET LOCAL statement_timeout = 0")
+            cursor.execute("DELETE FROM score_histograms")
+            cursor.execute(REFRESH_SCORE_HISTOGRAMS_SQL, (COHORT_MIN_TOPIC_ANALYSES, COHORT_MAX_TOPICS))
+            buckets = cursor.rowcount
+        print(f"📊 Score histograms refreshed: {buckets} buckets in {time.perf_counter() - started:.2f}s")
+        return {"success": True, "refreshed": True, "buckets": buckets}
+    except Exception as e:
+        print(f"❌ Error refreshing score histograms: {e}")
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+def load_score_histograms():
+    """Every stored histogram bucket, for CohortStats.load"""
+    try:
+        with db_cursor() as cursor:
+            cursor.execute(SCORE_HISTOGRAMS_SQL)
+            buckets = cursor.fetchall()
+        return {"success": True, "buckets": buckets}
+    except Exception as e:
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+# Monthly partitions of speech_analyses/analysis_texts kept ready ahead of
+# time; rows of a month without one land in the default partitions and have
+# to be moved (under lock) once it is created. The API ensures them from its
+# periodic refresh loop; archive_partitions.py does the same and also
+# archives old texts, and should run daily from cron.
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+PARTITION_LOCK_ID = 4_520_417_303
+ENSURE_PARTITIONS_SQL = """
+    SELECT ensure_analysis_partitions(month::date)
+    FROM generate_series(
+        date_trunc('month', LOCALTIMESTAMP),
+        date_trunc('month', LOCALTIMESTAMP) + %s * INTERVAL '1 month',
+        INTERVAL '1 month'
+    ) AS month
+"""
+
+def ensure_partitions(months_ahead=PARTITION_MONTHS_AHEAD):
+    """
+    Create the partitions of this month and the next `months_ahead`, unless
+    another worker is doing so right now. Months that already have them
+    cost a catalog lookup each.
+    """
+    try:
+        with db_cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", (PARTITION_LOCK_ID,))
+            if not cursor.fetchone()[0]:
+                return {"success": True, "ensured": False}
+            cursor.execute(ENSURE_PARTITIONS_SQL, (months_ahead,))
+        return {"success": True, "ensured": True}
     except Exception as e:
+        print(f"❌ Error creating analysis partitions: {e}")
         return {"success": False, "message": f"Error: {str(e)}"}
-    finally:
-        cursor.close()
-        release_db_connection(conn)
 
 # Initialize the database pool when module is imported
-if db_pool is None:
+if db_pool is None and DB_BACKEND == "postgres":
     try:
         init_db_pool()
     except Exception as e:
@@ -1,16 +1,549 @@
 import cv2
 import mediapipe as mp
+import multiprocessing
 import numpy as np
-import mediapipe as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+NOSE_TIP = 1
+BLINK_EAR_THRESHOLD = 0.2
+
+# The only landmarks the metrics use; gathering these instead of all 478
+# keeps per-frame work in Python to a few dozen floats.
+LANDMARK_INDICES = [1, 13, 14, 33, 61, 105, 133, 145, 159, 263, 291, 334, 362, 374, 386]
+_SLOT = {index: slot for slot, index in enumerate(LANDMARK_INDICES)}
+
+# Frames of landmarks collected before metrics are computed in one go
+LANDMARK_BATCH = 256
+
+# Side of the face ROI relative to the extent of the tracked landmarks, which
+# span brows to lower lip and eye corner to eye corner, so this leaves room
+# for forehead, chin and some motion between frames.
+ROI_SCALE = 3.0
+# Keep the ROI put until the face drifts this far (fraction of its side) or
+# changes size by this much, so FaceMesh's own tracking sees a stable crop.
+ROI_RECENTER = 0.15
+ROI_RESIZE = 0.2
+
+# Per-frame timeline rows, stored as float32; smile/eyebrow are NaN when the
+# mouth is closed and every metric is NaN when no face was found.
+TIMELINE_COLUMNS = ("timestamp", "smile_ratio", "eyebrow_ratio", "ear", "tilt", "face_present")
+
+# Segments shorter than this are not worth a worker process
+MIN_SEGMENT_FRAMES = 150
+# Size of the gesture worker process pool, and so the most segments a video
+# is split into
+MAX_GESTURE_WORKERS = int(os.getenv("GESTURE_MAX_WORKERS", str(os.cpu_count() or 1)))
+
+
+class AnalysisPolicy:
+    """
+    Controls how much of a video FacialGestureAnalyzer looks at.
+
+    target_fps     -- frames per second to run FaceMesh on (None = every frame);
+                      skipped frames are grab()bed without being decoded
+    max_dimension  -- longest side in pixels a frame is downscaled to before
+                      inference (None = full resolution)
+    adaptive       -- when a blink or head motion is seen, analyze every frame
+                      for the next dense_frames frames before sparse sampling
+                      resumes; the decoder then has to retrieve and convert
+                      every frame, not just the sampled ones (off by default
+                      for the API, GESTURE_ADAPTIVE=true turns it on)
+    workers        -- number of processes the video is split across
+    overlap_seconds-- warm-up each segment decodes before its range so
+                      FaceMesh tracking has settled when counting starts
+    prefetch_depth -- RGB frames the decoder thread may run ahead of inference
+    track_roi      -- crop a padded square around the face found in the
+                      previous frame and run FaceMesh on it at roi_size x
+                      roi_size, falling back to the full frame when lost
+    record_timeline-- keep per-frame metrics (see TIMELINE_COLUMNS) in
+                      addition to the aggregates
+    """
+
+    def __init__(self, target_fps=None, max_dimension=None, adaptive=False,
+                 dense_frames=15, motion_threshold=0.01, workers=1, overlap_seconds=1.0,
+                 prefetch_depth=4, track_roi=False, roi_size=256, record_timeline=False):
+        self.target_fps = target_fps
+        self.max_dimension = max_dimension
+        self.adaptive = adaptive
+        self.dense_frames = dense_frames
+        self.motion_threshold = motion_threshold
+        self.workers = workers
+        self.overlap_seconds = overlap_seconds
+        self.prefetch_depth = prefetch_depth
+        self.track_roi = track_roi
+        self.roi_size = roi_size
+        self.record_timeline = record_timeline
+
+    @classmethod
+    def full(cls):
+        """Analyze every frame at native resolution (the original behaviour)"""
+        return cls()
+
+    @classmethod
+    def from_env(cls):
+        """Policy for the API, tunable via GESTURE_* environment variables"""
+        target_fps = float(os.getenv("GESTURE_TARGET_FPS", "10"))
+        max_dimension = int(os.getenv("GESTURE_MAX_DIMENSION", "640"))
+        return cls(
+            target_fps=target_fps if target_fps > 0 else None,
+            max_dimension=max_dimension if max_dimension > 0 else None,
+            adaptive=os.getenv("GESTURE_ADAPTIVE", "false").lower() in ("1", "true", "yes"),
+            workers=max(1, int(os.getenv("GESTURE_WORKERS", "1"))),
+            track_roi=os.getenv("GESTURE_TRACK_ROI", "true").lower() in ("1", "true", "yes"),
+            record_timeline=os.getenv("GESTURE_RECORD_TIMELINE", "true").lower() in ("1", "true", "yes")
+        )
+
+    def frame_step(self, video_fps):
+        """Number of source frames between sparse samples"""
+        if not self.target_fps or not video_fps or video_fps <= self.target_fps:
+            return 1
+        return max(1, int(round(video_fps / self.target_fps)))
+
+    def inference_size(self, w, h):
+        """(width, height) a w x h frame is downscaled to before inference"""
+        if not self.max_dimension:
+            return w, h
+        scale = self.max_dimension / max(h, w)
+        if scale >= 1:
+            return w, h
+        return int(w * scale), int(h * scale)
+
+    def to_dict(self):
+        return {
+            "target_fps": self.target_fps,
+            "max_dimension": self.max_dimension,
+            "adaptive": self.adaptive,
+            "workers": self.workers,
+            "track_roi": self.track_roi
+        }
+
+
+def landmark_metrics(points):
+    """
+    Per-frame metrics for a batch of landmark coordinates.
+    `points` is (n, len(LANDMARK_INDICES), 2) in frame pixels; returns arrays
+    (valid, smile, eyebrow, ear, blinking, tilt), where valid is False for
+    frames with a closed mouth that the ratios cannot be computed for and ear
+    is the mean eye aspect ratio of both eyes.
+    """
+    def at(index):
+        return points[:, _SLOT[index]]
+
+    # --- Mouth / Smile Ratio ---
+    mouth_width = np.linalg.norm(at(291) - at(61), axis=1)
+    mouth_height = np.linalg.norm(at(13) - at(14), axis=1)
+    valid = mouth_height >= 1e-6  # avoid division by zero
+    safe_height = np.maximum(mouth_height, 1e-6)
+    smile = mouth_width / safe_height
+
+    # --- Eyebrow Raise ---
+    left_ratio = (at(105)[:, 1] - at(159)[:, 1]) / safe_height
+    right_ratio = (at(334)[:, 1] - at(386)[:, 1]) / safe_height
+    eyebrow = (left_ratio + right_ratio) / 2
+
+    # --- Blink detection ---
+    left_ear = (np.linalg.norm(at(159) - at(145), axis=1) /
+                np.linalg.norm(at(33) - at(133) + 1e-6, axis=1))
+    right_ear = (np.linalg.norm(at(386) - at(374), axis=1) /
+                 np.linalg.norm(at(362) - at(263) + 1e-6, axis=1))
+    blinking = (left_ear < BLINK_EAR_THRESHOLD) | (right_ear < BLINK_EAR_THRESHOLD)
+    ear = (left_ear + right_ear) / 2
+
+    # --- Head tilt metric ---
+    tilt = np.abs(at(33)[:, 1] - at(263)[:, 1])
+
+    return valid, smile, eyebrow, ear, blinking, tilt
+
+
+def track_face_roi(points, w, h, current=None):
+    """
+    Square crop (x0, y0, side) around one frame's landmark points, or None
+    when the face is so large that cropping would not save anything.
+    The current ROI is kept if the face is still comfortably inside it.
+    """
+    lo = points.min(axis=0)
+    hi = points.max(axis=0)
+    center = (lo + hi) / 2
+    side = int(ROI_SCALE * max(hi[0] - lo[0], hi[1] - lo[1], 1))
+    if side >= min(w, h):
+        return None
+
+    if current is not None:
+        x0, y0, current_side = current
+        drift = np.abs(center - (x0 + current_side / 2, y0 + current_side / 2)).max()
+        if drift < ROI_RECENTER * current_side and abs(side - current_side) < ROI_RESIZE * current_side:
+            return current
+
+    x0 = int(np.clip(center[0] - side / 2, 0, w - side))
+    y0 = int(np.clip(center[1] - side / 2, 0, h - side))
+    return (x0, y0, side)
+
+
+class RunningStat:
+    """Weighted count/mean/M2 that updates from whole batches (Welford/Chan)"""
+
+    def __init__(self):
+        self.weight = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, values, weights):
+        batch_weight = float(weights.sum())
+        if batch_weight <= 0:
+            return
+        batch_mean = float(np.dot(weights, values) / batch_weight)
+        batch_m2 = float(np.dot(weights, (values - batch_mean) ** 2))
+        self._combine(batch_weight, batch_mean, batch_m2)
+
+    def merge(self, other):
+        merged = RunningStat()
+        merged._combine(self.weight, self.mean, self.m2)
+        merged._combine(other.weight, other.mean, other.m2)
+        return merged
+
+    def _combine(self, weight, mean, m2):
+        if weight <= 0:
+            return
+        total = self.weight + weight
+        delta = mean - self.mean
+        self.mean += delta * weight / total
+        self.m2 += m2 + delta * delta * self.weight * weight / total
+        self.weight = total
+
+    @property
+    def std(self):
+        return float(np.sqrt(self.m2 / self.weight)) if self.weight else 0.0
+
+
+class GestureAccumulator:
+    """
+    Running statistics for one contiguous range of frames.
+
+    Accumulators for adjacent ranges merge exactly: counts add, the running
+    means combine, and the eye state at each edge lets a blink that straddles
+    a boundary be counted once. Memory stays constant however long the video
+    unless a per-frame timeline is requested by passing the video's fps.
+    """
+
+    def __init__(self, timeline_fps=None):
+        self.frames = 0
+        self.frames_analyzed = 0
+        self.smile = RunningStat()
+        self.eyebrow = RunningStat()
+        self.tilt = RunningStat()
+        self.blink_frames = 0
+        self.blink_events = 0
+        self.first_closed = None
+        self.last_closed = None
+        self.wall_seconds = 0.0
+        self.stage_seconds = {}
+        self.timeline_fps = timeline_fps
+        self._timeline_chunks = []
+        self._absent_frames = []
+
+    def add_batch(self, points, weights, frame_ids=None):
+        """Fold in a batch of landmark rows and the source frames each represents"""
+        valid, smile, eyebrow, ear, blinking, tilt = landmark_metrics(points)
+        if self.timeline_fps and frame_ids is not None:
+            chunk = np.empty((len(points), len(TIMELINE_COLUMNS)), dtype=np.float32)
+            chunk[:, 0] = frame_ids / self.timeline_fps
+            chunk[:, 1] = np.where(valid, smile, np.nan)
+            chunk[:, 2] = np.where(valid, eyebrow, np.nan)
+            chunk[:, 3] = ear
+            chunk[:, 4] = tilt
+            chunk[:, 5] = 1
+            self._timeline_chunks.append(chunk)
+
+        weights = weights[valid]
+        if len(weights) == 0:
+            return
+
+        self.smile.update(smile[valid], weights)
+        self.eyebrow.update(eyebrow[valid], weights)
+        self.tilt.update(tilt[valid], weights)
+
+        closed = blinking[valid]
+        self.blink_frames += int(weights[closed].sum())
+        previous = np.concatenate(([bool(self.last_closed)], closed[:-1]))
+        self.blink_events += int(np.count_nonzero(closed & ~previous))
+        if self.first_closed is None:
+            self.first_closed = bool(closed[0])
+        self.last_closed = bool(closed[-1])
+
+    def add_absent(self, frame_idx):
+        """Record an analyzed frame with no face in it for the timeline"""
+        if self.timeline_fps:
+            self._absent_frames.append(frame_idx)
+
+    def timeline(self):
+        """(n, len(TIMELINE_COLUMNS)) float32 array of analyzed frames in time order"""
+        absent = np.full((len(self._absent_frames), len(TIMELINE_COLUMNS)), np.nan, dtype=np.float32)
+        if self.timeline_fps:
+            absent[:, 0] = np.asarray(self._absent_frames, dtype=np.float32) / self.timeline_fps
+        absent[:, 5] = 0
+        rows = np.concatenate(self._timeline_chunks + [absent])
+        return rows[np.argsort(rows[:, 0], kind="stable")]
+
+    def merge(self, later):
+        """Fold in the accumulator of the range that directly follows this one"""
+        merged = GestureAccumulator(self.timeline_fps or later.timeline_fps)
+        merged.frames = self.frames + later.frames
+        merged.frames_analyzed = self.frames_analyzed + later.frames_analyzed
+        merged.smile = self.smile.merge(later.smile)
+        merged.eyebrow = self.eyebrow.merge(later.eyebrow)
+        merged.tilt = self.tilt.merge(later.tilt)
+        merged.blink_frames = self.blink_frames + later.blink_frames
+        merged.blink_events = self.blink_events + later.blink_events
+        if self.last_closed and later.first_closed:
+            merged.blink_events -= 1
+        merged.first_closed = self.first_closed if self.first_closed is not None else later.first_closed
+        merged.last_closed = later.last_closed if later.last_closed is not None else self.last_closed
+        merged.wall_seconds = self.wall_seconds + later.wall_seconds
+        merged.stage_seconds = {
+            stage: self.stage_seconds.get(stage, 0.0) + later.stage_seconds.get(stage, 0.0)
+            for stage in set(self.stage_seconds) | set(later.stage_seconds)
+        }
+        merged._timeline_chunks = self._timeline_chunks + later._timeline_chunks
+        merged._absent_frames = self._absent_frames + later._absent_frames
+        return merged
+
+    def pipeline_stats(self):
+        """Seconds spent per stage and how busy decode and inference were"""
+        stats = {stage: round(seconds, 3) for stage, seconds in self.stage_seconds.items()}
+        wall = max(self.wall_seconds, 1e-9)
+        stats["wall_seconds"] = round(self.wall_seconds, 3)
+        stats["decoder_occupancy"] = round(
+            (self.stage_seconds.get("decode_seconds", 0) + self.stage_seconds.get("convert_seconds", 0)) / wall, 3)
+        stats["inference_occupancy"] = round(self.stage_seconds.get("inference_seconds", 0) / wall, 3)
+        return stats
+
+    def metrics(self):
+        return {
+            "smile_mean": self.smile.mean if self.smile.weight else 0,
+            "smile_std": self.smile.std,
+            "eyebrow_raise_mean": self.eyebrow.mean if self.eyebrow.weight else 0,
+            "eyebrow_raise_std": self.eyebrow.std,
+            "blink_count": int(min(self.blink_frames, self.frames) / max(self.frames, 1) * 30),  # normalized per ~30 frames (~1 sec)
+            "blink_events": self.blink_events,
+            "head_pose_mean": self.tilt.mean if self.tilt.weight else 0,
+            "head_pose_std": self.tilt.std,
+            "frames_total": self.frames,
+            "frames_analyzed": self.frames_analyzed,
+            "pipeline": self.pipeline_stats()
+        }
+
+
+class FramePrefetcher:
+    """
+    Decodes, downscales and color-converts frames on a background thread.
+
+    Frames land in a ring of preallocated RGB buffers, so decoding the next
+    frames overlaps with FaceMesh on the current one (OpenCV and MediaPipe
+    both release the GIL). Iterating yields (frame_index, rgb); a buffer goes
+    back to the decoder when the consumer asks for the next frame.
+
+    The decoder samples every `step`-th frame from `first` and always `start`.
+    Under adaptive sampling the consumer may raise `dense_until` after an
+    event to also get every frame below it. The decoder runs ahead of the
+    consumer, so in that mode it prepares the frames in between as well and
+    the iterator drops those the consumer did not ask for; frames right after
+    an event are never skipped before the consumer knows it wants them.
+    When the consumer sets `roi`, the
+    decoder crops frames to it; each frame is yielded with the ROI it was
+    cropped to (None for the full frame) so landmarks can be mapped back.
+    """
+
+    def __init__(self, cap, first, start, end, step, policy):
+        self.cap = cap
+        self.first = first
+        self.start = start
+        self.end = end
+        self.step = step
+        self.policy = policy
+        self.dense_until = 0
+        self.roi = None
+        self.frame_size = None
+        self.frames_read = first
+        self.stats = dict.fromkeys(
+            ("decode_seconds", "convert_seconds", "decoder_blocked_seconds",
+             "inference_seconds", "inference_starved_seconds"), 0.0)
+        self.error = None
+
+        depth = max(1, policy.prefetch_depth)
+        self._slots = [None] * depth
+        self._free = queue.Queue()
+        for slot in range(depth):
+            self._free.put(slot)
+        self._ready = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._decode, daemon=True)
+
+    def start_decoding(self):
+        self._thread.start()
+        return self
+
+    def _sampled(self, idx):
+        return (idx - self.first) % self.step == 0 or idx == self.start
+
+    def _take_slot(self):
+        while not self._stop.is_set():
+            try:
+                return self._free.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    def _decode(self):
+        idx = self.first
+        bgr = None
+        clock = time.perf_counter
+        try:
+            while not self._stop.is_set() and (self.end is None or idx < self.end):
+                began = clock()
+                if not self.cap.grab():
+                    break
+                sampled = self._sampled(idx)
+                if not sampled and not self.policy.adaptive:
+                    self.stats["decode_seconds"] += clock() - began
+                    idx += 1
+                    continue
+                ok, bgr = self.cap.retrieve(bgr)
+                self.stats["decode_seconds"] += clock() - began
+                if not ok:
+                    break
+
+                began = clock()
+                slot = self._take_slot()
+                self.stats["decoder_blocked_seconds"] += clock() - began
+                if slot is None:
+                    break
+
+                began = clock()
+                h, w = bgr.shape[:2]
+                self.frame_size = (w, h)
+                roi = self.roi
+                if roi is not None:
+                    x0, y0, side = roi
+                    source = bgr[y0:y0 + side, x0:x0 + side]
+                    size = (self.policy.roi_size, self.policy.roi_size)
+                else:
+                    source = bgr
+                    size = self.policy.inference_size(w, h)
+                rgb = self._slots[slot]
+                if rgb is None or rgb.shape[:2] != (size[1], size[0]):
+                    rgb = self._slots[slot] = np.empty((size[1], size[0], 3), dtype=np.uint8)
+                if size != source.shape[1::-1]:
+                    cv2.cvtColor(cv2.resize(source, size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2RGB, dst=rgb)
+                else:
+                    cv2.cvtColor(source, cv2.COLOR_BGR2RGB, dst=rgb)
+                self.stats["convert_seconds"] += clock() - began
+
+                self._ready.put((idx, slot, roi, sampled))
+                idx += 1
+        except Exception as e:
+            self.error = e
+        finally:
+            self.frames_read = idx
+            self._ready.put(None)
+
+    def __iter__(self):
+        clock = time.perf_counter
+        while True:
+            began = clock()
+            item = self._ready.get()
+            self.stats["inference_starved_seconds"] += clock() - began
+            if item is None:
+                break
+            idx, slot, roi, sampled = item
+            if not sampled and idx >= self.dense_until:
+                self._free.put(slot)
+                continue
+            began = clock()
+            yield idx, self._slots[slot], roi
+            self.stats["inference_seconds"] += clock() - began
+            self._free.put(slot)
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+
+# --- Worker-process side of the parallel mode ---
+_worker_analyzer = None
+_segment_executor = None
+
+
+def _init_segment_worker():
+    """Give each worker process its own FaceMesh graph"""
+    global _worker_analyzer
+    _worker_analyzer = FacialGestureAnalyzer()
+
+
+def _analyze_segment(video_path, start, end, policy):
+    cap = cv2.VideoCapture(video_path)
+    _worker_analyzer.reset()
+    try:
+        return _worker_analyzer.analyze_range(cap, start, end, policy)
+    finally:
+        cap.release()
+
+
+def _warm_segment_worker():
+    """No-op task; running it makes the pool spawn and initialize a worker"""
+    return os.getpid()
+
+
+def _discard_segment_executor():
+    """Drop a pool whose workers died so the next video starts a fresh one"""
+    global _segment_executor
+    if _segment_executor is not None:
+        _segment_executor.shutdown(wait=False, cancel_futures=True)
+    _segment_executor = None
+
+
+def _get_segment_executor():
+    """
+    The pool of MAX_GESTURE_WORKERS processes, spawned once and reused for
+    every video whatever its segment count, so requests never wait for
+    workers to import MediaPipe and build FaceMesh
+    """
+    global _segment_executor
+    if _segment_executor is None:
+        # spawn, not fork: FaceMesh runs its own threads in the parent
+        _segment_executor = ProcessPoolExecutor(
+            max_workers=MAX_GESTURE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_segment_worker
+        )
+    return _segment_executor
+
+
+def start_segment_workers():
+    """Spawn the worker processes now (at API startup) instead of on the first video"""
+    if MAX_GESTURE_WORKERS > 1:
+        executor = _get_segment_executor()
+        for _ in range(MAX_GESTURE_WORKERS):
+            executor.submit(_warm_segment_worker)
+
+
+def stop_segment_workers():
+    _discard_segment_executor()
+
+
+def segment_count(policy, total_frames):
+    """Segments a video of `total_frames` is split into under `policy`"""
+    return max(1, min(policy.workers, MAX_GESTURE_WORKERS, total_frames // MIN_SEGMENT_FRAMES))
 
-print("MediaPipe file:", mp.__file__)
-print("MediaPipe version:", mp.__version__)
-print("Has solutions:", hasattr(mp, "solutions"))
 
 class FacialGestureAnalyzer:
     def __init__(self):
-        print("Creating FaceMesh...")
-        print("mp.solutions =", mp.solutions)
         self.mp_face = mp.solutions.face_mesh.FaceMesh(
             static_image_mode=False,
             max_num_faces=1,
@@ -18,83 +551,320 @@ class FacialGestureAnalyzer:
             min_detection_confidence=0.5,
             min_tracking_confidence=0.5
         )
+        self.uses = 0
+
+    def reset(self):
+        """Drop FaceMesh tracking state so the next video starts from detection"""
+        self.mp_face.reset()
 
-    def analyze_video(self, video_path, show_video=False):
+    def is_healthy(self):
+        """Run a blank frame through the graph to check it still responds"""
+        try:
+            self.mp_face.process(np.zeros((64, 64, 3), dtype=np.uint8))
+            return True
+        except Exception as e:
+            print(f"⚠️ FaceMesh health check failed: {e}")
+            return False
+
+    def close(self):
+        """Release the MediaPipe graph and its resources"""
+        self.mp_face.close()
+
+    def analyze_video(self, video_path, show_video=False, policy=None):
+        return self.accumulate_video(video_path, show_video=show_video, policy=policy).metrics()
+
+    def accumulate_video(self, video_path, show_video=False, policy=None):
+        """Like analyze_video, but returns the GestureAccumulator (for the timeline)"""
+        policy = policy or AnalysisPolicy.full()
         cap = cv2.VideoCapture(video_path)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30
+        segments = segment_count(policy, total_frames)
 
-        smile_ratios = []
-        eyebrow_raise_ratios = []
-        head_tilts = []
-        blink_count = 0
-        frame_idx = 0
+        if segments > 1 and not show_video:
+            cap.release()
+            try:
+                return self._analyze_parallel(video_path, total_frames, fps, segments, policy)
+            except Exception as e:
+                print(f"⚠️ Parallel gesture analysis failed, falling back to sequential: {e}")
+                _discard_segment_executor()
+                cap = cv2.VideoCapture(video_path)
 
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
+        try:
+            accumulator = self.analyze_range(cap, 0, None, policy, show_video=show_video)
+        finally:
+            cap.release()
+            if show_video:
+                cv2.destroyAllWindows()
 
-            frame_idx += 1
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = self.mp_face.process(frame_rgb)
+        return accumulator
 
-            if results.multi_face_landmarks:
-                face = results.multi_face_landmarks[0]
-                h, w, _ = frame.shape
-                landmarks = [(int(lm.x*w), int(lm.y*h)) for lm in face.landmark]
+    def _analyze_parallel(self, video_path, total_frames, fps, segments, policy):
+        """Split the video into time ranges and analyze each in a worker process"""
+        bounds = np.linspace(0, total_frames, segments + 1).astype(int)
+        executor = _get_segment_executor()
+        futures = [
+            executor.submit(
+                _analyze_segment, video_path, int(bounds[i]),
+                # The container frame count can be short; let the last range run to EOF
+                int(bounds[i + 1]) if i < segments - 1 else None,
+                policy
+            )
+            for i in range(segments)
+        ]
 
-                # --- Mouth / Smile Ratio ---
-                left_mouth = landmarks[61]
-                right_mouth = landmarks[291]
-                top_lip = landmarks[13]
-                bottom_lip = landmarks[14]
+        merged = futures[0].result()
+        for future in futures[1:]:
+            merged = merged.merge(future.result())
+        return merged
 
-                mouth_width = np.linalg.norm(np.array(right_mouth) - np.array(left_mouth))
-                mouth_height = np.linalg.norm(np.array(top_lip) - np.array(bottom_lip))
-                if mouth_height < 1e-6:  # avoid division by zero
-                    continue
-                smile_ratio = mouth_width / mouth_height
-                smile_ratios.append(smile_ratio)
-
-                # --- Eyebrow Raise ---
-                left_eyebrow = landmarks[105]
-                left_eye = landmarks[159]
-                right_eyebrow = landmarks[334]
-                right_eye = landmarks[386]
-
-                bottom_lip_height = max(mouth_height, 1e-6)
-                left_ratio = (left_eyebrow[1] - left_eye[1]) / bottom_lip_height
-                right_ratio = (right_eyebrow[1] - right_eye[1]) / bottom_lip_height
-                eyebrow_raise_ratios.append((left_ratio + right_ratio) / 2)
-
-                # --- Blink detection ---
-                left_ear = (np.linalg.norm(np.array(landmarks[159])-np.array(landmarks[145])) /
-                            np.linalg.norm(np.array(landmarks[33])-np.array(landmarks[133])+1e-6))
-                right_ear = (np.linalg.norm(np.array(landmarks[386])-np.array(landmarks[374])) /
-                             np.linalg.norm(np.array(landmarks[362])-np.array(landmarks[263])+1e-6))
-                if left_ear < 0.2 or right_ear < 0.2:
-                    blink_count += 1
-
-                # --- Head tilt metric ---
-                left_eye_corner = landmarks[33]
-                right_eye_corner = landmarks[263]
-                tilt = abs(left_eye_corner[1] - right_eye_corner[1])
-                head_tilts.append(tilt)
+    def analyze_range(self, cap, start, end, policy, show_video=False):
+        """
+        Analyzes frames [start, end) of an open capture (end=None reads to EOF).
+        Decoding starts overlap_seconds early so tracking is warm at `start`;
+        the warm-up frames are run through FaceMesh but not counted.
+        """
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30
+        step = policy.frame_step(fps)
+        warmup = int(policy.overlap_seconds * fps) if start > 0 else 0
+        first = max(0, start - warmup)
+        if first > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, first)
 
-            if show_video:
-                cv2.imshow('Frame', frame)
-                if cv2.waitKey(1) & 0xFF == ord('q'):
-                    break
+        # Metrics are weighted by how many source frames each analyzed frame
+        # represents (the gap to the next analyzed frame), so uneven adaptive
+        # sampling does not bias the means.
+        accumulator = GestureAccumulator(timeline_fps=fps if policy.record_timeline else None)
+        points = np.empty((LANDMARK_BATCH, len(LANDMARK_INDICES), 2))
+        weights = np.empty(LANDMARK_BATCH)
+        frame_ids = np.empty(LANDMARK_BATCH)
+        rows = 0
+        pending_idx = None
+        prev_nose = None
+        began = time.perf_counter()
 
-        cap.release()
-        if show_video:
-            cv2.destroyAllWindows()
-
-        # --- Aggregate metrics safely ---
-        metrics = {
-            "smile_mean": float(np.mean(smile_ratios)) if smile_ratios else 0,
-            "eyebrow_raise_mean": float(np.mean(eyebrow_raise_ratios)) if eyebrow_raise_ratios else 0,
-            "blink_count": int(blink_count / max(frame_idx, 1) * 30),  # normalized per ~30 frames (~1 sec)
-            "head_pose_mean": float(np.mean(head_tilts)) if head_tilts else 0
+        prefetcher = FramePrefetcher(cap, first, start, end, step, policy).start_decoding()
+        try:
+            for idx, frame_rgb, roi in prefetcher:
+                if pending_idx is not None:
+                    weights[rows] = idx - pending_idx
+                    frame_ids[rows] = pending_idx
+                    rows += 1
+                    pending_idx = None
+                    if rows == LANDMARK_BATCH:
+                        accumulator.add_batch(points, weights, frame_ids)
+                        rows = 0
+
+                # Warm-up frames only prime tracking and are not counted
+                counted = idx >= start
+                if counted:
+                    accumulator.frames_analyzed += 1
+                w, h = prefetcher.frame_size
+                results = self.mp_face.process(frame_rgb)
+
+                if results.multi_face_landmarks:
+                    landmark = results.multi_face_landmarks[0].landmark
+                    # Landmarks are normalized, so scaling by the original frame
+                    # size (or the ROI they were found in) keeps pixel metrics
+                    # independent of any crop or downscale.
+                    if roi is None:
+                        points[rows] = [(int(landmark[i].x*w), int(landmark[i].y*h)) for i in LANDMARK_INDICES]
+                    else:
+                        x0, y0, side = roi
+                        points[rows] = [(int(x0 + landmark[i].x*side), int(y0 + landmark[i].y*side)) for i in LANDMARK_INDICES]
+                    if policy.track_roi:
+                        prefetcher.roi = track_face_roi(points[rows], w, h, prefetcher.roi)
+                    if counted:
+                        pending_idx = idx
+
+                    if policy.adaptive:
+                        valid, _, _, _, closed, _ = landmark_metrics(points[rows:rows + 1])
+                        nose = points[rows, _SLOT[NOSE_TIP]].copy()
+                        moved = prev_nose is not None and np.linalg.norm(nose - prev_nose) > policy.motion_threshold * w
+                        prev_nose = nose
+                        if counted and ((valid[0] and closed[0]) or moved):
+                            prefetcher.dense_until = idx + 1 + policy.dense_frames
+                else:
+                    if counted:
+                        accumulator.add_absent(idx)
+                    if roi is not None:
+                        # Tracking lost: look at the whole frame again
+                        prefetcher.roi = None
+
+                if show_video:
+                    cv2.imshow('Frame', cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR))
+                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                        break
+        finally:
+            prefetcher.close()
+
+        frames_read = prefetcher.frames_read
+        if pending_idx is not None:
+            weights[rows] = frames_read - pending_idx
+            frame_ids[rows] = pending_idx
+            rows += 1
+        if rows:
+            accumulator.add_batch(points[:rows], weights[:rows], frame_ids[:rows])
+        accumulator.frames = max(frames_read - start, 0)
+        accumulator.wall_seconds = time.perf_counter() - began
+        accumulator.stage_seconds = dict(prefetcher.stats)
+        return accumulator
+
+    def compare_with_full(self, video_path, policy):
+        """
+        Runs the video once at full fidelity and once under `policy`, and
+        reports per-metric deltas together with the speedup.
+        """
+        start = time.perf_counter()
+        full = self.analyze_video(video_path, policy=AnalysisPolicy.full())
+        full_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        sampled = self.analyze_video(video_path, policy=policy)
+        sampled_time = time.perf_counter() - start
+
+        deltas = {}
+        for key in ("smile_mean", "eyebrow_raise_mean", "blink_count", "head_pose_mean"):
+            diff = sampled[key] - full[key]
+            deltas[key] = {
+                "absolute": round(diff, 4),
+                "relative": round(diff / full[key], 4) if full[key] else None
+            }
+
+        return {
+            "policy": policy.to_dict(),
+            "full": full,
+            "sampled": sampled,
+            "deltas": deltas,
+            "full_seconds": round(full_time, 3),
+            "sampled_seconds": round(sampled_time, 3),
+            "speedup": round(full_time / max(sampled_time, 1e-6), 2)
         }
 
-        return metrics
+
+class AnalyzerUnavailable(Exception):
+    """No analyzer could be checked out in time, or none could be built"""
+
+
+class AnalyzerPool:
+    """
+    A fixed set of pre-warmed FacialGestureAnalyzers shared across requests.
+
+    Building FaceMesh loads its models and starts a graph, so analyzers are
+    created once, checked out for one video at a time, reset on return and
+    recycled after max_uses videos or a failed health check. The health check
+    runs only after a failed analysis or every `health_check_every` uses.
+
+    A slot whose analyzer could not be rebuilt stays in the pool as None and
+    is rebuilt by the next checkout, so failures never shrink the pool.
+    """
+
+    def __init__(self, size=1, max_uses=200, checkout_timeout=60.0, health_check_every=50):
+        self.size = size
+        self.max_uses = max_uses
+        self.checkout_timeout = checkout_timeout
+        self.health_check_every = health_check_every
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        for _ in range(size):
+            self._idle.put(self._create())
+
+    def _create(self):
+        analyzer = FacialGestureAnalyzer()
+        analyzer.is_healthy()  # first inference loads the models
+        return analyzer
+
+    def checkout(self, timeout=None):
+        """
+        Take an idle analyzer, waiting up to `timeout` seconds for one
+        (checkout_timeout by default); raises AnalyzerUnavailable otherwise
+        """
+        timeout = self.checkout_timeout if timeout is None else timeout
+        try:
+            analyzer = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise AnalyzerUnavailable(f"No gesture analyzer free after {timeout:g}s")
+        if analyzer is None:
+            try:
+                analyzer = self._replace(None)
+            except Exception as e:
+                self._idle.put(None)
+                raise AnalyzerUnavailable(f"Could not build a gesture analyzer: {e}")
+        return analyzer
+
+    def checkin(self, analyzer, failed=False):
+        """Return an analyzer after use, resetting or recycling it"""
+        analyzer.uses += 1
+        if self._closed:
+            analyzer.close()
+            return
+        replacement = None
+        try:
+            if analyzer.uses < self.max_uses and self._reusable(analyzer, failed):
+                replacement = analyzer
+            else:
+                replacement = self._replace(analyzer)
+        except Exception as e:
+            print(f"⚠️ Could not rebuild FaceMesh, retrying on next checkout: {e}")
+        finally:
+            self._idle.put(replacement)
+
+    def _reusable(self, analyzer, failed):
+        try:
+            analyzer.reset()
+        except Exception as e:
+            print(f"⚠️ FaceMesh reset failed, recycling analyzer: {e}")
+            return False
+        if failed or analyzer.uses % self.health_check_every == 0:
+            return analyzer.is_healthy()
+        return True
+
+    @contextmanager
+    def analyzer(self, timeout=None):
+        analyzer = self.checkout(timeout=timeout)
+        failed = False
+        try:
+            yield analyzer
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.checkin(analyzer, failed)
+
+    def _replace(self, analyzer):
+        if analyzer is not None:
+            try:
+                analyzer.close()
+            except Exception:
+                pass
+        with self._lock:
+            return self._create()
+
+    def close(self):
+        """Close every idle analyzer; ones checked out are closed on checkin"""
+        self._closed = True
+        while True:
+            try:
+                analyzer = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if analyzer is not None:
+                analyzer.close()
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage: python facial_gesture.py <video> [target_fps] [max_dimension] [adaptive]")
+        sys.exit(1)
+
+    policy = AnalysisPolicy(
+        target_fps=float(sys.argv[2]) if len(sys.argv) > 2 else 10,
+        max_dimension=int(sys.argv[3]) if len(sys.argv) > 3 else 640,
+        adaptive=(sys.argv[4].lower() in ("1", "true", "yes")) if len(sys.argv) > 4 else True
+    )
+    report = FacialGestureAnalyzer().compare_with_full(sys.argv[1], policy)
+    print(json.dumps(report, indent=2))
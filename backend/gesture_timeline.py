@@ -0,0 +1,63 @@
+import os
+import numpy as np
+import pyarrow as pa
+from pyarrow import feather
+from facial_gesture import TIMELINE_COLUMNS
+
+# Per-frame gesture timelines are stored as Arrow IPC (Feather v2) files next
+# to the uploaded video, one float32 column per metric, so a chart or a new
+# metric can be computed later without decoding the video again.
+TIMELINE_SUFFIX = ".timeline.arrow"
+DEFAULT_POINTS = 200
+
+
+def timeline_path_for(video_path):
+    """Where the timeline for an uploaded video lives"""
+    return os.path.splitext(video_path)[0] + TIMELINE_SUFFIX
+
+
+def save_timeline(timeline, path):
+    """Write an (n, len(TIMELINE_COLUMNS)) float32 array as a columnar file"""
+    table = pa.table({
+        name: pa.array(np.ascontiguousarray(timeline[:, i], dtype=np.float32))
+        for i, name in enumerate(TIMELINE_COLUMNS)
+    })
+    feather.write_feather(table, path, compression="zstd")
+    return path
+
+
+def load_timeline(path):
+    """Read a stored timeline back into an (n, len(TIMELINE_COLUMNS)) float32 array"""
+    table = feather.read_table(path, columns=list(TIMELINE_COLUMNS), memory_map=True)
+    return np.column_stack([table.column(name).to_numpy() for name in TIMELINE_COLUMNS]).astype(np.float32)
+
+
+def downsample(timeline, points):
+    """
+    Reduce a timeline to at most `points` rows by averaging consecutive
+    buckets; NaNs are ignored and face_present becomes the share of frames
+    with a face.
+    """
+    if points is None or points <= 0 or len(timeline) <= points:
+        return timeline
+    edges = np.unique(np.linspace(0, len(timeline), points + 1).astype(int))[:-1]
+    present = ~np.isnan(timeline)
+    sums = np.add.reduceat(np.where(present, timeline, 0), edges, axis=0)
+    counts = np.add.reduceat(present, edges, axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (sums / counts).astype(np.float32)
+
+
+def timeline_slice(path, start=None, end=None, points=DEFAULT_POINTS):
+    """Columns of the stored timeline between `start` and `end` seconds, downsampled"""
+    timeline = load_timeline(path)
+    timestamps = timeline[:, 0]
+    lo = np.searchsorted(timestamps, start, side="left") if start is not None else 0
+    hi = np.searchsorted(timestamps, end, side="right") if end is not None else len(timeline)
+    rows = downsample(timeline[lo:hi], points)
+
+    # NaN is not valid JSON, so gaps are sent as null
+    return {
+        name: [None if np.isnan(v) else round(float(v), 4) for v in rows[:, i]]
+        for i, name in enumerate(TIMELINE_COLUMNS)
+    }
@@ -1,21 +1,52 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
-import shutil, os, json, requests, time
+import asyncio, shutil, os, json, requests, time
+from datetime import date
 from dotenv import load_dotenv
-from stt_service import transcribe_audio
-from facial_gesture import FacialGestureAnalyzer
+from stt_service import load_audio, transcribe_audio
+from audio_features import analyze_audio
+from facial_gesture import (
+    AnalyzerPool, AnalyzerUnavailable, GestureAccumulator, MAX_GESTURE_WORKERS,
+    start_segment_workers, stop_segment_workers
+)
+from gesture_timeline import timeline_path_for, save_timeline, timeline_slice
+from scoring import score_gestures, CURRENT_SCORING_VERSION
+from media_probe import probe_media, validate_media
+from analysis_budget import plan_analysis
+from analysis_export import EXPORT_FORMATS, is_export_operator, parse_user_ids, export_query, stream_csv, stream_parquet
+from response_cache import ResponseCache, conditional_response, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_ENTRIES
+from session_tokens import SessionTokens, LoginRecorder, require_user, SESSION_SECRET, LAST_LOGIN_FLUSH_SECONDS
+from cohort_stats import CohortStats, COHORT_REFRESH_SECONDS, COHORT_EMPTY_RETRY_SECONDS
 
 # Import ALL database functions at once
 try:
     from database import (
+        decode_history_cursor,
+        parse_history_fields,
+        parse_trend_metrics,
+        parse_cohort_metrics
+    )
+    # Postgres or embedded SQLite, depending on DB_BACKEND
+    from storage import (
         login_user, 
+        record_logins,
         register_user, 
         save_analysis,
         get_user_statistics,
         get_detailed_history,
-        compare_analyses
+        compare_analyses,
+        get_user_trends,
+        search_analyses,
+        get_cohort_analysis,
+        refresh_score_histograms,
+        load_score_histograms,
+        ensure_partitions,
+        get_timeline_path,
+        init_storage,
+        close_storage,
+        storage_stats
     )
     DB_AVAILABLE = True
 except Exception as e:
@@ -43,6 +74,109 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# FaceMesh graphs are expensive to build, so /analyze borrows pre-warmed
+# analyzers instead of creating one per request. There is one per video the
+# server analyzes at a time, GESTURE_MAX_WORKERS unless set; requests beyond
+# that wait up to ANALYZER_CHECKOUT_TIMEOUT for one. Built at startup.
+ANALYZER_POOL_SIZE = int(os.getenv("ANALYZER_POOL_SIZE", str(MAX_GESTURE_WORKERS)))
+analyzer_pool = None
+
+# Dashboard reads are served from memory until the user saves a new analysis
+response_cache = ResponseCache(max_entries=RESPONSE_CACHE_MAX_ENTRIES, ttl_seconds=RESPONSE_CACHE_TTL)
+
+# Requests are authenticated by the session token from /login, checked in
+# memory; logins only reach the database in periodic last_login batches
+session_tokens = SessionTokens(SESSION_SECRET)
+login_recorder = LoginRecorder()
+login_flush_task = None
+
+async def flush_logins():
+    """Write buffered last_login times in one batch"""
+    logins = login_recorder.drain()
+    if not logins:
+        return
+    result = await record_logins(logins)
+    if not result['success']:
+        print(f"⚠️ Could not record {len(logins)} login(s), retrying later: {result.get('message')}")
+        login_recorder.restore(logins)
+
+async def flush_logins_periodically():
+    while True:
+        await asyncio.sleep(LAST_LOGIN_FLUSH_SECONDS)
+        await flush_logins()
+
+# Percentiles against all users come from in-memory score histograms; the
+# histogram table is rebuilt from the analyses every COHORT_REFRESH_SECONDS
+cohort_stats = CohortStats()
+cohort_refresh_task = None
+# Set by the first save while there are no stored histograms, so they are
+# built right away instead of at the next periodic refresh
+cohort_refresh_wanted = asyncio.Event()
+
+async def refresh_cohorts_periodically():
+    while True:
+        cohort_refresh_wanted.clear()
+        # Keeps the coming months' partitions ready (Postgres) even where
+        # archive_partitions.py is not scheduled
+        result = await ensure_partitions()
+        if not result['success']:
+            print(f"⚠️ Could not create analysis partitions: {result.get('message')}")
+        # Only one worker rebuilds a stale (or empty) table; every worker reloads it
+        await refresh_score_histograms(COHORT_REFRESH_SECONDS)
+        result = await load_score_histograms()
+        if result['success']:
+            cohort_stats.load(result['buckets'])
+        else:
+            print(f"⚠️ Could not load score histograms: {result.get('message')}")
+        interval = COHORT_REFRESH_SECONDS if cohort_stats.has_histograms else COHORT_EMPTY_RETRY_SECONDS
+        try:
+            await asyncio.wait_for(cohort_refresh_wanted.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+
+@app.on_event("startup")
+async def start_gesture_workers():
+    global analyzer_pool
+    # Parallel gesture analysis uses one fixed pool of worker processes,
+    # warmed up here rather than by the first long video
+    start_segment_workers()
+    analyzer_pool = await asyncio.to_thread(
+        AnalyzerPool,
+        size=ANALYZER_POOL_SIZE,
+        max_uses=int(os.getenv("ANALYZER_MAX_USES", "200")),
+        checkout_timeout=float(os.getenv("ANALYZER_CHECKOUT_TIMEOUT", "60"))
+    )
+    print(f"✅ {ANALYZER_POOL_SIZE} gesture analyzer(s) ready")
+
+@app.on_event("startup")
+async def open_storage():
+    global DB_AVAILABLE, login_flush_task, cohort_refresh_task
+    if DB_AVAILABLE and not SESSION_SECRET:
+        # A made-up secret differs per worker, so tokens from one worker
+        # would be rejected by the others
+        raise RuntimeError("SESSION_SECRET is not set; give every API worker the same random value")
+    if DB_AVAILABLE:
+        try:
+            await init_storage()
+            login_flush_task = asyncio.create_task(flush_logins_periodically())
+            cohort_refresh_task = asyncio.create_task(refresh_cohorts_periodically())
+        except Exception as e:
+            print(f"⚠️ Warning: Database not initialized, database endpoints disabled. Error: {e}")
+            DB_AVAILABLE = False
+
+@app.on_event("shutdown")
+async def close_pools():
+    if analyzer_pool is not None:
+        analyzer_pool.close()
+    stop_segment_workers()
+    if DB_AVAILABLE:
+        if login_flush_task is not None:
+            login_flush_task.cancel()
+        if cohort_refresh_task is not None:
+            cohort_refresh_task.cancel()
+        await flush_logins()
+        await close_storage()
+
 # =======================
 # 3️⃣ Enable CORS for React
 # =======================
@@ -214,6 +348,29 @@ def analyze_speech_comparison(user_transcript: str, gemini_speech: str) -> dict:
         print(f"❌ Speech Comparison Error: {e}")
         return {"success": False, "message": f"Failed to analyze comparison: {e}"}
 
+async def session_user(authorization: str = Header(None)) -> int:
+    """user_id of the session token in an "Authorization: Bearer <token>" header"""
+    return session_tokens.user_from_header(authorization)
+
+def raise_for_result(result):
+    """404 for lookups that matched nothing, 500 for database errors"""
+    status = 404 if result.get('not_found') else 500
+    raise HTTPException(status_code=status, detail=result.get('message'))
+
+async def cached_response(request: Request, key: tuple, load):
+    """
+    Serve a per-user result from response_cache, loading it on a miss.
+    Responses carry an ETag; a matching If-None-Match gets 304 with no body.
+    """
+    entry = response_cache.get(key)
+    if entry is None:
+        generation = response_cache.generation(key[0])
+        result = await load()
+        if not result['success']:
+            raise_for_result(result)
+        entry = response_cache.put(key, result, generation)
+    return conditional_response(entry, request.headers.get("if-none-match"))
+
 # =======================
 # 6️⃣ API Routes
 # =======================
@@ -224,41 +381,52 @@ def root():
     return {
         "message": "✅ Backend running with Faster-Whisper + Gemini + Facial Gesture Analyzer",
         "database_available": DB_AVAILABLE,
+        "database": storage_stats() if DB_AVAILABLE else None,
+        "response_cache": response_cache.stats(),
+        "sessions": {**session_tokens.stats(), "pending_logins": login_recorder.pending()},
+        "cohorts": cohort_stats.stats(),
         "version": "1.0.0"
     }
 
 @app.post("/login")
-def login(request: LoginRequest):
+async def login(request: LoginRequest):
     """User login endpoint"""
     if not DB_AVAILABLE:
         raise HTTPException(status_code=503, detail="Database not available")
     
-    result = login_user(request.username, request.password)
+    result = await login_user(request.username, request.password)
     if result['success']:
+        login_recorder.record(result['user_id'])
         return {
             "success": True,
             "user_id": result['user_id'],
             "username": result['username'],
-            "email": result['email']
+            "email": result['email'],
+            "token": session_tokens.issue(result['user_id']),
+            "expires_in": int(session_tokens.ttl_seconds)
         }
     else:
         raise HTTPException(status_code=401, detail=result.get('message', 'Invalid credentials'))
 
 @app.post("/signup")
-def signup(request: SignupRequest):
+async def signup(request: SignupRequest):
     """User registration endpoint"""
     if not DB_AVAILABLE:
         raise HTTPException(status_code=503, detail="Database not available")
     
-    result = register_user(request.username, request.email, request.password)
+    result = await register_user(request.username, request.email, request.password)
     if result['success']:
         return {"success": True, "message": "Account created successfully"}
     else:
         raise HTTPException(status_code=400, detail=result.get('message', 'Registration failed'))
 
 @app.post("/analyze")
-async def analyze(file: UploadFile = File(...)):
-    """Analyze speech from uploaded video/audio file"""
+def analyze(file: UploadFile = File(...), budget_seconds: float = None):
+    """
+    Analyze speech from uploaded video/audio file.
+    Transcription and gesture quality are scaled down as needed so the
+    request fits `budget_seconds` (ANALYZE_BUDGET_SECONDS by default).
+    """
     temp_path = f"temp_{file.filename}"
     saved_video_path = None
     
@@ -267,6 +435,21 @@ async def analyze(file: UploadFile = File(...)):
         with open(temp_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
         file.file.close()
+        
+        # Get file info
+        file_size = os.path.getsize(temp_path)
+
+        # Step 0: Read container metadata and reject bad uploads before any decoding
+        try:
+            probe = probe_media(temp_path)
+        except Exception as e:
+            print(f"❌ Unreadable upload {file.filename}: {e}")
+            raise HTTPException(status_code=400, detail="File is not a readable audio/video file")
+        preflight = validate_media(probe, file_size)
+        if not preflight['success']:
+            raise HTTPException(status_code=400, detail=preflight['message'])
+        has_video = preflight['mode'] == "video"
+        print(f"🔎 Probe: {probe}")
 
         # Create uploads directory if it doesn't exist
         uploads_dir = "uploads"
@@ -281,31 +464,49 @@ async def analyze(file: UploadFile = File(...)):
         
         # Copy to permanent location
         shutil.copy2(temp_path, saved_video_path)
-        
-        # Get file info
-        file_size = os.path.getsize(temp_path)
 
-        # Step 1: Transcribe speech
+        # Pick quality settings that fit the time budget
+        transcription_profile, gesture_policy, analysis_plan = plan_analysis(probe, budget_seconds)
+        print(f"⏱️ Analysis plan: {analysis_plan}")
+
+        # Step 1: Decode audio once and transcribe speech
         print("📝 Transcribing audio...")
-        transcription = transcribe_audio(temp_path)
+        audio = load_audio(temp_path) if probe['has_audio'] else []
+        transcription = transcribe_audio(audio, transcription_profile) if len(audio) else ""
+
+        # Step 1b: Delivery metrics from the same PCM buffer
+        print("🎙️ Analyzing audio delivery...")
+        audio_metrics = analyze_audio(audio)
 
         # Step 2: Gemini feedback
         print("🤖 Getting Gemini feedback...")
         feedback = call_gemini(transcription)
 
-        # Step 3: Facial gesture analysis
-        print("😊 Analyzing facial gestures...")
-        analyzer = FacialGestureAnalyzer()
-        gesture_metrics = analyzer.analyze_video(temp_path)
+        # Step 3: Facial gesture analysis (audio-only uploads have nothing to look at)
+        if has_video:
+            print("😊 Analyzing facial gestures...")
+            try:
+                with analyzer_pool.analyzer() as analyzer:
+                    gesture_accumulator = analyzer.accumulate_video(temp_path, policy=gesture_policy)
+            except AnalyzerUnavailable as e:
+                print(f"⚠️ {e}")
+                raise HTTPException(status_code=503, detail="Server busy, try again shortly")
+        else:
+            print("🎧 Audio-only upload, skipping facial gestures")
+            gesture_accumulator = GestureAccumulator()
+        gesture_metrics = gesture_accumulator.metrics()
+
+        # Keep the per-frame signal next to the upload for charts and re-scoring;
+        # files of analyses that are never saved are removed by cleanup_timelines.py
+        timeline_path = None
+        if has_video and gesture_policy.record_timeline:
+            try:
+                timeline_path = save_timeline(gesture_accumulator.timeline(), timeline_path_for(saved_video_path))
+            except Exception as e:
+                print(f"⚠️ Could not save gesture timeline: {e}")
 
         # Step 4: Calculate confidence and nervousness
-        smile = gesture_metrics.get('smile_mean', 0)
-        head_movement = gesture_metrics.get('head_pose_mean', 0)
-        confidence = max(0, min(10, (smile * 10) - (head_movement * 5)))
-        
-        eyebrow = gesture_metrics.get('eyebrow_raise_mean', 0)
-        blink = min(gesture_metrics.get('blink_count', 0), 20) / 20
-        nervousness = max(0, min(10, (eyebrow * 5 + blink * 5 + head_movement * 5)))
+        confidence, nervousness = score_gestures(gesture_metrics)
 
         print("✅ Analysis complete!")
         
@@ -314,14 +515,22 @@ async def analyze(file: UploadFile = File(...)):
             "transcription": transcription,
             "feedback": feedback,
             "gesture_metrics": gesture_metrics,
-            "confidence_score": round(confidence, 2),
-            "nervousness_score": round(nervousness, 2),
+            "audio_metrics": audio_metrics,
+            "gesture_policy": gesture_policy.to_dict() if has_video else None,
+            "analysis_plan": analysis_plan,
+            "confidence_score": confidence,
+            "nervousness_score": nervousness,
+            "scoring_version": CURRENT_SCORING_VERSION,
             "filename": file.filename,
             "video_path": saved_video_path,
+            "timeline_path": timeline_path,
             "file_size": file_size,
-            "file_duration": gesture_metrics.get('duration', 0)
+            "file_duration": probe['duration'],
+            "media": probe
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Analysis error: {e}")
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
@@ -335,10 +544,11 @@ async def analyze(file: UploadFile = File(...)):
             pass
 
 @app.post("/save-analysis")
-def save_analysis_endpoint(request: SaveAnalysisRequest):
+async def save_analysis_endpoint(request: SaveAnalysisRequest, session_user_id: int = Depends(session_user)):
     """Save speech analysis to database"""
     if not DB_AVAILABLE:
         raise HTTPException(status_code=503, detail="Database not available")
+    require_user(session_user_id, request.user_id)
     
     try:
         # Ensure analysis_data has all required fields with defaults
@@ -349,9 +559,14 @@ def save_analysis_endpoint(request: SaveAnalysisRequest):
             analysis_data['topic'] = ''
         
         print(f"💾 Saving analysis for user {request.user_id}...")
-        result = save_analysis(request.user_id, analysis_data)
+        result = await save_analysis(request.user_id, analysis_data)
         
         if result['success']:
+            # Cached statistics/history of this user are now out of date
+            response_cache.invalidate_user(request.user_id)
+            cohort_stats.add_analysis(analysis_data, result['analyzed_at'])
+            if not cohort_stats.has_histograms:
+                cohort_refresh_wanted.set()
             return {
                 "success": True, 
                 "message": "Analysis saved successfully", 
@@ -375,53 +590,222 @@ async def get_video(filename: str):
         raise HTTPException(status_code=404, detail="Video not found")
 
 @app.get("/user-history/{user_id}")
-def get_history(user_id: int, limit: int = 20):
-    """Get user's analysis history"""
+async def get_history(request: Request, user_id: int, limit: int = 20, cursor: str = None, fields: str = None,
+                      session_user_id: int = Depends(session_user)):
+    """
+    Get one page of user's analysis history, newest first.
+    Pass the returned next_cursor to get the following page; `fields` is a
+    comma-separated subset of the row's fields (e.g. "scores,session_number").
+    """
     if not DB_AVAILABLE:
         raise HTTPException(status_code=503, detail="Database not available")
+    require_user(session_user_id, user_id)
     
     try:
-        result = get_detailed_history(user_id, limit)
-        if result['success']:
-            return result
-        else:
-            raise HTTPException(status_code=404, detail=result.get('message'))
+        decode_history_cursor(cursor)
+        parse_history_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        return await cached_response(
+            request, (user_id, "history", limit, cursor, fields),
+            lambda: get_detailed_history(user_id, limit, cursor, fields)
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ History error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/user-statistics/{user_id}")
-def get_statistics(user_id: int):
+async def get_statistics(request: Request, user_id: int, session_user_id: int = Depends(session_user)):
     """Get user's overall statistics"""
     if not DB_AVAILABLE:
         raise HTTPException(status_code=503, detail="Database not available")
+    require_user(session_user_id, user_id)
     
     try:
-        result = get_user_statistics(user_id)
-        if result['success']:
-            return result
-        else:
-            raise HTTPException(status_code=404, detail=result.get('message'))
+        return await cached_response(request, (user_id, "statistics"), lambda: get_user_statistics(user_id))
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Statistics error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/compare/{user_id}/{analysis_id_1}/{analysis_id_2}")
-def compare(user_id: int, analysis_id_1: int, analysis_id_2: int):
+async def compare(request: Request, user_id: int, analysis_id_1: int, analysis_id_2: int,
+                  session_user_id: int = Depends(session_user)):
     """Compare two analyses"""
     if not DB_AVAILABLE:
         raise HTTPException(status_code=503, detail="Database not available")
+    require_user(session_user_id, user_id)
     
     try:
-        result = compare_analyses(user_id, analysis_id_1, analysis_id_2)
-        if result['success']:
-            return result
-        else:
-            raise HTTPException(status_code=404, detail=result.get('message'))
+        # The comparison is ordered by date, so either id order gives the same result
+        pair = tuple(sorted((analysis_id_1, analysis_id_2)))
+        return await cached_response(
+            request, (user_id, "compare") + pair,
+            lambda: compare_analyses(user_id, analysis_id_1, analysis_id_2)
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Comparison error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/trends/{user_id}")
+async def get_trends(request: Request, user_id: int, metrics: str = None, start_session: int = None,
+                     end_session: int = None, window: int = 5, points: int = None,
+                     session_user_id: int = Depends(session_user)):
+    """
+    Per-metric trend over a range of sessions: value, rolling average over
+    `window` sessions and change from the previous session, plus best streaks.
+    `metrics` is a comma-separated subset (e.g. "overall,confidence"); with
+    `points` long histories are averaged down to that many points.
+    """
+    if not DB_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Database not available")
+    require_user(session_user_id, user_id)
+    
+    try:
+        parse_trend_metrics(metrics)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        return await cached_response(
+            request, (user_id, "trends", metrics, start_session, end_session, window, points),
+            lambda: get_user_trends(user_id, metrics, start_session, end_session, window, points)
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Trends error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/search/{user_id}")
+async def search(request: Request, user_id: int, q: str, limit: int = 20, offset: int = 0,
+                 session_user_id: int = Depends(session_user)):
+    """
+    Search user's analyses by what was said or the topic, best match first.
+    `q` accepts web search syntax ("exact phrase", or, -word); snippets mark
+    matches with <mark> in otherwise HTML-escaped text. Pass next_offset as
+    `offset` for the next page.
+    """
+    if not DB_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Database not available")
+    require_user(session_user_id, user_id)
+    
+    q = q.strip()
+    if not q:
+        raise HTTPException(status_code=400, detail="Search query is empty")
+    
+    try:
+        return await cached_response(
+            request, (user_id, "search", q, limit, offset),
+            lambda: search_analyses(user_id, q, limit, offset)
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Search error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/percentiles/{user_id}")
+async def get_percentiles(user_id: int, metrics: str = None, analysis_id: int = None, by_topic: bool = False,
+                          session_user_id: int = Depends(session_user)):
+    """
+    Where an analysis (the latest by default) ranks among all analyses, per
+    metric: percentile 0-100 and cohort size. With `by_topic` the cohort is
+    analyses of the same topic, if it is common enough to have one.
+    `metrics` is a comma-separated subset (e.g. "overall,confidence").
+    """
+    if not DB_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Database not available")
+    require_user(session_user_id, user_id)
+    
+    try:
+        requested = parse_cohort_metrics(metrics)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if not cohort_stats.loaded:
+        raise HTTPException(status_code=503, detail="Score histograms not loaded yet")
+    
+    try:
+        # Not cached: percentiles move as other users save, and the lookup
+        # itself is in memory
+        analysis = await get_cohort_analysis(user_id, analysis_id)
+        if not analysis['success']:
+            raise_for_result(analysis)
+        return cohort_stats.percentiles(analysis, requested, by_topic)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Percentiles error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/export")
+def export_analyses(user_ids: str, format: str = "csv", start_date: date = None, end_date: date = None,
+                    authorization: str = Header(None), x_export_key: str = Header(None)):
+    """
+    Download every analysis of the given users (comma-separated ids),
+    optionally limited to a date range, as CSV or Parquet. Rows are streamed
+    straight from the database, oldest session of each user first.
+    Any users with the operator's X-Export-Key, otherwise only the session
+    user's own analyses.
+    """
+    if not DB_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Database not available")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format must be one of: {', '.join(EXPORT_FORMATS)}")
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date is after end_date")
+    
+    try:
+        ids = parse_user_ids(user_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not is_export_operator(x_export_key):
+        session_user_id = session_tokens.user_from_header(authorization)
+        if ids != [session_user_id]:
+            raise HTTPException(status_code=403, detail="Only your own analyses can be exported")
+    sql, params = export_query(ids, start_date, end_date)
+    
+    stream = stream_csv if format == "csv" else stream_parquet
+    filename = f"analyses_{date.today():%Y%m%d}.{format}"
+    print(f"📤 Exporting analyses of {user_ids} as {format}")
+    return StreamingResponse(
+        stream(sql, params),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/timeline/{user_id}/{analysis_id}")
+def get_timeline(user_id: int, analysis_id: int, start: float = None, end: float = None, points: int = 200,
+                 session_user_id: int = Depends(session_user)):
+    """Get a downsampled slice of an analysis' per-frame gesture timeline"""
+    if not DB_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Database not available")
+    require_user(session_user_id, user_id)
+    
+    result = get_timeline_path(user_id, analysis_id)
+    if not result['success']:
+        raise_for_result(result)
+    if not os.path.exists(result['timeline_path']):
+        raise HTTPException(status_code=404, detail="Timeline file not found")
+    
+    try:
+        return {
+            "success": True,
+            "analysis_id": analysis_id,
+            "timeline": timeline_slice(result['timeline_path'], start, end, points)
+        }
+    except Exception as e:
+        print(f"❌ Timeline error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/generate-gemini-speech")
 def generate_speech(request: GenerateSpeechRequest):
     """Generate a reference speech on a given topic"""
@@ -0,0 +1,116 @@
+import os
+import av
+
+# Preflight limits for /analyze; anything outside them is rejected before
+# Whisper or FaceMesh run. Every request is planned against a time budget
+# (analysis_budget.py), which lowers quality for long recordings, so the
+# length cap only guards against recordings no budget rung can handle.
+MAX_UPLOAD_MB = float(os.getenv("MAX_UPLOAD_MB", "500"))
+MAX_MEDIA_SECONDS = float(os.getenv("MAX_MEDIA_SECONDS", "3600"))
+MIN_MEDIA_SECONDS = float(os.getenv("MIN_MEDIA_SECONDS", "1"))
+MAX_VIDEO_PIXELS = int(os.getenv("MAX_VIDEO_PIXELS", str(3840 * 2160)))
+
+
+def _is_cover_art(stream):
+    """Still images embedded in audio files (album art) show up as video streams"""
+    return bool(stream.disposition & av.stream.Disposition.attached_pic)
+
+
+def _measure(container, video, audio):
+    """
+    Duration (s) and video packet count from the packets themselves, for
+    containers whose header has neither, such as WebM from a browser's
+    MediaRecorder. Packets are only demuxed, not decoded.
+    """
+    first, last, packets = None, 0.0, 0
+    for packet in container.demux([s for s in (video, audio) if s is not None]):
+        if packet.pts is None or packet.time_base is None:
+            continue
+        if packet.stream is video:
+            packets += 1
+        begin = float(packet.pts * packet.time_base)
+        first = begin if first is None else min(first, begin)
+        last = max(last, float((packet.pts + (packet.duration or 0)) * packet.time_base))
+    return (last - first if first is not None else 0.0), packets
+
+
+def _decodes(container, video):
+    """Whether the first frame of the video stream decodes"""
+    try:
+        container.seek(0)
+        return next(container.decode(video), None) is not None
+    except av.error.FFmpegError:
+        return False
+
+
+def probe_media(file_path):
+    """
+    Reads container metadata without decoding any frames.
+    Returns container format, duration (s), video codec/resolution/fps/frame
+    count (empty when there is no video stream) and audio codec/sample rate.
+    When the header lacks the duration or frame count, they are measured
+    from packet timestamps and the first video frame is test-decoded
+    ("measured": True).
+    Raises av.error.FFmpegError if the file cannot be opened as media.
+    """
+    with av.open(file_path) as container:
+        videos = [s for s in container.streams.video if not _is_cover_art(s)]
+        video = videos[0] if videos else None
+        audio = container.streams.audio[0] if container.streams.audio else None
+
+        duration = container.duration / av.time_base if container.duration else 0.0
+        if not duration:
+            for stream in (video, audio):
+                if stream is not None and stream.duration and stream.time_base:
+                    duration = float(stream.duration * stream.time_base)
+                    break
+
+        fps = float(video.average_rate) if video is not None and video.average_rate else 0.0
+        frame_count = video.frames if video is not None and video.frames else int(duration * fps)
+
+        measured = not duration or (video is not None and not frame_count)
+        if measured:
+            duration, packets = _measure(container, video, audio)
+            if video is not None:
+                fps = fps or (packets / duration if duration else 0.0)
+                frame_count = packets if _decodes(container, video) else 0
+
+        return {
+            "format": container.format.name,
+            "duration": round(duration, 2),
+            "video_codec": video.codec_context.name if video is not None else None,
+            "width": video.width if video is not None else 0,
+            "height": video.height if video is not None else 0,
+            "fps": round(fps, 2),
+            "frame_count": frame_count,
+            "audio_codec": audio.codec_context.name if audio is not None else None,
+            "sample_rate": audio.codec_context.sample_rate if audio is not None else 0,
+            "has_video": video is not None,
+            "has_audio": audio is not None,
+            "measured": measured
+        }
+
+
+def validate_media(probe, file_size):
+    """
+    Preflight check of a probed upload.
+    Returns {"success": True, "mode": "video" | "audio"} or
+    {"success": False, "message": ...}; audio-only uploads skip gesture
+    analysis and silent videos skip transcription.
+    """
+    if file_size > MAX_UPLOAD_MB * 1024 * 1024:
+        return {"success": False, "message": f"File is larger than {MAX_UPLOAD_MB:.0f} MB"}
+    if not probe["has_audio"] and not probe["has_video"]:
+        return {"success": False, "message": "File has no audio or video stream"}
+    if probe["duration"] < MIN_MEDIA_SECONDS:
+        return {"success": False, "message": "Recording is too short to analyze"}
+    if probe["duration"] > MAX_MEDIA_SECONDS:
+        return {"success": False, "message": f"Recording is longer than {MAX_MEDIA_SECONDS / 60:.0f} minutes"}
+
+    if not probe["has_video"]:
+        return {"success": True, "mode": "audio"}
+    if probe["width"] * probe["height"] > MAX_VIDEO_PIXELS:
+        return {"success": False, "message": f"Video resolution {probe['width']}x{probe['height']} is too large"}
+    if not probe["frame_count"] or not probe["fps"]:
+        return {"success": False, "message": "Video stream has no readable frames"}
+    return {"success": True, "mode": "video"}
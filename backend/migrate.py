@@ -0,0 +1,55 @@
+# backend/migrate.py
+"""
+Bring the database schema up to date; run once per deploy, before starting
+the API workers.
+
+    python migrate.py [--target N] [--status]
+
+Pending files from migrations/ are applied in order under an advisory lock,
+so running this from several deploy hosts at once is safe. Databases created
+by the old startup-time create_tables() are adopted by 0001_baseline as-is.
+
+speech_analyses is partitioned by month (0002). Schedule
+archive_partitions.py daily from cron as well; it creates the coming months'
+partitions (as the running API also does) and archives old texts.
+"""
+import argparse
+from database import db_connection
+from migrations import discover_migrations, applied_migrations, apply_migrations
+
+def migration_status():
+    """Print every known migration and whether it has been applied"""
+    with db_connection() as conn, conn.cursor() as cursor:
+        done = applied_migrations(cursor)
+    for migration in discover_migrations():
+        if migration.version not in done:
+            state = "pending"
+        elif done[migration.version] != migration.checksum():
+            state = "applied (file edited since)"
+        else:
+            state = "applied"
+        print(f"   {migration.version:04d}_{migration.name}: {state}")
+    unknown = sorted(set(done) - {m.version for m in discover_migrations()})
+    if unknown:
+        print(f"⚠️ Applied migrations missing from this checkout: {unknown}")
+
+def migrate(target=None):
+    """Apply pending migrations up to `target` (the latest by default)"""
+    try:
+        with db_connection() as conn:
+            applied = apply_migrations(conn, target)
+        print(f"✅ Applied {len(applied)} migration(s)" if applied else "✅ Schema already up to date")
+        return {"success": True, "applied": applied}
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply database schema migrations")
+    parser.add_argument("--target", type=int, default=None, help="stop after this version")
+    parser.add_argument("--status", action="store_true", help="list migrations without applying them")
+    args = parser.parse_args()
+    if args.status:
+        migration_status()
+    elif not migrate(args.target)["success"]:
+        raise SystemExit(1)
@@ -0,0 +1,178 @@
+-- Baseline: the schema database.create_tables() used to build on every
+-- startup. Each statement tolerates a database that create_tables() already
+-- set up, fully or partly, so existing deployments adopt migrations as-is.
+
+CREATE TABLE IF NOT EXISTS users (
+    user_id SERIAL PRIMARY KEY,
+    username VARCHAR(50) UNIQUE NOT NULL,
+    email VARCHAR(100) UNIQUE NOT NULL,
+    password_hash VARCHAR(64) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_login TIMESTAMP,
+    next_session INTEGER NOT NULL DEFAULT 1
+);
+
+CREATE TABLE IF NOT EXISTS speech_analyses (
+    analysis_id SERIAL PRIMARY KEY,
+    user_id INTEGER REFERENCES users(user_id) ON DELETE CASCADE,
+    filename VARCHAR(255),
+    video_path VARCHAR(500),
+    topic TEXT,
+    transcription TEXT,
+
+    -- Feedback scores
+    clarity_score FLOAT,
+    clarity_comment TEXT,
+    arguments_score FLOAT,
+    arguments_comment TEXT,
+    grammar_score FLOAT,
+    grammar_comment TEXT,
+    delivery_score FLOAT,
+    delivery_comment TEXT,
+    overall_score FLOAT,
+    overall_comment TEXT,
+
+    -- Gesture metrics
+    smile_mean FLOAT,
+    eyebrow_raise_mean FLOAT,
+    blink_count INTEGER,
+    head_pose_mean FLOAT,
+
+    -- Audio delivery metrics
+    speech_ratio FLOAT,
+    pause_count INTEGER,
+    volume_variability FLOAT,
+    pitch_mean FLOAT,
+    pitch_std FLOAT,
+    speaking_rate FLOAT,
+    speaking_rate_stability FLOAT,
+
+    -- Calculated metrics
+    confidence_score FLOAT,
+    nervousness_score FLOAT,
+    scoring_version INTEGER,
+
+    -- File info
+    file_duration FLOAT,
+    file_size INTEGER,
+    timeline_path VARCHAR(500),
+
+    -- Timestamps
+    analyzed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+    -- Session tracking
+    session_number INTEGER DEFAULT 1,
+    CONSTRAINT uq_user_session UNIQUE (user_id, session_number)
+);
+
+-- Columns added after the first release
+ALTER TABLE speech_analyses ADD COLUMN IF NOT EXISTS topic TEXT;
+ALTER TABLE speech_analyses ADD COLUMN IF NOT EXISTS speech_ratio FLOAT;
+ALTER TABLE speech_analyses ADD COLUMN IF NOT EXISTS pause_count INTEGER;
+ALTER TABLE speech_analyses ADD COLUMN IF NOT EXISTS volume_variability FLOAT;
+ALTER TABLE speech_analyses ADD COLUMN IF NOT EXISTS pitch_mean FLOAT;
+ALTER TABLE speech_analyses ADD COLUMN IF NOT EXISTS pitch_std FLOAT;
+ALTER TABLE speech_analyses ADD COLUMN IF NOT EXISTS speaking_rate FLOAT;
+ALTER TABLE speech_analyses ADD COLUMN IF NOT EXISTS speaking_rate_stability FLOAT;
+ALTER TABLE speech_analyses ADD COLUMN IF NOT EXISTS timeline_path VARCHAR(500);
+ALTER TABLE speech_analyses ADD COLUMN IF NOT EXISTS scoring_version INTEGER;
+
+-- Session numbers come from a per-user counter instead of COUNT(*).
+-- Concurrent saves could repeat a number, so older tables are renumbered in
+-- upload order before the counter and the unique constraint are added.
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'users' AND column_name = 'next_session'
+    ) THEN
+        ALTER TABLE users ADD COLUMN next_session INTEGER NOT NULL DEFAULT 1;
+        UPDATE speech_analyses AS s
+        SET session_number = n.session_number
+        FROM (
+            SELECT analysis_id,
+                   ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY analyzed_at, analysis_id) AS session_number
+            FROM speech_analyses
+        ) AS n
+        WHERE s.analysis_id = n.analysis_id AND s.session_number IS DISTINCT FROM n.session_number;
+        UPDATE users AS u
+        SET next_session = c.sessions + 1
+        FROM (SELECT user_id, COUNT(*) AS sessions FROM speech_analyses GROUP BY user_id) AS c
+        WHERE u.user_id = c.user_id;
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_user_session') THEN
+        ALTER TABLE speech_analyses ADD CONSTRAINT uq_user_session UNIQUE (user_id, session_number);
+    END IF;
+END $$;
+
+-- Per-user statistics summary, maintained by save_analysis
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id INTEGER PRIMARY KEY REFERENCES users(user_id) ON DELETE CASCADE,
+    total_analyses INTEGER NOT NULL DEFAULT 0,
+    overall_sum FLOAT NOT NULL DEFAULT 0,
+    overall_count INTEGER NOT NULL DEFAULT 0,
+    confidence_sum FLOAT NOT NULL DEFAULT 0,
+    confidence_count INTEGER NOT NULL DEFAULT 0,
+    nervousness_sum FLOAT NOT NULL DEFAULT 0,
+    nervousness_count INTEGER NOT NULL DEFAULT 0,
+    best_score FLOAT,
+    worst_score FLOAT,
+    first_scores JSONB NOT NULL DEFAULT '[]',
+    recent_scores JSONB NOT NULL DEFAULT '[]',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Backfill user_stats for users whose analyses predate it
+INSERT INTO user_stats (
+    user_id, total_analyses,
+    overall_sum, overall_count, confidence_sum, confidence_count,
+    nervousness_sum, nervousness_count, best_score, worst_score,
+    first_scores, recent_scores
+)
+SELECT
+    s.user_id, COUNT(*),
+    COALESCE(SUM(overall_score), 0), COUNT(overall_score),
+    COALESCE(SUM(confidence_score), 0), COUNT(confidence_score),
+    COALESCE(SUM(nervousness_score), 0), COUNT(nervousness_score),
+    MAX(overall_score), MIN(overall_score),
+    (SELECT jsonb_agg(w.entry ORDER BY w.session_number) FROM (
+        SELECT session_number, jsonb_build_object(
+            'score', overall_score, 'session', session_number, 'date', to_char(analyzed_at, 'YYYY-MM-DD')
+        ) AS entry
+        FROM speech_analyses WHERE user_id = s.user_id
+        ORDER BY session_number LIMIT 5
+    ) AS w),
+    (SELECT jsonb_agg(w.entry ORDER BY w.session_number DESC) FROM (
+        SELECT session_number, jsonb_build_object(
+            'score', overall_score, 'session', session_number, 'date', to_char(analyzed_at, 'YYYY-MM-DD')
+        ) AS entry
+        FROM speech_analyses WHERE user_id = s.user_id
+        ORDER BY session_number DESC LIMIT 5
+    ) AS w)
+FROM speech_analyses AS s
+GROUP BY s.user_id
+ON CONFLICT (user_id) DO NOTHING;
+
+-- analysis_id breaks analyzed_at ties so history pages can seek straight to
+-- their keyset; older databases have the index without it
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_indexes
+        WHERE indexname = 'idx_user_analyses' AND indexdef NOT LIKE '%analysis_id%'
+    ) THEN
+        DROP INDEX idx_user_analyses;
+    END IF;
+END $$;
+CREATE INDEX IF NOT EXISTS idx_user_analyses
+ON speech_analyses(user_id, analyzed_at DESC, analysis_id DESC);
+
+-- Full-text search over topic and transcription, kept up to date by
+-- Postgres itself; topic matches rank above transcript matches
+ALTER TABLE speech_analyses ADD COLUMN IF NOT EXISTS search_vector tsvector
+GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', coalesce(topic, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(transcription, '')), 'B')
+) STORED;
+CREATE INDEX IF NOT EXISTS idx_analysis_search
+ON speech_analyses USING GIN (search_vector);
@@ -0,0 +1,158 @@
+-- Monthly range partitions on analyzed_at for speech_analyses, with the
+-- large text columns (transcription, feedback comments) and the search
+-- vector moved to analysis_texts, partitioned the same way. Dashboard
+-- queries read only the narrow table; old text partitions can be archived
+-- and dropped by archive_partitions.py while their scores stay queryable.
+--
+-- Partition keys must be part of every unique index, so the primary keys
+-- become (analysis_id, analyzed_at) and uq_user_session goes away; session
+-- numbers stay unique because they come from users.next_session.
+
+ALTER TABLE speech_analyses RENAME TO speech_analyses_unpartitioned;
+ALTER TABLE speech_analyses_unpartitioned RENAME CONSTRAINT speech_analyses_pkey TO speech_analyses_unpartitioned_pkey;
+ALTER TABLE speech_analyses_unpartitioned DROP CONSTRAINT uq_user_session;
+DROP INDEX idx_user_analyses;
+DROP INDEX idx_analysis_search;
+
+CREATE TABLE speech_analyses (
+    analysis_id INTEGER NOT NULL DEFAULT nextval('speech_analyses_analysis_id_seq'),
+    user_id INTEGER REFERENCES users(user_id) ON DELETE CASCADE,
+    filename VARCHAR(255),
+    video_path VARCHAR(500),
+    topic TEXT,
+
+    -- Feedback scores
+    clarity_score FLOAT,
+    arguments_score FLOAT,
+    grammar_score FLOAT,
+    delivery_score FLOAT,
+    overall_score FLOAT,
+
+    -- Gesture metrics
+    smile_mean FLOAT,
+    eyebrow_raise_mean FLOAT,
+    blink_count INTEGER,
+    head_pose_mean FLOAT,
+
+    -- Audio delivery metrics
+    speech_ratio FLOAT,
+    pause_count INTEGER,
+    volume_variability FLOAT,
+    pitch_mean FLOAT,
+    pitch_std FLOAT,
+    speaking_rate FLOAT,
+    speaking_rate_stability FLOAT,
+
+    -- Calculated metrics
+    confidence_score FLOAT,
+    nervousness_score FLOAT,
+    scoring_version INTEGER,
+
+    -- File info
+    file_duration FLOAT,
+    file_size INTEGER,
+    timeline_path VARCHAR(500),
+
+    -- Timestamps
+    analyzed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    -- Session tracking
+    session_number INTEGER DEFAULT 1,
+    PRIMARY KEY (analysis_id, analyzed_at)
+) PARTITION BY RANGE (analyzed_at);
+ALTER SEQUENCE speech_analyses_analysis_id_seq OWNED BY speech_analyses.analysis_id;
+
+CREATE TABLE analysis_texts (
+    analysis_id INTEGER NOT NULL,
+    analyzed_at TIMESTAMP NOT NULL,
+    user_id INTEGER REFERENCES users(user_id) ON DELETE CASCADE,
+    transcription TEXT,
+    clarity_comment TEXT,
+    arguments_comment TEXT,
+    grammar_comment TEXT,
+    delivery_comment TEXT,
+    overall_comment TEXT,
+    -- topic (weight A) and transcription (weight B), set by save_analysis
+    search_vector tsvector,
+    PRIMARY KEY (analysis_id, analyzed_at)
+) PARTITION BY RANGE (analyzed_at);
+
+-- Rows outside every monthly partition land here until one is created
+CREATE TABLE speech_analyses_default PARTITION OF speech_analyses DEFAULT;
+CREATE TABLE analysis_texts_default PARTITION OF analysis_texts DEFAULT;
+
+CREATE INDEX idx_user_analyses ON speech_analyses (user_id, analyzed_at DESC, analysis_id DESC);
+CREATE INDEX idx_user_sessions ON speech_analyses (user_id, session_number);
+CREATE INDEX idx_analysis_texts_user ON analysis_texts (user_id);
+CREATE INDEX idx_analysis_search ON analysis_texts USING GIN (search_vector);
+
+-- Archived text partitions, see archive_partitions.py
+CREATE TABLE archived_text_partitions (
+    month DATE PRIMARY KEY,
+    path VARCHAR(500) NOT NULL,
+    row_count INTEGER NOT NULL,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Creates the partitions of both tables for the month containing `month`,
+-- moving any rows of that month out of the default partitions first
+CREATE OR REPLACE FUNCTION ensure_analysis_partitions(month DATE) RETURNS VOID AS $$
+DECLARE
+    lo TIMESTAMP := date_trunc('month', month);
+    hi TIMESTAMP := date_trunc('month', month) + INTERVAL '1 month';
+    parent TEXT;
+    partition TEXT;
+BEGIN
+    FOREACH parent IN ARRAY ARRAY['speech_analyses', 'analysis_texts'] LOOP
+        partition := parent || '_' || to_char(lo, 'YYYY_MM');
+        CONTINUE WHEN to_regclass(partition) IS NOT NULL;
+        EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', partition, parent);
+        EXECUTE format(
+            'WITH moved AS (DELETE FROM %I WHERE analyzed_at >= %L AND analyzed_at < %L RETURNING *) '
+            'INSERT INTO %I SELECT * FROM moved',
+            parent || '_default', lo, hi, partition
+        );
+        EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', parent, partition, lo, hi);
+    END LOOP;
+END
+$$ LANGUAGE plpgsql;
+
+-- Partitions for every month with data, through three months ahead
+SELECT ensure_analysis_partitions(m::date)
+FROM generate_series(
+    date_trunc('month', LEAST((SELECT MIN(analyzed_at) FROM speech_analyses_unpartitioned), CURRENT_TIMESTAMP)),
+    date_trunc('month', CURRENT_TIMESTAMP) + INTERVAL '3 months',
+    INTERVAL '1 month'
+) AS m;
+
+INSERT INTO speech_analyses (
+    analysis_id, user_id, filename, video_path, topic,
+    clarity_score, arguments_score, grammar_score, delivery_score, overall_score,
+    smile_mean, eyebrow_raise_mean, blink_count, head_pose_mean,
+    speech_ratio, pause_count, volume_variability, pitch_mean, pitch_std, speaking_rate, speaking_rate_stability,
+    confidence_score, nervousness_score, scoring_version,
+    file_duration, file_size, timeline_path, analyzed_at, session_number
+)
+SELECT
+    analysis_id, user_id, filename, video_path, topic,
+    clarity_score, arguments_score, grammar_score, delivery_score, overall_score,
+    smile_mean, eyebrow_raise_mean, blink_count, head_pose_mean,
+    speech_ratio, pause_count, volume_variability, pitch_mean, pitch_std, speaking_rate, speaking_rate_stability,
+    confidence_score, nervousness_score, scoring_version,
+    file_duration, file_size, timeline_path, COALESCE(analyzed_at, CURRENT_TIMESTAMP), session_number
+FROM speech_analyses_unpartitioned;
+
+INSERT INTO analysis_texts (
+    analysis_id, analyzed_at, user_id, transcription,
+    clarity_comment, arguments_comment, grammar_comment, delivery_comment, overall_comment,
+    search_vector
+)
+SELECT
+    analysis_id, COALESCE(analyzed_at, CURRENT_TIMESTAMP), user_id, transcription,
+    clarity_comment, arguments_comment, grammar_comment, delivery_comment, overall_comment,
+    search_vector
+FROM speech_analyses_unpartitioned;
+
+DROP TABLE speech_analyses_unpartitioned;
+ANALYZE speech_analyses;
+ANALYZE analysis_texts;
@@ -0,0 +1,14 @@
+-- Equi-depth histograms of score and gesture metrics for /percentiles,
+-- rebuilt in full by refresh_score_histograms every COHORT_REFRESH_SECONDS.
+-- Cohort '' is every analysis; the others are the most common topics
+-- (lowercased). Each bucket holds about the same number of analyses.
+CREATE TABLE score_histograms (
+    metric VARCHAR(50) NOT NULL,
+    cohort TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    min_value FLOAT NOT NULL,
+    max_value FLOAT NOT NULL,
+    analyses INTEGER NOT NULL,
+    refreshed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (metric, cohort, bucket)
+);
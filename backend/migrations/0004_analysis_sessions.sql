@@ -0,0 +1,70 @@
+-- Restores the database-level guarantee that a user's session numbers are
+-- unique, lost when 0002 partitioned speech_analyses on analyzed_at (a
+-- unique index there would have to include the partition key). Every
+-- analysis with a user and session number has a row in the unpartitioned
+-- analysis_sessions, kept in sync by a trigger, whose primary key is the
+-- old uq_user_session; a duplicate insert or renumbering fails the
+-- statement that caused it.
+
+CREATE TABLE analysis_sessions (
+    user_id INTEGER NOT NULL,
+    session_number INTEGER NOT NULL,
+    analysis_id INTEGER NOT NULL,
+    CONSTRAINT uq_user_session PRIMARY KEY (user_id, session_number)
+);
+
+INSERT INTO analysis_sessions (user_id, session_number, analysis_id)
+SELECT user_id, session_number, analysis_id
+FROM speech_analyses
+WHERE user_id IS NOT NULL AND session_number IS NOT NULL;
+
+CREATE FUNCTION sync_analysis_session() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM analysis_sessions
+        WHERE user_id = OLD.user_id AND session_number = OLD.session_number AND analysis_id = OLD.analysis_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.user_id IS NOT NULL AND NEW.session_number IS NOT NULL THEN
+        INSERT INTO analysis_sessions (user_id, session_number, analysis_id)
+        VALUES (NEW.user_id, NEW.session_number, NEW.analysis_id);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER analysis_sessions_sync
+AFTER INSERT OR DELETE OR UPDATE OF user_id, session_number ON speech_analyses
+FOR EACH ROW EXECUTE FUNCTION sync_analysis_session();
+
+-- As in 0002, except that rows moved out of the default partition get their
+-- analysis_sessions rows back: the move deletes them from the default
+-- partition (firing the trigger) and inserts them into a table that is not
+-- attached yet (not firing it)
+CREATE OR REPLACE FUNCTION ensure_analysis_partitions(month DATE) RETURNS VOID AS $$
+DECLARE
+    lo TIMESTAMP := date_trunc('month', month);
+    hi TIMESTAMP := date_trunc('month', month) + INTERVAL '1 month';
+    parent TEXT;
+    partition TEXT;
+BEGIN
+    FOREACH parent IN ARRAY ARRAY['speech_analyses', 'analysis_texts'] LOOP
+        partition := parent || '_' || to_char(lo, 'YYYY_MM');
+        CONTINUE WHEN to_regclass(partition) IS NOT NULL;
+        EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', partition, parent);
+        EXECUTE format(
+            'WITH moved AS (DELETE FROM %I WHERE analyzed_at >= %L AND analyzed_at < %L RETURNING *) '
+            'INSERT INTO %I SELECT * FROM moved',
+            parent || '_default', lo, hi, partition
+        );
+        EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', parent, partition, lo, hi);
+        IF parent = 'speech_analyses' THEN
+            EXECUTE format(
+                'INSERT INTO analysis_sessions (user_id, session_number, analysis_id) '
+                'SELECT user_id, session_number, analysis_id FROM %I '
+                'WHERE user_id IS NOT NULL AND session_number IS NOT NULL',
+                partition
+            );
+        END IF;
+    END LOOP;
+END
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,119 @@
+"""
+Versioned schema migrations.
+
+Each NNNN_description.sql file in this directory is applied once, in version
+order, inside its own transaction, and recorded in schema_migrations. Runs
+take a Postgres advisory lock, so workers or deploy steps starting at the
+same time apply each migration exactly once. Applied files must not be
+edited; add a new file instead.
+"""
+import hashlib
+import os
+import re
+import time
+
+MIGRATIONS_DIR = os.path.dirname(os.path.abspath(__file__))
+MIGRATION_FILE = re.compile(r"^(\d{4})_(\w+)\.sql$")
+# Arbitrary key shared by every process that migrates this database
+MIGRATION_LOCK_ID = 4_520_417_301
+
+CREATE_VERSION_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        checksum VARCHAR(64) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+class Migration:
+    """One migration file"""
+
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+
+    def sql(self):
+        with open(self.path, encoding="utf-8") as f:
+            return f.read()
+
+    def checksum(self):
+        return hashlib.sha256(self.sql().encode()).hexdigest()
+
+
+def discover_migrations():
+    """Migration files sorted by version"""
+    migrations = {}
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = MIGRATION_FILE.match(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise ValueError(f"Duplicate migration version {version}: {filename}")
+        migrations[version] = Migration(version, match.group(2), os.path.join(MIGRATIONS_DIR, filename))
+    return [migrations[v] for v in sorted(migrations)]
+
+
+LATEST_SCHEMA_VERSION = max((m.version for m in discover_migrations()), default=0)
+
+
+def schema_version(cursor):
+    """Highest applied migration version (0 for an unmigrated database)"""
+    cursor.execute("SELECT to_regclass('schema_migrations')")
+    if cursor.fetchone()[0] is None:
+        return 0
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+    return cursor.fetchone()[0]
+
+
+def applied_migrations(cursor):
+    """{version: checksum} of migrations already applied"""
+    cursor.execute("SELECT to_regclass('schema_migrations')")
+    if cursor.fetchone()[0] is None:
+        return {}
+    cursor.execute("SELECT version, checksum FROM schema_migrations")
+    return dict(cursor.fetchall())
+
+
+def apply_migrations(conn, target=None):
+    """
+    Apply pending migrations up to `target` (the latest by default) on a
+    psycopg2 connection. Returns the list of versions applied.
+    """
+    applied = []
+    with conn.cursor() as cursor:
+        # Waits while another process migrates, then sees its work as applied
+        cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        try:
+            cursor.execute(CREATE_VERSION_TABLE_SQL)
+            conn.commit()
+            done = applied_migrations(cursor)
+            for migration in discover_migrations():
+                if target is not None and migration.version > target:
+                    break
+                if migration.version in done:
+                    if done[migration.version] != migration.checksum():
+                        print(f"⚠️ Migration {migration.version} was edited after it was applied")
+                    continue
+                print(f"🔁 Applying migration {migration.version:04d}_{migration.name}...")
+                started = time.perf_counter()
+                # Schema changes may wait on locks; don't apply the per-query timeout
+                cursor.execute("SET LOCAL statement_timeout = 0")
+                cursor.execute(migration.sql())
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                    (migration.version, migration.name, migration.checksum())
+                )
+                conn.commit()
+                applied.append(migration.version)
+                print(f"✅ Migration {migration.version:04d} applied in {time.perf_counter() - started:.1f}s")
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+            conn.commit()
+    return applied
@@ -0,0 +1,116 @@
+# backend/rescore.py
+"""
+Recompute confidence/nervousness scores of stored analyses with a scoring
+version from scoring.py (the current one by default).
+
+    python rescore.py [--version N] [--chunk-size 5000] [--dry-run]
+
+Only the gesture columns are read, in analysis_id order and in large chunks.
+Each chunk is scored with NumPy, copied into a temp table and applied with a
+single UPDATE ... FROM, then committed; the update joins on the full primary
+key (analysis_id, analyzed_at) so only the partitions of the chunk's months
+are touched. Rows already at the target version are skipped, so an
+interrupted run resumes where it stopped when started again.
+The per-user user_stats summaries and the score histograms behind
+/percentiles are rebuilt once at the end. Responses the API has cached keep
+the old scores until they expire (RESPONSE_CACHE_TTL).
+"""
+import argparse
+import io
+import time
+import numpy as np
+from database import db_connection, refresh_user_stats, refresh_score_histograms
+from scoring import score_arrays, CURRENT_SCORING_VERSION
+
+def _write_chunk(cursor, ids, analyzed_at, confidence, nervousness, version):
+    """Bulk-apply one chunk of scores via COPY into a temp table"""
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS rescore_chunk (
+            analysis_id INTEGER,
+            analyzed_at TIMESTAMP,
+            confidence_score FLOAT,
+            nervousness_score FLOAT,
+            PRIMARY KEY (analysis_id, analyzed_at)
+        ) ON COMMIT DELETE ROWS
+    """)
+    buffer = io.StringIO()
+    buffer.writelines(
+        f"{i}\t{t.isoformat()}\t{c:.2f}\t{n:.2f}\n"
+        for i, t, c, n in zip(ids, analyzed_at, confidence, nervousness)
+    )
+    buffer.seek(0)
+    cursor.copy_expert("COPY rescore_chunk FROM STDIN", buffer)
+    # The range bound lets the executor skip the partitions of other months
+    cursor.execute("""
+        UPDATE speech_analyses AS s
+        SET confidence_score = c.confidence_score,
+            nervousness_score = c.nervousness_score,
+            scoring_version = %s
+        FROM rescore_chunk AS c
+        WHERE s.analysis_id = c.analysis_id AND s.analyzed_at = c.analyzed_at
+          AND s.analyzed_at BETWEEN %s AND %s
+    """, (version, min(analyzed_at), max(analyzed_at)))
+
+def rescore_analyses(version=CURRENT_SCORING_VERSION, chunk_size=5000, dry_run=False):
+    """Bring every analysis not yet scored with `version` up to date"""
+    try:
+        with db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT COUNT(*) FROM speech_analyses WHERE scoring_version IS DISTINCT FROM %s",
+                (version,)
+            )
+            total = cursor.fetchone()[0]
+            print(f"🔁 {total} analyses to rescore with scoring v{version}")
+
+            last_id = 0
+            done = 0
+            started = time.perf_counter()
+            while True:
+                cursor.execute("""
+                    SELECT analysis_id, analyzed_at, smile_mean, eyebrow_raise_mean, blink_count, head_pose_mean
+                    FROM speech_analyses
+                    WHERE analysis_id > %s AND scoring_version IS DISTINCT FROM %s
+                    ORDER BY analysis_id
+                    LIMIT %s
+                """, (last_id, version, chunk_size))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+
+                ids = np.array([row[0] for row in rows], dtype=np.int64)
+                analyzed_at = [row[1] for row in rows]
+                # NULL metrics become NaN here and are scored as 0
+                data = np.array([row[2:] for row in rows], dtype=np.float64)
+                confidence, nervousness = score_arrays(data[:, 0], data[:, 1], data[:, 2], data[:, 3], version=version)
+
+                if not dry_run:
+                    _write_chunk(cursor, ids, analyzed_at, confidence, nervousness, version)
+                    conn.commit()
+
+                last_id = int(ids[-1])
+                done += len(ids)
+                rate = done / max(time.perf_counter() - started, 1e-9)
+                print(f"   {done}/{total} rows ({rate:.0f} rows/s), last analysis_id {last_id}")
+
+            # Averages in user_stats include the old scores
+            if done and not dry_run:
+                users = refresh_user_stats(cursor)
+                conn.commit()
+                print(f"   refreshed statistics of {users} users")
+                # Percentiles would otherwise rank against the old scores
+                # until the API's next periodic refresh
+                refresh_score_histograms()
+
+            print(f"✅ Rescored {done} analyses{' (dry run)' if dry_run else ''}")
+            return {"success": True, "rescored": done, "version": version}
+    except Exception as e:
+        print(f"❌ Rescoring failed: {e}")
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute confidence/nervousness scores for stored analyses")
+    parser.add_argument("--version", type=int, default=CURRENT_SCORING_VERSION)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    rescore_analyses(args.version, args.chunk_size, args.dry_run)
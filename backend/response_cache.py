@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from fastapi.responses import JSONResponse, Response
+
+# A user's dashboard data only changes when one of their analyses is saved,
+# so statistics/history/comparison responses are cached per user and dropped
+# on save. The TTL bounds staleness for writes this process does not see
+# (another uvicorn worker, rescore.py).
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+
+
+def make_etag(value):
+    """Strong ETag of a JSON-serializable response body"""
+    body = json.dumps(value, sort_keys=True, default=str).encode()
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """Whether an If-None-Match header value covers `etag`"""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == "*" or tag == etag:
+            return True
+    return False
+
+
+def conditional_response(entry, if_none_match=None):
+    """
+    Response for an (etag, value) cache entry: 304 with no body when the
+    client's If-None-Match already covers it, the JSON body otherwise
+    """
+    etag, value = entry
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=value, headers=headers)
+
+
+class ResponseCache:
+    """
+    In-process LRU of successful responses, keyed by (user_id, ...).
+
+    Each user has a generation number that invalidate_user() bumps. A result
+    is only stored if the generation is unchanged since the caller started
+    loading it, so a read racing with a save cannot cache pre-save data.
+
+    Generations come from one increasing counter and only the last
+    max_entries invalidated users keep their own; the rest share the highest
+    generation dropped so far. Forgetting a user can then only make a put
+    look stale and be skipped, never accept one that is.
+    """
+
+    def __init__(self, max_entries=10000, ttl_seconds=60.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._user_keys = {}
+        self._generations = OrderedDict()
+        self._clock = 0
+        self._floor = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def generation(self, user_id):
+        with self._lock:
+            return self._generations.get(user_id, self._floor)
+
+    def get(self, key):
+        """(etag, value) for a fresh entry, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[0], entry[1]
+
+    def put(self, key, value, generation):
+        """Store a value loaded at `generation`; returns (etag, value)"""
+        etag = make_etag(value)
+        user_id = key[0]
+        with self._lock:
+            if self._generations.get(user_id, self._floor) != generation:
+                return etag, value
+            self._entries[key] = (etag, value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            self._user_keys.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+        return etag, value
+
+    def invalidate_user(self, user_id):
+        """Drop everything cached for a user (call after their data changes)"""
+        with self._lock:
+            self._clock += 1
+            self._generations[user_id] = self._clock
+            self._generations.move_to_end(user_id)
+            while len(self._generations) > self.max_entries:
+                _, dropped = self._generations.popitem(last=False)
+                self._floor = max(self._floor, dropped)
+            for key in self._user_keys.pop(user_id, ()):
+                self._entries.pop(key, None)
+            self._stats["invalidations"] += 1
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        keys = self._user_keys.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[key[0]]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["generations"] = len(self._generations)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
@@ -0,0 +1,43 @@
+import numpy as np
+
+# Confidence/nervousness formulas, keyed by version. Every stored analysis
+# records the version it was scored with so rescore.py can bring old rows up
+# to date whenever the formulas are tuned. Add a new version rather than
+# editing an old one.
+CURRENT_SCORING_VERSION = 1
+
+
+def _scores_v1(smile, eyebrow, blink, head_movement):
+    confidence = np.clip(smile * 10 - head_movement * 5, 0, 10)
+    blink = np.minimum(blink, 20) / 20
+    nervousness = np.clip(eyebrow * 5 + blink * 5 + head_movement * 5, 0, 10)
+    return confidence, nervousness
+
+
+SCORING_FORMULAS = {
+    1: _scores_v1,
+}
+
+
+def score_arrays(smile, eyebrow, blink, head_movement, version=CURRENT_SCORING_VERSION):
+    """
+    Vectorized confidence and nervousness scores (0-10, rounded to 2 places)
+    for arrays of gesture metrics. NULL metrics count as 0.
+    """
+    if version not in SCORING_FORMULAS:
+        raise ValueError(f"Unknown scoring version {version}")
+    columns = [np.nan_to_num(np.asarray(c, dtype=np.float64)) for c in (smile, eyebrow, blink, head_movement)]
+    confidence, nervousness = SCORING_FORMULAS[version](*columns)
+    return np.round(confidence, 2), np.round(nervousness, 2)
+
+
+def score_gestures(gesture_metrics, version=CURRENT_SCORING_VERSION):
+    """Confidence and nervousness for one analysis' gesture metrics"""
+    confidence, nervousness = score_arrays(
+        [gesture_metrics.get('smile_mean', 0)],
+        [gesture_metrics.get('eyebrow_raise_mean', 0)],
+        [gesture_metrics.get('blink_count', 0)],
+        [gesture_metrics.get('head_pose_mean', 0)],
+        version=version
+    )
+    return float(confidence[0]), float(nervousness[0])
@@ -0,0 +1,143 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from fastapi import HTTPException
+
+# /login hands out a signed token; later requests prove who they are with it
+# instead of a user_id the client could pick freely. Tokens are checked with
+# an HMAC in-process, so authentication costs no database round trip.
+# Every API worker must share SESSION_SECRET to accept each other's tokens.
+SESSION_SECRET = os.getenv("SESSION_SECRET")
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(7 * 24 * 3600)))
+SESSION_CACHE_MAX_ENTRIES = int(os.getenv("SESSION_CACHE_MAX_ENTRIES", "10000"))
+# How often buffered last_login times are written, in one batch
+LAST_LOGIN_FLUSH_SECONDS = float(os.getenv("LAST_LOGIN_FLUSH_SECONDS", "30"))
+
+TOKEN_VERSION = "v1"
+
+
+def _sign(secret, payload):
+    digest = hmac.new(secret, payload.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+
+class SessionTokens:
+    """
+    Issues and verifies "v1.<user_id>.<expires>.<signature>" tokens.
+
+    Verified tokens are kept in an LRU, so a client's repeated requests skip
+    the parsing and HMAC as well. Tokens cannot be revoked before they
+    expire; changing SESSION_SECRET invalidates all of them.
+    """
+
+    def __init__(self, secret=None, ttl_seconds=SESSION_TTL, max_entries=SESSION_CACHE_MAX_ENTRIES):
+        if not secret:
+            print("⚠️ SESSION_SECRET not set; using a random one, sessions end when this process restarts")
+            secret = secrets.token_urlsafe(32)
+        self._secret = secret.encode()
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._verified = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"issued": 0, "hits": 0, "misses": 0, "rejected": 0}
+
+    def issue(self, user_id):
+        """A new token for `user_id`, valid for ttl_seconds"""
+        payload = f"{TOKEN_VERSION}.{int(user_id)}.{int(time.time() + self.ttl_seconds)}"
+        with self._lock:
+            self._stats["issued"] += 1
+        return f"{payload}.{_sign(self._secret, payload)}"
+
+    def verify(self, token):
+        """The user_id a valid, unexpired token was issued to, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._verified.get(token)
+            if entry is not None:
+                if entry[1] > now:
+                    self._verified.move_to_end(token)
+                    self._stats["hits"] += 1
+                    return entry[0]
+                del self._verified[token]
+            self._stats["misses"] += 1
+
+        user_id, expires = self._check(token, now)
+        with self._lock:
+            if user_id is None:
+                self._stats["rejected"] += 1
+                return None
+            self._verified[token] = (user_id, expires)
+            while len(self._verified) > self.max_entries:
+                self._verified.popitem(last=False)
+        return user_id
+
+    def user_from_header(self, authorization):
+        """user_id of the token in an "Authorization: Bearer <token>" header; 401 if there is none"""
+        scheme, _, token = (authorization or "").partition(" ")
+        user_id = self.verify(token.strip()) if scheme.lower() == "bearer" else None
+        if user_id is None:
+            raise HTTPException(status_code=401, detail="Missing or invalid session token",
+                                headers={"WWW-Authenticate": "Bearer"})
+        return user_id
+
+    def _check(self, token, now):
+        """(user_id, expires) from a correctly signed, unexpired token, else (None, None)"""
+        try:
+            payload, signature = token.rsplit(".", 1)
+            version, user_id, expires = payload.split(".")
+            if version != TOKEN_VERSION or int(expires) <= now:
+                return None, None
+            if not hmac.compare_digest(signature, _sign(self._secret, payload)):
+                return None, None
+            return int(user_id), int(expires)
+        except (AttributeError, ValueError):
+            return None, None
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._verified), **self._stats}
+
+
+def require_user(session_user_id, user_id):
+    """Reject requests for another user's data"""
+    if session_user_id != user_id:
+        raise HTTPException(status_code=403, detail="Session does not belong to this user")
+
+
+class LoginRecorder:
+    """
+    Buffers last_login times between flushes. Repeated logins of a user
+    collapse into one entry, so each flush is a single batched UPDATE of
+    at most one row per user.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def record(self, user_id, when=None):
+        when = when or datetime.now()
+        with self._lock:
+            if self._pending.get(user_id, when) <= when:
+                self._pending[user_id] = when
+
+    def drain(self):
+        """Take all buffered (user_id, last_login) pairs"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return list(pending.items())
+
+    def restore(self, logins):
+        """Put back pairs whose flush failed, keeping newer logins recorded since"""
+        for user_id, when in logins:
+            self.record(user_id, when)
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
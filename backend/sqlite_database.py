@@ -0,0 +1,488 @@
+# backend/sqlite_database.py
+"""
+Embedded SQLite storage (DB_BACKEND=sqlite) for single-node deployments and
+for running the service and its benchmarks without a Postgres server.
+
+Functions and return values match database.py, and most queries and all
+response formatting are shared with it. Where the dialects differ (session
+statistics, full-text search) there are SQLite versions of the queries:
+statistics are aggregated from the history index instead of a user_stats
+table, and search uses an FTS5 index kept in sync by triggers. There is no
+partitioning: speech_analyses keeps the text columns, and analysis_texts is
+a view over them so the shared queries join it the same way.
+
+The database runs in WAL mode, so readers never block the single writer.
+Each thread keeps its own connection, and sqlite3 keeps the compiled
+statements of every query it has run, so the fixed SQL below is prepared
+once per connection and then only re-bound.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from database import (
+    REGISTER_USER_SQL, LOGIN_USER_SQL, NEXT_SESSION_SQL, ANALYSIS_COLUMNS,
+    COMPARE_ANALYSES_SQL, TIMELINE_PATH_SQL, STATS_WINDOW,
+    REFRESH_SCORE_HISTOGRAMS_SQL, SCORE_HISTOGRAMS_SQL,
+    COHORT_ANALYSIS_SQL, COHORT_LATEST_ANALYSIS_SQL, COHORT_MIN_TOPIC_ANALYSES, COHORT_MAX_TOPICS,
+    HIGHLIGHT_START, HIGHLIGHT_STOP,
+    hash_password, registration_error, analysis_values, rewrite_placeholders,
+    decode_history_cursor, history_query, history_params,
+    parse_trend_metrics, trend_query, trend_params, search_params,
+    format_statistics, format_history_page, format_comparison, format_trends,
+    format_search_results, format_timeline_path, format_cohort_analysis, histograms_stale
+)
+
+SQLITE_PATH = os.getenv("SQLITE_PATH", "extempore.db")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_STATEMENT_CACHE = 256
+SQLITE_SCHEMA_VERSION = 3
+
+# Timestamps are stored as local-time text with millisecond precision; the
+# adapter writes the same format so keyset comparisons on strings line up
+TIMESTAMP_NOW = "(strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime'))"
+
+SCHEMA_SQL = f"""
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        username TEXT UNIQUE NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT {TIMESTAMP_NOW},
+        last_login TIMESTAMP,
+        next_session INTEGER NOT NULL DEFAULT 1
+    );
+
+    CREATE TABLE IF NOT EXISTS speech_analyses (
+        analysis_id INTEGER PRIMARY KEY,
+        user_id INTEGER REFERENCES users(user_id) ON DELETE CASCADE,
+        filename TEXT,
+        video_path TEXT,
+        topic TEXT,
+        transcription TEXT,
+        clarity_score REAL,
+        clarity_comment TEXT,
+        arguments_score REAL,
+        arguments_comment TEXT,
+        grammar_score REAL,
+        grammar_comment TEXT,
+        delivery_score REAL,
+        delivery_comment TEXT,
+        overall_score REAL,
+        overall_comment TEXT,
+        smile_mean REAL,
+        eyebrow_raise_mean REAL,
+        blink_count INTEGER,
+        head_pose_mean REAL,
+        speech_ratio REAL,
+        pause_count INTEGER,
+        volume_variability REAL,
+        pitch_mean REAL,
+        pitch_std REAL,
+        speaking_rate REAL,
+        speaking_rate_stability REAL,
+        confidence_score REAL,
+        nervousness_score REAL,
+        scoring_version INTEGER,
+        file_duration REAL,
+        file_size INTEGER,
+        timeline_path TEXT,
+        analyzed_at TIMESTAMP DEFAULT {TIMESTAMP_NOW},
+        session_number INTEGER DEFAULT 1,
+        UNIQUE (user_id, session_number)
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_user_analyses
+    ON speech_analyses(user_id, analyzed_at DESC, analysis_id DESC);
+
+    CREATE VIRTUAL TABLE IF NOT EXISTS analysis_search USING fts5(
+        topic, transcription,
+        content='speech_analyses', content_rowid='analysis_id',
+        tokenize='porter unicode61'
+    );
+    CREATE TRIGGER IF NOT EXISTS analysis_search_insert AFTER INSERT ON speech_analyses BEGIN
+        INSERT INTO analysis_search (rowid, topic, transcription)
+        VALUES (new.analysis_id, new.topic, new.transcription);
+    END;
+    CREATE TRIGGER IF NOT EXISTS analysis_search_delete AFTER DELETE ON speech_analyses BEGIN
+        INSERT INTO analysis_search (analysis_search, rowid, topic, transcription)
+        VALUES ('delete', old.analysis_id, old.topic, old.transcription);
+    END;
+    CREATE TRIGGER IF NOT EXISTS analysis_search_update AFTER UPDATE OF topic, transcription ON speech_analyses BEGIN
+        INSERT INTO analysis_search (analysis_search, rowid, topic, transcription)
+        VALUES ('delete', old.analysis_id, old.topic, old.transcription);
+        INSERT INTO analysis_search (rowid, topic, transcription)
+        VALUES (new.analysis_id, new.topic, new.transcription);
+    END;
+
+    CREATE VIEW IF NOT EXISTS analysis_texts AS
+    SELECT analysis_id, analyzed_at, user_id, transcription,
+           clarity_comment, arguments_comment, grammar_comment, delivery_comment, overall_comment
+    FROM speech_analyses;
+
+    CREATE TABLE IF NOT EXISTS score_histograms (
+        metric TEXT NOT NULL,
+        cohort TEXT NOT NULL,
+        bucket INTEGER NOT NULL,
+        min_value REAL NOT NULL,
+        max_value REAL NOT NULL,
+        analyses INTEGER NOT NULL,
+        refreshed_at TIMESTAMP NOT NULL DEFAULT {TIMESTAMP_NOW},
+        PRIMARY KEY (metric, cohort, bucket)
+    );
+"""
+
+
+def to_sqlite(sql):
+    """Rewrite psycopg2 %s placeholders as SQLite's ?"""
+    return rewrite_placeholders(sql, lambda n: "?")
+
+
+def _adapt_datetime(value):
+    return value.strftime("%Y-%m-%d %H:%M:%S.") + f"{value.microsecond // 1000:03d}"
+
+
+def _convert_timestamp(value):
+    return datetime.fromisoformat(value.decode())
+
+
+sqlite3.register_adapter(datetime, _adapt_datetime)
+sqlite3.register_converter("TIMESTAMP", _convert_timestamp)
+
+REGISTER_USER = to_sqlite(REGISTER_USER_SQL)
+LOGIN_USER = to_sqlite(LOGIN_USER_SQL)
+RECORD_LOGIN = """
+    UPDATE users SET last_login = MAX(COALESCE(last_login, ?2), ?2) WHERE user_id = ?1
+"""
+NEXT_SESSION = to_sqlite(NEXT_SESSION_SQL)
+INSERT_ANALYSIS = f"""
+    INSERT INTO speech_analyses ({', '.join(name for name, _ in ANALYSIS_COLUMNS)})
+    VALUES ({', '.join('?' * len(ANALYSIS_COLUMNS))})
+    RETURNING analysis_id, analyzed_at
+"""
+COMPARE_ANALYSES = to_sqlite(COMPARE_ANALYSES_SQL)
+TIMELINE_PATH = to_sqlite(TIMELINE_PATH_SQL)
+REFRESH_SCORE_HISTOGRAMS = to_sqlite(REFRESH_SCORE_HISTOGRAMS_SQL)
+LAST_HISTOGRAM_REFRESH = f"SELECT MAX(refreshed_at), {TIMESTAMP_NOW} FROM score_histograms"
+COHORT_ANALYSIS = to_sqlite(COHORT_ANALYSIS_SQL)
+COHORT_LATEST_ANALYSIS = to_sqlite(COHORT_LATEST_ANALYSIS_SQL)
+
+USER_STATISTICS = """
+    SELECT COUNT(*), AVG(overall_score), AVG(confidence_score), AVG(nervousness_score),
+           MAX(overall_score), MIN(overall_score)
+    FROM speech_analyses
+    WHERE user_id = ?
+"""
+# Same {"score", "session", "date"} entries as user_stats on Postgres
+SCORE_WINDOW = f"""
+    SELECT json_group_array(json_object('score', overall_score, 'session', session_number, 'date', date(analyzed_at)))
+    FROM (
+        SELECT overall_score, session_number, analyzed_at
+        FROM speech_analyses
+        WHERE user_id = ?
+        ORDER BY session_number {{order}}
+        LIMIT {STATS_WINDOW}
+    )
+"""
+FIRST_SCORES = SCORE_WINDOW.format(order="ASC")
+RECENT_SCORES = SCORE_WINDOW.format(order="DESC")
+
+# bm25 is lower for better matches; topic matches weigh double like the
+# 'A' weight on Postgres
+SEARCH_ANALYSES = f"""
+    SELECT
+        a.analysis_id, a.session_number, a.filename, a.overall_score, a.analyzed_at,
+        -bm25(analysis_search, 2.0, 1.0) AS rank,
+        highlight(analysis_search, 0, '{HIGHLIGHT_START}', '{HIGHLIGHT_STOP}'),
+        snippet(analysis_search, 1, '{HIGHLIGHT_START}', '{HIGHLIGHT_STOP}', ' … ', 25)
+    FROM analysis_search
+    JOIN speech_analyses AS a ON a.analysis_id = analysis_search.rowid
+    WHERE analysis_search MATCH ? AND a.user_id = ?
+    ORDER BY rank DESC, a.analysis_id DESC
+    LIMIT ? OFFSET ?
+"""
+
+_local = threading.local()
+_connections = []
+_connections_lock = threading.Lock()
+_stats = {"transactions": 0, "busy_waits": 0}
+
+
+def _connect():
+    conn = sqlite3.connect(
+        SQLITE_PATH,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        isolation_level=None,  # transactions are opened explicitly
+        check_same_thread=False,
+        cached_statements=SQLITE_STATEMENT_CACHE
+    )
+    conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA journal_mode = WAL")
+    # With WAL, NORMAL only risks the last commits on power loss, not corruption
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+
+def connection():
+    """This thread's connection, opened on first use"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = _connect()
+        with _connections_lock:
+            _connections.append(conn)
+    return conn
+
+
+@contextmanager
+def transaction():
+    """Write transaction that takes the write lock up front"""
+    conn = connection()
+    started = time.perf_counter()
+    conn.execute("BEGIN IMMEDIATE")
+    if time.perf_counter() - started > 0.001:
+        _stats["busy_waits"] += 1
+    try:
+        yield conn
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    _stats["transactions"] += 1
+
+
+def init_db():
+    """Open the database file and create or upgrade its schema"""
+    conn = connection()
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version < SQLITE_SCHEMA_VERSION:
+        conn.executescript(SCHEMA_SQL + f"PRAGMA user_version = {SQLITE_SCHEMA_VERSION};")
+        print(f"✅ SQLite schema created at {SQLITE_PATH}")
+    print(f"✅ SQLite database opened: {SQLITE_PATH} (WAL)")
+
+
+def close_db():
+    with _connections_lock:
+        for conn in _connections:
+            conn.close()
+        _connections.clear()
+    _local.__dict__.clear()
+
+
+def db_stats():
+    """Open connections and write-lock contention"""
+    with _connections_lock:
+        connections = len(_connections)
+    return {"backend": "sqlite", "path": SQLITE_PATH, "connections": connections, **_stats}
+
+
+def register_user(username, email, password):
+    """Register a new user"""
+    try:
+        with transaction() as conn:
+            user_id = conn.execute(REGISTER_USER, (username, email, hash_password(password))).fetchone()[0]
+        return {"success": True, "user_id": user_id, "message": "User registered successfully"}
+    except sqlite3.IntegrityError as e:
+        return registration_error(e)
+    except Exception as e:
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+
+def login_user(username, password):
+    """Authenticate a user; the caller records last_login (see record_logins)"""
+    try:
+        user = connection().execute(LOGIN_USER, (username, hash_password(password))).fetchone()
+        if user:
+            return {
+                "success": True,
+                "user_id": user[0],
+                "username": user[1],
+                "email": user[2]
+            }
+        return {"success": False, "message": "Invalid username or password"}
+    except Exception as e:
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+
+def record_logins(logins):
+    """Set last_login of many users at once from (user_id, last_login) pairs"""
+    try:
+        with transaction() as conn:
+            updated = conn.executemany(RECORD_LOGIN, logins).rowcount
+        return {"success": True, "updated": updated}
+    except Exception as e:
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+
+def save_analysis(user_id, analysis_data):
+    """Save speech analysis results with enhanced tracking"""
+    try:
+        with transaction() as conn:
+            session = conn.execute(NEXT_SESSION, (user_id,)).fetchone()
+            if session is None:
+                return {"success": False, "message": "User not found"}
+            session_number = session[0]
+            analysis_id, analyzed_at = conn.execute(INSERT_ANALYSIS, analysis_values(user_id, analysis_data, session_number)).fetchone()
+        print(f"✅ Analysis saved successfully: ID {analysis_id}, Session {session_number}")
+        return {"success": True, "analysis_id": analysis_id, "session_number": session_number, "analyzed_at": analyzed_at}
+    except Exception as e:
+        print(f"❌ Error saving analysis: {e}")
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+
+def get_timeline_path(user_id, analysis_id):
+    """Get the stored per-frame gesture timeline file of an analysis"""
+    try:
+        return format_timeline_path(connection().execute(TIMELINE_PATH, (user_id, analysis_id)).fetchone())
+    except Exception as e:
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+
+def _json_list(value):
+    return json.loads(value) if value else []
+
+
+def get_user_statistics(user_id):
+    """Get user's overall statistics and progress"""
+    try:
+        conn = connection()
+        stats = conn.execute(USER_STATISTICS, (user_id,)).fetchone()
+        if not stats[0]:
+            return format_statistics(None)
+        recent = _json_list(conn.execute(RECENT_SCORES, (user_id,)).fetchone()[0])
+        first = _json_list(conn.execute(FIRST_SCORES, (user_id,)).fetchone()[0])
+        return format_statistics(tuple(stats) + (recent, first))
+    except Exception as e:
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+
+def get_detailed_history(user_id, limit=20, cursor=None, fields=None):
+    """Get one page of user's detailed speech analysis history, newest first"""
+    try:
+        after = decode_history_cursor(cursor)
+        sql, selected, columns = history_query(fields, after)
+        results = connection().execute(to_sqlite(sql), history_params(user_id, limit, after)).fetchall()
+        return format_history_page(results, columns, selected, limit)
+    except Exception as e:
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+
+def compare_analyses(user_id, analysis_id_1, analysis_id_2):
+    """Compare two analyses side by side"""
+    try:
+        results = connection().execute(COMPARE_ANALYSES, (user_id, analysis_id_1, analysis_id_2)).fetchall()
+        return format_comparison(results)
+    except Exception as e:
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+
+def get_user_trends(user_id, metrics=None, start_session=None, end_session=None, window=5, points=None):
+    """Per-metric series, rolling averages, deltas and streaks over a session range"""
+    try:
+        selected = parse_trend_metrics(metrics)
+        results = connection().execute(
+            to_sqlite(trend_query(selected, window)),
+            trend_params(user_id, start_session, end_session, points)
+        ).fetchall()
+        # MIN(analyzed_at) loses the column type, so it comes back as text
+        results = [(row[0], row[1], datetime.fromisoformat(row[2])) + tuple(row[3:]) for row in results]
+        return format_trends(results, selected, window)
+    except Exception as e:
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+
+def fts_query(query):
+    """
+    Translate the web search syntax accepted on Postgres ("a phrase", or,
+    -excluded) into an FTS5 query with every term quoted, so user input can
+    never be a syntax error. Returns None when nothing is left to match.
+    """
+    included, excluded = [], []
+    for token in re.findall(r'-?"[^"]*"|\S+', query):
+        negate = token.startswith("-")
+        text = token.lstrip("-").strip('"').replace('"', '""').strip()
+        if not text:
+            continue
+        if text.lower() == "or" and not negate and not token.endswith('"'):
+            if included and included[-1] != "OR":
+                included.append("OR")
+            continue
+        (excluded if negate else included).append(f'"{text}"')
+    if included and included[-1] == "OR":
+        included.pop()
+    if not included:
+        return None
+    return " ".join(included) + "".join(f" NOT {term}" for term in excluded)
+
+
+def search_analyses(user_id, query, limit=20, offset=0):
+    """Full-text search of user's analyses by topic and transcription, best match first"""
+    try:
+        match = fts_query(query)
+        if match is None:
+            return format_search_results([], limit, offset)
+        _, _, page_size, skip = search_params(user_id, query, limit, offset)
+        results = connection().execute(SEARCH_ANALYSES, (match, user_id, page_size, skip)).fetchall()
+        return format_search_results(results, limit, offset)
+    except Exception as e:
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+
+def get_cohort_analysis(user_id, analysis_id=None):
+    """Metric values of one of user's analyses (the latest by default)"""
+    try:
+        if analysis_id is None:
+            result = connection().execute(COHORT_LATEST_ANALYSIS, (user_id,)).fetchone()
+        else:
+            result = connection().execute(COHORT_ANALYSIS, (user_id, analysis_id)).fetchone()
+        return format_cohort_analysis(result)
+    except Exception as e:
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+
+def refresh_score_histograms(max_age=None):
+    """Rebuild score_histograms from speech_analyses, unless it was rebuilt in the last `max_age` seconds"""
+    try:
+        started = time.perf_counter()
+        with transaction() as conn:
+            # MAX() loses the column type, so the timestamps come back as text
+            refreshed_at, now = conn.execute(LAST_HISTOGRAM_REFRESH).fetchone()
+            if not histograms_stale(refreshed_at and datetime.fromisoformat(refreshed_at), datetime.fromisoformat(now), max_age):
+                return {"success": True, "refreshed": False}
+            conn.execute("DELETE FROM score_histograms")
+            conn.execute(REFRESH_SCORE_HISTOGRAMS, (COHORT_MIN_TOPIC_ANALYSES, COHORT_MAX_TOPICS))
+            # rowcount is -1 for statements starting with WITH
+            buckets = conn.execute("SELECT changes()").fetchone()[0]
+        print(f"📊 Score histograms refreshed: {buckets} buckets in {time.perf_counter() - started:.2f}s")
+        return {"success": True, "refreshed": True, "buckets": buckets}
+    except Exception as e:
+        print(f"❌ Error refreshing score histograms: {e}")
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+
+def load_score_histograms():
+    """Every stored histogram bucket, for CohortStats.load"""
+    try:
+        return {"success": True, "buckets": connection().execute(SCORE_HISTOGRAMS_SQL).fetchall()}
+    except Exception as e:
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+
+def export_chunks(sql, params, chunk_rows):
+    """Lists of result rows for bulk exports, stepped through chunk by chunk"""
+    # Streaming responses may resume the generator on different threads, so
+    # it gets a connection of its own instead of the thread's
+    conn = _connect()
+    try:
+        cursor = conn.execute(to_sqlite(sql), params)
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
@@ -0,0 +1,94 @@
+# backend/storage.py
+"""
+The storage backend the API uses, picked by DB_BACKEND:
+
+    postgres (default)  async_database.py over asyncpg, database.py for the rest
+    sqlite              sqlite_database.py, an embedded file (SQLITE_PATH)
+
+Both provide the same functions with the same return values. Endpoints await
+the async ones; SQLite calls run in worker threads so they don't block the
+event loop. get_timeline_path and export_chunks are synchronous in both.
+The score histogram jobs run in threads on either backend, as does
+ensure_partitions, which only has work to do on Postgres.
+"""
+import asyncio
+from database import DB_BACKEND
+
+
+def _in_thread(func):
+    async def call(*args, **kwargs):
+        return await asyncio.to_thread(func, *args, **kwargs)
+    call.__name__ = func.__name__
+    call.__doc__ = func.__doc__
+    return call
+
+
+if DB_BACKEND == "sqlite":
+    import sqlite_database as backend
+
+    register_user = _in_thread(backend.register_user)
+    login_user = _in_thread(backend.login_user)
+    record_logins = _in_thread(backend.record_logins)
+    save_analysis = _in_thread(backend.save_analysis)
+    get_user_statistics = _in_thread(backend.get_user_statistics)
+    get_detailed_history = _in_thread(backend.get_detailed_history)
+    compare_analyses = _in_thread(backend.compare_analyses)
+    get_user_trends = _in_thread(backend.get_user_trends)
+    search_analyses = _in_thread(backend.search_analyses)
+    get_cohort_analysis = _in_thread(backend.get_cohort_analysis)
+    refresh_score_histograms = _in_thread(backend.refresh_score_histograms)
+    load_score_histograms = _in_thread(backend.load_score_histograms)
+    get_timeline_path = backend.get_timeline_path
+    export_chunks = backend.export_chunks
+
+    async def init_storage():
+        await asyncio.to_thread(backend.init_db)
+
+    async def ensure_partitions():
+        # speech_analyses is not partitioned on SQLite
+        return {"success": True, "ensured": False}
+
+    async def close_storage():
+        backend.close_db()
+
+    def storage_stats():
+        return backend.db_stats()
+
+elif DB_BACKEND == "postgres":
+    import database
+    from async_database import (
+        register_user,
+        login_user,
+        record_logins,
+        save_analysis,
+        get_user_statistics,
+        get_detailed_history,
+        compare_analyses,
+        get_user_trends,
+        search_analyses,
+        get_cohort_analysis,
+        init_async_pool,
+        close_async_pool,
+        async_pool_stats
+    )
+    from database import get_timeline_path, export_chunks
+
+    # Periodic background jobs; run in threads on the psycopg2 pool
+    refresh_score_histograms = _in_thread(database.refresh_score_histograms)
+    load_score_histograms = _in_thread(database.load_score_histograms)
+    ensure_partitions = _in_thread(database.ensure_partitions)
+
+    async def init_storage():
+        if database.db_pool is None:
+            raise RuntimeError("Database pool is not initialized")
+        await init_async_pool()
+
+    async def close_storage():
+        database.close_db_pool()
+        await close_async_pool()
+
+    def storage_stats():
+        return {"backend": "postgres", "pool": database.pool_stats(), "async_pool": async_pool_stats()}
+
+else:
+    raise ValueError(f"Unknown DB_BACKEND {DB_BACKEND!r}; use 'postgres' or 'sqlite'")
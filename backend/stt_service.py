@@ -1,4 +1,19 @@
+import numpy as np
 from faster_whisper import WhisperModel
+from faster_whisper.audio import decode_audio
+
+# Whisper works on 16 kHz mono PCM; decoding once here lets the audio
+# feature stage reuse the same buffer.
+SAMPLE_RATE = 16000
+
+# Decoding settings traded against speed when a request has a tight time
+# budget; "accurate" is what every request used before budgets existed.
+TRANSCRIPTION_PROFILES = {
+    "accurate": {"beam_size": 5},
+    "balanced": {"beam_size": 2, "vad_filter": True},
+    "fast": {"beam_size": 1, "best_of": 1, "vad_filter": True,
+             "condition_on_previous_text": False, "without_timestamps": True},
+}
 
 # Load the model once when the service starts.
 # Using a small model like "base" is good for CPU inference.
@@ -10,13 +25,25 @@ except Exception as e:
     # You might want to handle this more gracefully, but for now, we'll let it raise
     raise
 
-def transcribe_audio(file_path: str) -> str:
+def load_audio(file_path: str) -> np.ndarray:
+    """
+    Decodes the audio track of a file to 16 kHz mono float32 PCM.
+    Returns an empty array if the file has no decodable audio.
+    """
+    try:
+        return decode_audio(file_path, sampling_rate=SAMPLE_RATE)
+    except Exception as e:
+        print(f"Error decoding audio: {e}")
+        return np.zeros(0, dtype=np.float32)
+
+def transcribe_audio(audio, profile: str = "accurate") -> str:
     """
-    Transcribes an audio file using the pre-loaded Whisper model.
+    Transcribes a file path or pre-decoded 16 kHz PCM array using the pre-loaded Whisper model.
+    `profile` picks one of TRANSCRIPTION_PROFILES.
     Returns the transcribed text as a single string.
     """
     try:
-        segments, info = model.transcribe(file_path, beam_size=5)
+        segments, info = model.transcribe(audio, **TRANSCRIPTION_PROFILES[profile])
         
         # Concatenate all segment texts into a single string
         transcribed_text = " ".join(segment.text for segment in segments)
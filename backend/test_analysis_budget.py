@@ -0,0 +1,78 @@
+import pytest
+import analysis_budget
+from analysis_budget import plan_analysis, estimate_seconds, QUALITY_LADDER, FIXED_OVERHEAD_SECONDS
+from facial_gesture import AnalysisPolicy
+
+
+def probe(minutes=3, width=1280, height=720, fps=30, has_video=True, has_audio=True):
+    duration = minutes * 60.0
+    return {
+        "duration": duration, "has_audio": has_audio, "has_video": has_video,
+        "width": width if has_video else 0, "height": height if has_video else 0,
+        "fps": fps if has_video else 0, "frame_count": int(duration * fps) if has_video else 0,
+    }
+
+
+def base_policy(**overrides):
+    settings = dict(target_fps=10, max_dimension=640, track_roi=True, workers=1)
+    settings.update(overrides)
+    return AnalysisPolicy(**settings)
+
+
+def test_cheaper_settings_estimate_less():
+    video = probe()
+    assert (estimate_seconds(video, "accurate", base_policy()) >
+            estimate_seconds(video, "fast", base_policy()) >
+            estimate_seconds(video, "fast", base_policy(target_fps=2)))
+    assert estimate_seconds(probe(minutes=20), "fast", base_policy()) > estimate_seconds(video, "fast", base_policy())
+
+
+def test_audio_only_estimate_has_no_gesture_cost():
+    audio = probe(has_video=False)
+    assert estimate_seconds(audio, "fast", base_policy()) == pytest.approx(
+        FIXED_OVERHEAD_SECONDS + audio["duration"] * analysis_budget.TRANSCRIPTION_SECONDS_PER_AUDIO_SECOND["fast"])
+
+
+def test_adaptive_sampling_costs_extra_decoding():
+    video = probe()
+    assert estimate_seconds(video, "fast", base_policy(adaptive=True)) > estimate_seconds(video, "fast", base_policy())
+
+
+def test_generous_budget_keeps_full_quality():
+    _, policy, plan = plan_analysis(probe(minutes=1), budget_seconds=10_000, base_policy=base_policy())
+    assert plan["within_budget"] and plan["quality_level"] == 0
+    assert plan["transcription_profile"] == "accurate"
+    assert (policy.target_fps, policy.max_dimension) == (10, 640)
+
+
+def test_tight_budget_steps_down_the_ladder():
+    video = probe(minutes=10)
+    generous = plan_analysis(video, budget_seconds=10_000, base_policy=base_policy())[2]
+    tight = plan_analysis(video, budget_seconds=generous["estimated_seconds"] * 0.6, base_policy=base_policy())[2]
+    assert tight["within_budget"]
+    assert tight["quality_level"] > generous["quality_level"]
+    assert tight["estimated_seconds"] <= tight["budget_seconds"]
+
+
+def test_rungs_never_exceed_the_base_policy():
+    _, policy, _ = plan_analysis(probe(), budget_seconds=1, base_policy=base_policy(target_fps=1, max_dimension=240))
+    assert policy.target_fps == 1 and policy.max_dimension == 240
+
+
+def test_impossible_budget_uses_the_cheapest_rung():
+    _, policy, plan = plan_analysis(probe(minutes=20), budget_seconds=1, base_policy=base_policy())
+    assert not plan["within_budget"]
+    assert plan["quality_level"] == len(QUALITY_LADDER) - 1
+    assert plan["transcription_profile"] == "fast" and policy.target_fps == 1
+
+
+def test_more_workers_are_tried_before_lower_quality(monkeypatch):
+    monkeypatch.setattr(analysis_budget, "MAX_GESTURE_WORKERS", 4)
+    monkeypatch.setattr("facial_gesture.MAX_GESTURE_WORKERS", 4)
+    video = probe(minutes=10, width=1920, height=1080)
+    single = estimate_seconds(video, "accurate", base_policy())
+    four = base_policy(workers=4)
+    budget = (single + estimate_seconds(video, "accurate", four)) / 2
+    profile, policy, plan = plan_analysis(video, budget_seconds=budget, base_policy=base_policy())
+    assert plan["within_budget"] and plan["quality_level"] == 0
+    assert policy.workers == 4 and profile == "accurate"
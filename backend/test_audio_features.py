@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+from audio_features import analyze_audio, SAMPLE_RATE
+
+
+def tone(f0, harmonics=5, seconds=3.0, noise=0.0):
+    """Harmonic tone at `f0`, switched on and off so it reads as speech with pauses"""
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    gate = np.sin(2 * np.pi * 1.5 * t) > -0.5
+    wave = sum(np.sin(2 * np.pi * k * f0 * t) / k for k in range(1, harmonics + 1))
+    rng = np.random.default_rng(0)
+    return (0.3 * gate * (wave + noise * rng.standard_normal(len(t)))).astype(np.float32)
+
+
+@pytest.mark.parametrize("f0", [90, 120, 150, 200, 250, 320])
+@pytest.mark.parametrize("harmonics,noise", [(1, 0.0), (5, 0.0), (5, 0.3)])
+def test_pitch_of_known_tones(f0, harmonics, noise):
+    metrics = analyze_audio(tone(f0, harmonics, noise=noise))
+    assert metrics["pitch_mean"] == pytest.approx(f0, rel=0.02)
+    assert metrics["pitch_std"] < 3
+
+
+def test_noise_is_unvoiced():
+    rng = np.random.default_rng(1)
+    t = np.arange(SAMPLE_RATE * 3) / SAMPLE_RATE
+    noise = (np.sin(2 * np.pi * 1.5 * t) > -0.5) * 0.3 * rng.standard_normal(len(t))
+    assert analyze_audio(noise.astype(np.float32))["pitch_mean"] == 0
+
+
+def test_long_recording_matches_short():
+    short = tone(150)
+    assert analyze_audio(np.tile(short, 40))["pitch_mean"] == analyze_audio(short)["pitch_mean"]
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from cohort_stats import ScoreSketch, CohortStats
+
+
+def sketch_of(values, buckets=100):
+    """Equi-depth sketch of `values`, bucketed like REFRESH_SCORE_HISTOGRAMS_SQL"""
+    values = np.sort(values)
+    bucket = np.arange(len(values)) * buckets // len(values)
+    return ScoreSketch([
+        (values[bucket == b].min(), values[bucket == b].max(), int((bucket == b).sum()))
+        for b in np.unique(bucket)
+    ])
+
+
+def midrank(values, value):
+    """Exact percentile rank of `value`, ties counting half"""
+    return 50 * (np.sum(values < value) + np.sum(values <= value)) / len(values)
+
+
+@pytest.mark.parametrize("values", [
+    np.random.default_rng(0).normal(50, 10, 20000),
+    np.random.default_rng(1).integers(0, 11, 20000).astype(float),            # heavy ties
+    np.r_[np.zeros(15000), np.random.default_rng(2).random(5000)],            # one value fills many buckets
+])
+def test_percentile_close_to_exact_rank(values):
+    sketch = sketch_of(values)
+    for value in np.r_[np.quantile(values, np.linspace(0, 1, 41)), -1.0, 0.0, 5.0, 1000.0]:
+        assert sketch.percentile(value) == pytest.approx(midrank(values, value), abs=0.6)
+
+
+def test_percentile_edges():
+    sketch = sketch_of(np.arange(1.0, 101.0), buckets=10)
+    assert sketch.percentile(0.0) == 0.0
+    assert sketch.percentile(1000.0) == 100.0
+    assert ScoreSketch([(7.5, 7.5, 1)]).percentile(7.5) == 50.0
+
+
+def test_add_widens_buckets_and_shifts_ranks():
+    sketch = ScoreSketch([(1.0, 2.0, 2), (3.0, 4.0, 2)])
+    assert sketch.percentile(2.5) == 50.0
+    sketch.add(0.0)
+    sketch.add(10.0)
+    assert (sketch.mins[0], sketch.maxs[-1], sketch.total) == (0.0, 10.0, 6)
+    assert sketch.percentile(2.5) == 50.0
+    assert sketch.percentile(0.0) == pytest.approx(100 * 0.5 / 6, abs=0.1)
+    assert sketch.percentile(10.0) == pytest.approx(100 * 5.5 / 6, abs=0.1)
+    assert sketch.below == [0, 3]
+
+
+def analysis(score, topic="Carbon tax"):
+    return {"topic": topic, "feedback": {"Overall": {"score": score}}}
+
+
+def test_saves_survive_loads_until_the_table_includes_them():
+    stats = CohortStats()
+    refreshed = datetime(2026, 1, 1, 12)
+    table = [("overall", "", 0, 0.0, 10.0, 100, refreshed)]
+    stats.load(table)
+    assert stats.has_histograms
+
+    stats.add_analysis(analysis(9.0), refreshed - timedelta(seconds=1))  # already in the table
+    stats.add_analysis(analysis(9.5), refreshed + timedelta(seconds=1))
+    assert stats.stats()["pending"] == 2
+    stats.load(table)
+    assert stats.stats()["pending"] == 1
+    rank = stats.percentiles({"analysis_id": 1, "session_number": 1, "topic": None, "values": {"overall": 10.0}},
+                             ["overall"])
+    assert rank["percentiles"]["overall"]["cohort_size"] == 101
+
+
+def test_first_save_without_histograms_starts_one():
+    stats = CohortStats()
+    stats.load([])
+    assert stats.loaded and not stats.has_histograms
+    stats.add_analysis(analysis(7.5), datetime(2026, 1, 1))
+    rank = stats.percentiles({"analysis_id": 1, "session_number": 1, "topic": "carbon tax",
+                              "values": {"overall": 7.5, "smile": None}}, ["overall", "smile"], by_topic=True)
+    assert rank["percentiles"]["overall"] == {"value": 7.5, "percentile": 50.0, "cohort": "all", "cohort_size": 1}
+    assert rank["percentiles"]["smile"] is None
+
+
+def test_histograms_refresh_and_load(sqlite_db):
+    conn = sqlite_db.connection()
+    conn.execute("INSERT INTO users (user_id, username, email, password_hash) VALUES (1, 'u', 'u@example.com', '')")
+    for session in range(1, 201):
+        conn.execute(
+            "INSERT INTO speech_analyses (user_id, session_number, topic, overall_score) VALUES (1, ?, 'Debate', ?)",
+            (session, session / 20)
+        )
+    assert sqlite_db.refresh_score_histograms()["refreshed"]
+    assert not sqlite_db.refresh_score_histograms(max_age=600)["refreshed"]
+    stats = CohortStats()
+    stats.load(sqlite_db.load_score_histograms()["buckets"])
+    rank = stats.percentiles({"analysis_id": 1, "session_number": 1, "topic": "Debate", "values": {"overall": 5.0}},
+                             ["overall"])
+    assert rank["percentiles"]["overall"]["cohort_size"] == 200
+    assert rank["percentiles"]["overall"]["percentile"] == pytest.approx(49.75, abs=0.6)
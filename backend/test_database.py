@@ -0,0 +1,159 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from database import (
+    format_trends, encode_history_cursor, decode_history_cursor, parse_history_fields,
+    history_query, history_params, format_history_page, HISTORY_FIELDS, MAX_HISTORY_PAGE,
+    rewrite_placeholders, analysis_values, ANALYSIS_COLUMNS, INSERT_ANALYSIS_SQL
+)
+
+
+def add_sessions(db, user_id, **series):
+    """Insert one analysis per session with the given per-column values"""
+    conn = db.connection()
+    conn.execute(
+        "INSERT INTO users (user_id, username, email, password_hash) VALUES (?, ?, ?, '')",
+        (user_id, f"user{user_id}", f"user{user_id}@example.com")
+    )
+    columns = list(series)
+    start = datetime(2026, 1, 1)
+    for i, values in enumerate(zip(*series.values())):
+        conn.execute(
+            f"INSERT INTO speech_analyses (user_id, session_number, analyzed_at, {', '.join(columns)}) "
+            f"VALUES (?, ?, ?, {', '.join('?' * len(columns))})",
+            (user_id, i + 1, start + timedelta(days=i), *values)
+        )
+
+
+def test_trends_follow_metric_direction(sqlite_db):
+    add_sessions(
+        sqlite_db, 1,
+        overall_score=[5.0, 6.0, 6.5, 7.0],
+        nervousness_score=[4.0, 3.1, 2.6, 2.2]
+    )
+    result = sqlite_db.get_user_trends(1, "overall,nervousness")
+    assert result["success"], result
+    overall, nervousness = result["summary"]["overall"], result["summary"]["nervousness"]
+    assert overall["best"] == 7.0 and overall["best_streak"] == 3
+    assert nervousness["best"] == 2.2 and nervousness["best_streak"] == 3
+    assert nervousness["change"] == pytest.approx(-1.8)
+
+
+def test_worsening_breaks_lower_is_better_streak(sqlite_db):
+    add_sessions(sqlite_db, 1, nervousness_score=[4.0, 3.0, 3.5, 3.2, 2.0])
+    result = sqlite_db.get_user_trends(1, "nervousness")
+    assert result["summary"]["nervousness"]["best_streak"] == 2
+    assert [p["nervousness"]["delta"] for p in result["points"]] == [None, -1.0, 0.5, -0.3, -1.2]
+
+
+def test_format_trends_reads_bucket_rows():
+    row = (1, 2, datetime(2026, 1, 1), 2, 6.0, 5.5, 1.0, 1, 7.0, 6.0, 5.0, 7.0)
+    result = format_trends([row], ["overall"], 5)
+    assert result["session_count"] == 2
+    assert result["points"][0]["overall"] == {"value": 6.0, "rolling_avg": 5.5, "delta": 1.0}
+    assert result["summary"]["overall"] == {"best_streak": 1, "best": 7.0, "mean": 6.0, "change": 2.0}
+
+
+def test_history_cursor_round_trip():
+    analyzed_at = datetime(2026, 3, 14, 15, 9, 26, 535000)
+    cursor = encode_history_cursor(analyzed_at, 1234)
+    assert "=" not in cursor
+    assert decode_history_cursor(cursor) == (analyzed_at, 1234)
+    assert decode_history_cursor(None) is None and decode_history_cursor("") is None
+
+
+@pytest.mark.parametrize("cursor", ["!!!", "bm90IGEgY3Vyc29y", encode_history_cursor(datetime(2026, 1, 1), 1)[:-3]])
+def test_malformed_history_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError, match="Invalid history cursor"):
+        decode_history_cursor(cursor)
+
+
+def test_history_fields_select_column_groups():
+    assert parse_history_fields() == list(HISTORY_FIELDS)
+    # Requested order and repeats don't matter
+    assert parse_history_fields("gestures, topic,topic") == ["topic", "gestures"]
+    with pytest.raises(ValueError, match="transcription"):
+        parse_history_fields("topic,transcription")
+
+    sql, selected, columns = history_query("scores")
+    assert selected == ["scores"]
+    assert columns == ["analysis_id", "analyzed_at", "clarity_score", "arguments_score",
+                       "grammar_score", "delivery_score", "overall_score"]
+    assert "SELECT analysis_id, analyzed_at, clarity_score," in sql and "topic" not in sql
+
+
+def test_history_keyset_parameters():
+    sql, _, _ = history_query(None)
+    assert sql.count("%s") == len(history_params(7, 20)) == 2
+    after = (datetime(2026, 1, 1), 99)
+    sql, _, _ = history_query(None, after)
+    params = history_params(7, 20, after)
+    assert sql.count("%s") == len(params)
+    assert params == (7, after[0], after[0], 99, 21)
+    assert history_params(7, 10_000)[-1] == MAX_HISTORY_PAGE + 1
+
+
+def test_history_page_cursor_points_after_last_row(sqlite_db):
+    add_sessions(sqlite_db, 1, overall_score=[float(i) for i in range(5)])
+    seen, cursor = [], None
+    while True:
+        page = sqlite_db.get_detailed_history(1, limit=2, cursor=cursor, fields="scores")
+        assert all(set(row) == {"analysis_id", "analyzed_at", "scores"} for row in page["history"])
+        seen += [row["scores"]["overall"] for row in page["history"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == [4.0, 3.0, 2.0, 1.0, 0.0]
+
+
+def test_format_history_page_only_links_a_next_page_when_there_is_one():
+    columns = ["analysis_id", "analyzed_at"]
+    rows = [(3 - i, datetime(2026, 1, 3 - i)) for i in range(3)]
+    page = format_history_page(rows, columns, [], 2)
+    assert len(page["history"]) == 2
+    assert decode_history_cursor(page["next_cursor"]) == (datetime(2026, 1, 2), 2)
+    assert format_history_page(rows[:2], columns, [], 2)["next_cursor"] is None
+
+
+def numbered(sql):
+    return rewrite_placeholders(sql, lambda n: f"${n}")
+
+
+def test_placeholders_are_numbered_in_order():
+    assert numbered("SELECT %s, %s FROM t WHERE a = %s") == "SELECT $1, $2 FROM t WHERE a = $3"
+    assert numbered("SELECT 1") == "SELECT 1"
+
+
+def test_placeholders_inside_literals_and_comments_stay_text():
+    sql = "SELECT %s FROM t WHERE b LIKE '%s%%' AND \"odd%s\" = %s -- %s\n AND c = %s /* %s */"
+    assert numbered(sql) == "SELECT $1 FROM t WHERE b LIKE '%s%' AND \"odd%s\" = $2 -- %s\n AND c = $3 /* %s */"
+    assert numbered("SELECT 'it''s %s', %s") == "SELECT 'it''s %s', $1"
+
+
+def test_escaped_percent_becomes_literal():
+    assert numbered("SELECT 5 %% 3, %s") == "SELECT 5 % 3, $1"
+    assert rewrite_placeholders("SELECT %s WHERE a LIKE %%s", lambda n: "?") == "SELECT ? WHERE a LIKE %s"
+
+
+def test_insert_placeholders_match_analysis_values():
+    values = analysis_values(1, {}, 1)
+    assert len(values) == len(ANALYSIS_COLUMNS) == numbered(INSERT_ANALYSIS_SQL).count("$")
+
+
+def test_analysis_values_match_column_types():
+    data = {
+        "feedback": {"Overall": {"score": np.float32(7.5)}},
+        "gesture_metrics": {"blink_count": 3.0, "smile_mean": np.float64(1.25), "head_pose_mean": 2},
+        "audio_metrics": {"pause_count": np.int64(4)},
+        "file_size": 1234.0,
+        "scoring_version": 1,
+    }
+    row = dict(zip((name for name, _ in ANALYSIS_COLUMNS), analysis_values(1, data, 2)))
+    for name, type_ in ANALYSIS_COLUMNS:
+        if row[name] is None:
+            continue
+        expected = {"integer": int, "float8": float}.get(type_, str)
+        assert type(row[name]) is expected, (name, row[name])
+    assert (row["blink_count"], row["pause_count"], row["file_size"]) == (3, 4, 1234)
+    assert row["overall_score"] == 7.5 and row["head_pose_mean"] == 2.0
+    assert row["timeline_path"] is None
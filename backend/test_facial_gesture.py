@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+from facial_gesture import GestureAccumulator, RunningStat, LANDMARK_INDICES
+
+# Frame-pixel positions of each tracked landmark on an upright face with
+# open eyes and mouth
+FACE = {
+    1: (320, 260), 13: (320, 300), 14: (320, 315), 33: (270, 230), 61: (290, 308),
+    105: (280, 205), 133: (300, 230), 145: (285, 236), 159: (285, 224), 263: (370, 232),
+    291: (350, 308), 334: (360, 205), 362: (340, 232), 374: (355, 238), 386: (355, 226),
+}
+SLOT = {index: slot for slot, index in enumerate(LANDMARK_INDICES)}
+
+
+def frames(n, closed=(), mouth_shut=(), seed=0):
+    """(n, landmarks, 2) jittered faces, eyes closed on `closed` and lips together on `mouth_shut`"""
+    rng = np.random.default_rng(seed)
+    points = np.array([FACE[i] for i in LANDMARK_INDICES], dtype=np.float64)
+    points = np.repeat(points[None], n, axis=0) + rng.normal(0, 1.5, (n, len(LANDMARK_INDICES), 2))
+    for i in closed:
+        points[i, SLOT[159]] = points[i, SLOT[145]]
+        points[i, SLOT[386]] = points[i, SLOT[374]]
+    for i in mouth_shut:
+        points[i, SLOT[13]] = points[i, SLOT[14]]
+    return points
+
+
+def accumulate(points, weights, pieces):
+    """One accumulator per piece (each fed in batches of 7), merged in order"""
+    merged = None
+    for lo, hi in zip(pieces[:-1], pieces[1:]):
+        accumulator = GestureAccumulator()
+        accumulator.frames = hi - lo
+        for start in range(lo, hi, 7):
+            stop = min(start + 7, hi)
+            accumulator.add_batch(points[start:stop], weights[start:stop])
+        merged = accumulator if merged is None else merged.merge(accumulator)
+    return merged
+
+
+def test_running_stat_matches_weighted_moments():
+    rng = np.random.default_rng(3)
+    values, weights = rng.normal(5, 2, 500), rng.integers(1, 4, 500).astype(float)
+    stat = RunningStat()
+    for lo in range(0, 500, 64):
+        stat.update(values[lo:lo + 64], weights[lo:lo + 64])
+    mean = np.average(values, weights=weights)
+    assert stat.mean == pytest.approx(mean)
+    assert stat.std == pytest.approx(np.sqrt(np.average((values - mean) ** 2, weights=weights)))
+
+    left, right = RunningStat(), RunningStat()
+    left.update(values[:123], weights[:123])
+    right.update(values[123:], weights[123:])
+    merged = left.merge(right)
+    assert merged.mean == pytest.approx(stat.mean) and merged.std == pytest.approx(stat.std)
+
+
+def test_running_stat_merges_with_empty():
+    stat = RunningStat()
+    stat.update(np.array([1.0, 3.0]), np.array([1.0, 1.0]))
+    assert RunningStat().merge(stat).mean == 2.0
+    assert stat.merge(RunningStat()).std == 1.0
+
+
+@pytest.mark.parametrize("pieces", [
+    [0, 40, 120],        # boundary inside the blink at frames 38-42
+    [0, 41, 80, 120],    # one boundary inside the blink, one next to a shut mouth
+    [0, 10, 20, 30, 60, 90, 120],
+])
+def test_split_ranges_merge_exactly(pieces):
+    points = frames(120, closed=[5, 6, 38, 39, 40, 41, 42, 100], mouth_shut=[79, 80])
+    weights = np.random.default_rng(1).integers(1, 4, 120).astype(float)
+    whole = accumulate(points, weights, [0, 120]).metrics()
+    split = accumulate(points, weights, pieces).metrics()
+
+    assert whole["blink_events"] == split["blink_events"] == 3
+    assert whole["blink_count"] == split["blink_count"]
+    assert whole["frames_total"] == split["frames_total"] == 120
+    for key in ("smile_mean", "smile_std", "eyebrow_raise_mean", "eyebrow_raise_std",
+                "head_pose_mean", "head_pose_std"):
+        assert split[key] == pytest.approx(whole[key], rel=1e-9)
+
+
+def test_blink_at_start_of_later_range_counts_once_per_event():
+    points = frames(20, closed=[9, 10, 15])
+    weights = np.ones(20)
+    assert accumulate(points, weights, [0, 10, 20]).blink_events == 2
+    assert accumulate(points, weights, [0, 11, 20]).blink_events == 2
+    assert accumulate(points, weights, [0, 15, 20]).blink_events == 2
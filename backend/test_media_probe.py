@@ -0,0 +1,85 @@
+import av
+import numpy as np
+import pytest
+import media_probe
+from media_probe import probe_media, validate_media
+
+
+def probe(**overrides):
+    result = {
+        "format": "mov,mp4,m4a,3gp,3g2,mj2", "duration": 120.0, "video_codec": "h264",
+        "width": 1280, "height": 720, "fps": 30.0, "frame_count": 3600,
+        "audio_codec": "aac", "sample_rate": 48000, "has_video": True, "has_audio": True, "measured": False,
+    }
+    result.update(overrides)
+    return result
+
+
+def test_video_and_audio_only_uploads_pass():
+    assert validate_media(probe(), 10 * 1024 * 1024) == {"success": True, "mode": "video"}
+    audio = probe(has_video=False, video_codec=None, width=0, height=0, fps=0.0, frame_count=0)
+    assert validate_media(audio, 1024) == {"success": True, "mode": "audio"}
+
+
+def test_silent_video_passes():
+    silent = probe(has_audio=False, audio_codec=None, sample_rate=0)
+    assert validate_media(silent, 1024) == {"success": True, "mode": "video"}
+
+
+@pytest.mark.parametrize("overrides,size,message", [
+    ({}, media_probe.MAX_UPLOAD_MB * 1024 * 1024 + 1, "larger than"),
+    ({"has_video": False, "has_audio": False}, 1024, "no audio or video"),
+    ({"duration": 0.5}, 1024, "too short"),
+    ({"duration": media_probe.MAX_MEDIA_SECONDS + 1}, 1024, "longer than"),
+    ({"width": 7680, "height": 4320}, 1024, "too large"),
+    ({"frame_count": 0}, 1024, "no readable frames"),
+    ({"fps": 0.0}, 1024, "no readable frames"),
+])
+def test_rejections(overrides, size, message):
+    result = validate_media(probe(**overrides), size)
+    assert not result["success"] and message in result["message"]
+
+
+def test_budgeted_lengths_are_accepted():
+    # Budget mode is meant to handle 20-minute recordings
+    assert validate_media(probe(duration=20 * 60.0, frame_count=36000), 1024)["success"]
+
+
+def write_video(path, container_format, codec, frames=45, fps=15, options=None):
+    with av.open(str(path), "w", format=container_format, options=options or {}) as container:
+        stream = container.add_stream(codec, rate=fps)
+        stream.width, stream.height, stream.pix_fmt = 64, 48, "yuv420p"
+        for i in range(frames):
+            image = np.full((48, 64, 3), i * 5 % 255, dtype=np.uint8)
+            for packet in stream.encode(av.VideoFrame.from_ndarray(image, format="rgb24")):
+                container.mux(packet)
+        for packet in stream.encode():
+            container.mux(packet)
+
+
+def test_probe_reads_header(tmp_path):
+    path = tmp_path / "clip.mp4"
+    write_video(path, "mp4", "mpeg4")
+    result = probe_media(str(path))
+    assert result["has_video"] and not result["has_audio"]
+    assert (result["width"], result["height"], result["fps"]) == (64, 48, 15.0)
+    assert result["frame_count"] == 45 and result["duration"] == pytest.approx(3.0, abs=0.1)
+    assert validate_media(result, path.stat().st_size)["success"] and not result["measured"]
+
+
+def test_probe_measures_streams_without_header_length(tmp_path):
+    # Live Matroska, like a browser's MediaRecorder output, has neither
+    # duration nor frame count in its header
+    path = tmp_path / "clip.mkv"
+    write_video(path, "matroska", "mpeg4", options={"live": "1"})
+    result = probe_media(str(path))
+    assert result["measured"]
+    assert result["frame_count"] == 45 and result["duration"] == pytest.approx(3.0, abs=0.1)
+    assert validate_media(result, path.stat().st_size)["success"]
+
+
+def test_probe_rejects_non_media(tmp_path):
+    path = tmp_path / "notes.mp4"
+    path.write_bytes(b"not a video at all" * 100)
+    with pytest.raises(av.error.FFmpegError):
+        probe_media(str(path))
@@ -0,0 +1,72 @@
+import time
+from response_cache import ResponseCache, conditional_response, etag_matches, make_etag
+
+
+def test_get_returns_what_was_put():
+    cache = ResponseCache()
+    etag, value = cache.put((1, "stats"), {"success": True}, cache.generation(1))
+    assert cache.get((1, "stats")) == (etag, value)
+    assert cache.stats()["hits"] == 1
+
+
+def test_put_after_invalidate_is_dropped():
+    cache = ResponseCache()
+    # A read starts loading, a save for the same user lands, then the read
+    # finishes with what it loaded before the save
+    generation = cache.generation(1)
+    cache.invalidate_user(1)
+    cache.put((1, "stats"), {"success": True, "sessions": 3}, generation)
+    assert cache.get((1, "stats")) is None
+
+    cache.put((1, "stats"), {"success": True, "sessions": 4}, cache.generation(1))
+    assert cache.get((1, "stats"))[1]["sessions"] == 4
+
+
+def test_invalidate_drops_only_that_user():
+    cache = ResponseCache()
+    for user_id in (1, 2):
+        cache.put((user_id, "stats"), {"user": user_id}, cache.generation(user_id))
+    cache.invalidate_user(1)
+    assert cache.get((1, "stats")) is None
+    assert cache.get((2, "stats")) is not None
+
+
+def test_generation_map_is_bounded():
+    cache = ResponseCache(max_entries=10)
+    stale = {user_id: cache.generation(user_id) for user_id in range(100)}
+    for user_id in range(100):
+        cache.invalidate_user(user_id)
+    assert cache.stats()["generations"] == 10
+    # Forgotten users may have a put skipped, but never accept a stale one
+    for user_id in range(100):
+        cache.put((user_id, "stats"), {"user": user_id}, stale[user_id])
+        assert cache.get((user_id, "stats")) is None
+
+
+def test_entries_are_bounded_and_expire():
+    cache = ResponseCache(max_entries=3, ttl_seconds=0.05)
+    for i in range(5):
+        cache.put((1, i), {"i": i}, cache.generation(1))
+    assert cache.stats()["entries"] == 3
+    assert cache.get((1, 0)) is None and cache.get((1, 4)) is not None
+    time.sleep(0.06)
+    assert cache.get((1, 4)) is None
+
+
+def test_etag_matching():
+    etag = make_etag({"a": 1})
+    assert etag == make_etag({"a": 1}) != make_etag({"a": 2})
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag) and not etag_matches('"other"', etag)
+
+
+def test_matching_if_none_match_gets_304():
+    cache = ResponseCache()
+    entry = cache.put((1, "stats"), {"success": True}, cache.generation(1))
+    full = conditional_response(entry)
+    assert full.status_code == 200 and full.headers["etag"] == entry[0]
+    not_modified = conditional_response(entry, entry[0])
+    assert not_modified.status_code == 304 and not not_modified.body
+    assert not_modified.headers["etag"] == entry[0]
+    assert conditional_response(entry, '"stale"').status_code == 200
@@ -0,0 +1,109 @@
+import time
+from datetime import datetime, timedelta
+import pytest
+from fastapi import HTTPException
+from session_tokens import SessionTokens, LoginRecorder, require_user
+
+
+@pytest.fixture
+def tokens():
+    return SessionTokens("test-secret", ttl_seconds=60, max_entries=2)
+
+
+def test_issued_token_verifies(tokens):
+    token = tokens.issue(42)
+    assert tokens.verify(token) == 42
+    assert tokens.verify(token) == 42
+    assert tokens.stats()["hits"] == 1
+
+
+def test_tampered_token_is_rejected(tokens):
+    version, user_id, expires, signature = tokens.issue(42).split(".")
+    flipped = signature[:-1] + ("A" if signature[-1] != "A" else "B")
+    assert tokens.verify(".".join((version, user_id, expires, flipped))) is None
+    # Claiming another user or a later expiry breaks the signature
+    assert tokens.verify(".".join((version, "43", expires, signature))) is None
+    assert tokens.verify(".".join((version, user_id, str(int(expires) + 3600), signature))) is None
+    assert tokens.verify("not a token") is None
+    assert tokens.stats()["rejected"] == 4
+
+
+def test_token_from_another_secret_is_rejected(tokens):
+    assert tokens.verify(SessionTokens("other-secret").issue(42)) is None
+
+
+def test_expired_token_is_rejected(monkeypatch):
+    tokens = SessionTokens("test-secret", ttl_seconds=10)
+    token = tokens.issue(42)
+    assert tokens.verify(token) == 42
+    later = time.time() + 11
+    monkeypatch.setattr(time, "time", lambda: later)
+    # Also once it sits in the verified LRU
+    assert tokens.verify(token) is None
+
+
+def test_verified_tokens_are_bounded(tokens):
+    issued = [tokens.issue(user_id) for user_id in range(5)]
+    for token in issued:
+        tokens.verify(token)
+    assert tokens.stats()["entries"] == 2
+    assert tokens.verify(issued[0]) == 0
+
+
+def test_header_parsing(tokens):
+    token = tokens.issue(42)
+    assert tokens.user_from_header(f"Bearer {token}") == 42
+    assert tokens.user_from_header(f"bearer  {token}") == 42
+    for header in (None, "", token, f"Basic {token}", "Bearer nope"):
+        with pytest.raises(HTTPException) as error:
+            tokens.user_from_header(header)
+        assert error.value.status_code == 401
+
+
+def test_token_for_another_user_is_forbidden(tokens):
+    session_user_id = tokens.user_from_header(f"Bearer {tokens.issue(42)}")
+    require_user(session_user_id, 42)
+    with pytest.raises(HTTPException) as error:
+        require_user(session_user_id, 43)
+    assert error.value.status_code == 403
+
+
+def test_login_recorder_batches_one_row_per_user():
+    recorder = LoginRecorder()
+    start = datetime(2026, 1, 1, 9)
+    for minutes in (5, 1, 9):
+        recorder.record(1, start + timedelta(minutes=minutes))
+    recorder.record(2, start)
+    assert recorder.pending() == 2
+    assert sorted(recorder.drain()) == [(1, start + timedelta(minutes=9)), (2, start)]
+    assert recorder.pending() == 0 and recorder.drain() == []
+
+
+def test_failed_flush_is_restored_without_losing_newer_logins():
+    recorder = LoginRecorder()
+    start = datetime(2026, 1, 1, 9)
+    recorder.record(1, start)
+    recorder.record(2, start)
+    batch = recorder.drain()
+    recorder.record(1, start + timedelta(minutes=5))
+    recorder.restore(batch)
+    assert sorted(recorder.drain()) == [(1, start + timedelta(minutes=5)), (2, start)]
+
+
+def test_flushed_batch_sets_last_login(sqlite_db):
+    conn = sqlite_db.connection()
+    for user_id in (1, 2):
+        conn.execute(
+            "INSERT INTO users (user_id, username, email, password_hash) VALUES (?, ?, ?, '')",
+            (user_id, f"user{user_id}", f"user{user_id}@example.com")
+        )
+    recorder = LoginRecorder()
+    start = datetime(2026, 1, 1, 9)
+    recorder.record(1, start)
+    recorder.record(1, start + timedelta(minutes=1))
+    recorder.record(2, start)
+    assert sqlite_db.record_logins(recorder.drain()) == {"success": True, "updated": 2}
+    # An older time from a late flush never moves last_login back
+    sqlite_db.record_logins([(1, start)])
+    rows = conn.execute("SELECT user_id, last_login FROM users ORDER BY user_id").fetchall()
+    assert rows == [(1, start + timedelta(minutes=1)), (2, start)]
@@ -0,0 +1,55 @@
+import pytest
+from sqlite_database import fts_query, to_sqlite
+
+
+@pytest.mark.parametrize("query,expected", [
+    ("carbon tax", '"carbon" "tax"'),
+    ('"carbon tax" policy', '"carbon tax" "policy"'),
+    ("carbon or nuclear", '"carbon" OR "nuclear"'),
+    ("carbon -nuclear", '"carbon" NOT "nuclear"'),
+    ('energy -"nuclear power"', '"energy" NOT "nuclear power"'),
+    # FTS5 operators and syntax in user input stay plain terms
+    ("NEAR(a b) AND c*", '"NEAR(a" "b)" "AND" "c*"'),
+    ('say "hi', '"say" "hi"'),
+    ('quote"inside', '"quote""inside"'),
+    # A leading, trailing or doubled OR has nothing to join
+    ("or carbon or or tax or", '"carbon" OR "tax"'),
+    ('"or"', '"or"'),
+])
+def test_fts_query_translates_web_search_syntax(query, expected):
+    assert fts_query(query) == expected
+
+
+@pytest.mark.parametrize("query", ["", "   ", '""', "-excluded", "or", "- -"])
+def test_fts_query_without_terms_matches_nothing(query):
+    assert fts_query(query) is None
+
+
+def test_to_sqlite_placeholders():
+    assert to_sqlite("SELECT * FROM t WHERE a = %s AND b = %s") == "SELECT * FROM t WHERE a = ? AND b = ?"
+
+
+def test_translated_queries_run(sqlite_db):
+    conn = sqlite_db.connection()
+    conn.execute("INSERT INTO users (user_id, username, email, password_hash) VALUES (1, 'u', 'u@example.com', '')")
+    for session, (topic, text) in enumerate([
+        ("Carbon tax", "A carbon tax puts a price on emissions."),
+        ("Nuclear power", "Nuclear power is low carbon but expensive."),
+        ("School uniforms", 'Uniforms "level the field", say some NEAR(teachers).'),
+    ], start=1):
+        conn.execute(
+            "INSERT INTO speech_analyses (user_id, session_number, topic, transcription) VALUES (1, ?, ?, ?)",
+            (session, topic, text)
+        )
+
+    def sessions(query):
+        result = sqlite_db.search_analyses(1, query)
+        assert result["success"], result
+        return sorted(r["session_number"] for r in result["results"])
+
+    assert sessions("carbon") == [1, 2]
+    assert sessions("carbon -nuclear") == [1]
+    assert sessions("uniforms or emissions") == [1, 3]
+    assert sessions('"level the field"') == [3]
+    assert sessions("NEAR(teachers") == [3]
+    assert sessions("-carbon") == []
@@ -77,7 +77,10 @@ const ExtemporeSpeechEvaluator = () => {
         if (user && !user.isGuest && user.userId) {
           await fetch('https://speechvision-backend.onrender.com/save-analysis', {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: {
+              'Content-Type': 'application/json',
+              'Authorization': `Bearer ${user.token}`
+            },
             body: JSON.stringify({
               user_id: user.userId,
               analysis_data: {
@@ -9,6 +9,9 @@ const History = ({ user, onBack }) => {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
 
+  // Session token from /login, required by the per-user endpoints
+  const authHeaders = { headers: { 'Authorization': `Bearer ${user.token}` } };
+
   useEffect(() => {
     loadData();
   }, []);
@@ -19,14 +22,14 @@ const History = ({ user, onBack }) => {
       setError(null);
 
       // Load statistics
-      const statsRes = await fetch(`https://speechvision-backend.onrender.com/user-statistics/${user.userId}`);
+      const statsRes = await fetch(`https://speechvision-backend.onrender.com/user-statistics/${user.userId}`, authHeaders);
       if (statsRes.ok) {
         const statsData = await statsRes.json();
         setStatistics(statsData.statistics);
       }
 
       // Load history
-      const historyRes = await fetch(`https://speechvision-backend.onrender.com/user-history/${user.userId}`);
+      const historyRes = await fetch(`https://speechvision-backend.onrender.com/user-history/${user.userId}`, authHeaders);
       if (historyRes.ok) {
         const historyData = await historyRes.json();
         setHistory(historyData.history || []); // Ensure it's always an array
@@ -51,7 +54,7 @@ const History = ({ user, onBack }) => {
     if (selectedAnalyses.length === 2) {
       try {
         const res = await fetch(
-          `https://speechvision-backend.onrender.com/compare/${user.userId}/${selectedAnalyses[0]}/${selectedAnalyses[1]}`
+          `https://speechvision-backend.onrender.com/compare/${user.userId}/${selectedAnalyses[0]}/${selectedAnalyses[1]}`, authHeaders
         );
         if (res.ok) {
           const data = await res.json();
@@ -50,6 +50,7 @@ const Login = ({ onLoginSuccess }) => {
           username: data.username,
           userId: data.user_id,
           email: data.email,
+          token: data.token,
           isGuest: false
         });
       } else {
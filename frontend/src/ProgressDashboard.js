@@ -10,6 +10,9 @@ const ProgressDashboard = ({ user, onBack }) => {
   const [selectedAnalyses, setSelectedAnalyses] = useState([]);
   const [comparison, setComparison] = useState(null);
 
+  // Session token from /login, required by the per-user endpoints
+  const authHeaders = { headers: { 'Authorization': `Bearer ${user.token}` } };
+
   useEffect(() => {
   loadData();
   // eslint-disable-next-line react-hooks/exhaustive-deps
@@ -19,13 +22,13 @@ const ProgressDashboard = ({ user, onBack }) => {
     try {
       setLoading(true);
 
-      const historyRes = await fetch(`https://speechvision-backend.onrender.com/user-history/${user.userId}?limit=50`);
+      const historyRes = await fetch(`https://speechvision-backend.onrender.com/user-history/${user.userId}?limit=50&fields=session_number,filename,scores,confidence_score`, authHeaders);
       if (historyRes.ok) {
         const historyData = await historyRes.json();
         setHistory(historyData.history || []);
       }
 
-      const statsRes = await fetch(`https://speechvision-backend.onrender.com/user-statistics/${user.userId}`);
+      const statsRes = await fetch(`https://speechvision-backend.onrender.com/user-statistics/${user.userId}`, authHeaders);
       if (statsRes.ok) {
         const statsData = await statsRes.json();
         setStatistics(statsData.statistics);
@@ -49,7 +52,7 @@ const ProgressDashboard = ({ user, onBack }) => {
     if (selectedAnalyses.length === 2) {
       try {
         const res = await fetch(
-          `https://speechvision-backend.onrender.com/compare/${user.userId}/${selectedAnalyses[0]}/${selectedAnalyses[1]}`
+          `https://speechvision-backend.onrender.com/compare/${user.userId}/${selectedAnalyses[0]}/${selectedAnalyses[1]}`, authHeaders
         );
         if (res.ok) {
           const data = await res.json();
@@ -79,6 +79,7 @@ const TopicPractice = ({ user, onBack }) => {
             method: 'POST',
             headers: {
               'Content-Type': 'application/json',
+              'Authorization': `Bearer ${user.token}`
             },
             body: JSON.stringify({
               user_id: user.userId,